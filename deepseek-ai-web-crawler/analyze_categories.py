@@ -7,6 +7,7 @@ from urllib.parse import urljoin
 from typing import Dict, List, Any
 
 from config_playwright import OUTPUT_DIR
+from validator_cache import get_validator_cache
 
 def load_categories(file_path: str) -> List[Dict[str, Any]]:
     """Load categories from JSON file"""
@@ -61,20 +62,28 @@ def verify_urls(categories: List[Dict[str, Any]], max_urls_to_check: int = 5) ->
         'Upgrade-Insecure-Requests': '1',
         'Cache-Control': 'max-age=0'
     }
+    validators = get_validator_cache()
     
     for category in categories:
         for sub in category.get('subcategories', []):
             sub_url = sub.get('subcategory_url', '')
             if sub_url and verified_count < max_urls_to_check:
                 try:
-                    # Thêm headers vào request
-                    response = requests.head(sub_url, timeout=5, headers=headers)
+                    # Thêm headers vào request, kèm validator của lần kiểm tra trước (conditional GET)
+                    request_headers = {**headers, **validators.conditional_headers(sub_url)}
+                    response = requests.head(sub_url, timeout=5, headers=request_headers)
                     # Kiểm tra nếu server trả về 403, thử lại với GET
                     if response.status_code == 403:
-                        response = requests.get(sub_url, timeout=5, headers=headers)
+                        response = requests.get(sub_url, timeout=5, headers=request_headers)
                     
                     status = response.status_code
                     valid = 200 <= status < 300
+                    if status == 304:
+                        # Trang không đổi kể từ lần kiểm tra trước
+                        valid = True
+                        validators.mark_not_modified(sub_url, response.headers)
+                    elif valid:
+                        validators.update(sub_url, response.headers, status)
                     sub['url_valid'] = valid
                     verified_count += 1
                     
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+So sánh bộ nhớ và thời gian mã hóa/giải mã giữa dict sản phẩm và Product (product_model.py)
+
+    python benchmark_product_model.py --count 50000
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List, Any
+
+from product_model import MSGSPEC_SUPPORT, encode_json, decode_json, encode_msgpack, decode_msgpack
+
+CATEGORIES = ["Sữa tươi", "Bánh kẹo", "Nước ngọt", "Mì gói", "Dầu ăn"]
+
+
+def sample_products(count: int) -> List[Dict[str, Any]]:
+    """Sinh dữ liệu sản phẩm giống dữ liệu crawl (category đọc từ JSON nên không dùng chung chuỗi)"""
+    records = []
+    for index in range(count):
+        category = CATEGORIES[index % len(CATEGORIES)]
+        records.append({
+            "name": f"Sản phẩm {index}",
+            "category": "".join(category),
+            "subcategory": "".join(category.lower()),
+            "price": f"{(index % 500) * 1000:,}đ",
+            "original_price": f"{(index % 500) * 1200:,}đ",
+            "description": "Mô tả sản phẩm " * 5,
+            "product_url": f"https://www.bachhoaxanh.com/{index % 50}/san-pham-{index}",
+            "image_urls": [f"https://cdn.tgdd.vn/Products/{index}/{image}.jpg" for image in range(3)],
+            "detailed_info": {"Thương hiệu": "ABC", "Xuất xứ": "Việt Nam"},
+        })
+    # Mô phỏng dữ liệu đọc từ JSON: mỗi record có chuỗi riêng
+    return json.loads(json.dumps(records, ensure_ascii=False))
+
+
+def measure_memory(build: Callable[[], Any]) -> float:
+    """Bộ nhớ (MB) của đối tượng được tạo bởi build()"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / 1024 / 1024
+
+
+def measure_time(func: Callable[[], Any], repeat: int = 3) -> float:
+    """Thời gian (giây) nhỏ nhất của func() qua nhiều lần chạy"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mô hình sản phẩm Product so với dict")
+    parser.add_argument("--count", type=int, default=50000, help="Số sản phẩm")
+    args = parser.parse_args()
+
+    payload = json.dumps(sample_products(args.count), ensure_ascii=False).encode("utf-8")
+    products = decode_json(payload)
+    records = json.loads(payload)
+
+    print(f"{args.count} sản phẩm, msgspec: {'có' if MSGSPEC_SUPPORT else 'không'}, Python {sys.version.split()[0]}")
+    dict_memory = measure_memory(lambda: json.loads(payload))
+    model_memory = measure_memory(lambda: decode_json(payload))
+    print(f"Bộ nhớ     dict: {dict_memory:8.2f} MB   Product: {model_memory:8.2f} MB "
+          f"({dict_memory / args.count * 1024 * 1024:.0f} -> {model_memory / args.count * 1024 * 1024:.0f} byte/sản phẩm)")
+
+    results = [
+        ("Mã hóa JSON", lambda: json.dumps(records, ensure_ascii=False).encode("utf-8"), lambda: encode_json(products)),
+        ("Giải mã JSON", lambda: json.loads(payload), lambda: decode_json(payload)),
+    ]
+    if MSGSPEC_SUPPORT:
+        packed = encode_msgpack(products)
+        results.append(("Mã hóa msgpack", None, lambda: encode_msgpack(products)))
+        results.append(("Giải mã msgpack", None, lambda: decode_msgpack(packed)))
+        print(f"Kích thước  JSON: {len(payload) / 1024 / 1024:.2f} MB   msgpack: {len(packed) / 1024 / 1024:.2f} MB")
+
+    for label, baseline, model in results:
+        model_time = measure_time(model)
+        if baseline:
+            baseline_time = measure_time(baseline)
+            print(f"{label:<16} dict + json: {baseline_time * 1000:8.1f} ms   Product: {model_time * 1000:8.1f} ms")
+        else:
+            print(f"{label:<16} {'':>22} Product: {model_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
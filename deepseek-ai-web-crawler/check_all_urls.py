@@ -6,6 +6,8 @@ import concurrent.futures
 import requests
 from typing import Dict, List, Any, Tuple
 
+from validator_cache import get_validator_cache
+
 def load_categories(file_path: str) -> List[Dict[str, Any]]:
     """Load categories from JSON file"""
     try:
@@ -25,6 +27,9 @@ def check_url(url_data: Tuple[str, str, str]) -> Dict[str, Any]:
         'Accept-Language': 'en-US,en;q=0.5',
         'Connection': 'keep-alive'
     }
+    # Gửi kèm ETag/Last-Modified của lần kiểm tra trước (conditional GET)
+    validators = get_validator_cache()
+    headers.update(validators.conditional_headers(url))
     
     result = {
         'url': url,
@@ -44,6 +49,14 @@ def check_url(url_data: Tuple[str, str, str]) -> Dict[str, Any]:
         status = response.status_code
         valid = 200 <= status < 300
         
+        if status == 304:
+            # Trang không đổi kể từ lần kiểm tra trước
+            valid = True
+            result['unchanged'] = True
+            validators.mark_not_modified(url, response.headers)
+        elif valid:
+            validators.update(url, response.headers, status)
+        
         result['valid'] = valid
         result['status'] = status
     except Exception as e:
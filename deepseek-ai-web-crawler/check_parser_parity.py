@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Kiểm tra các backend HTML (html_backends.py) cho kết quả trích xuất giống nhau và so sánh tốc độ.
+Trang kiểm tra lấy từ archive WARC (page_archive.py), các file .html chỉ định, hoặc trang mẫu dựng sẵn.
+Kết quả của html.parser là chuẩn; --save-golden lưu kết quả chuẩn ra file để lần sau so sánh với --golden.
+
+    python check_parser_parity.py                      # trang mẫu
+    python check_parser_parity.py --archive data/warc --limit 200
+    python check_parser_parity.py --html pages/ --save-golden golden.json
+    python check_parser_parity.py --html pages/ --golden golden.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List, Any, Callable, Iterator, Tuple
+
+import config
+from html_backends import available_backends
+from parser import DataParser
+from page_archive import iter_index, read_record
+
+REFERENCE_BACKEND = "html.parser"
+
+
+def sample_pages(cards: int = 1500) -> List[Tuple[str, str]]:
+    """Trang mẫu theo cấu trúc bachhoaxanh.com (trang chủ, danh sách nhiều MB, chi tiết)"""
+    state = json.dumps({"products": [{"id": index, "name": f"Sản phẩm {index}"} for index in range(cards)]},
+                       ensure_ascii=False)
+    categories = "".join(
+        f'<a class="cate" href="/{slug}">{name}</a>'
+        for slug, name in [("thit-heo", "Thịt heo"), ("sua-tuoi", "Sữa tươi"), ("nuoc-mam", "Nước mắm &amp; gia vị")]
+    )
+    home = (f'<html><head><title>Bách Hóa Xanh</title><style>.cate{{color:red}}</style></head><body>'
+            f'<div class="mb-2 flex flex-wrap">{categories}<!-- menu --></div>'
+            f'<script>window.__STATE__ = {state};</script></body></html>')
+    product_cards = "".join(
+        f'<div class="box_product"><a href="/thit-heo/thit-heo-xay-{index}">'
+        f'<img src="https://cdn.tgdd.vn/Products/{index}.jpg?v=2" alt=""></a>'
+        f'<h3 class="product_name"> Thịt heo xay {index} <span>500g</span></h3>'
+        f'<div class="product_price">{index * 1000:,}₫&nbsp;</div>'
+        f'<div class="mb-4px block leading-3">Giá tốt  \n nhất</div>'
+        f'<div class="text-[#9da7bc] line-through">{index * 1200:,}₫</div></div>'
+        for index in range(cards)
+    )
+    listing = (f'<html><body><div class="listing">{product_cards}</div>'
+               f'<script>window.__STATE__ = {state};</script></body></html>')
+    detail = (
+        '<html><head><meta property="og:title" content="Thịt heo xay"></head><body>'
+        '<h1 class="title">Thịt heo xay <b>500g</b></h1>'
+        '<div class="product_price">75.000₫</div><div class="line-through">90.000₫</div>'
+        '<span class="bg-red">-17%</span>'
+        '<div class="swiper-slide"><img src="https://cdn.tgdd.vn/Products/1/a.jpg?v=1"></div>'
+        '<div class="swiper-slide"><img data-src="https://cdn.tgdd.vn/Products/1/b.jpg"></div>'
+        '<div class="swiper-slide"><img src="/placeholder.png"></div>'
+        '<div class="detail-style"><p>Thịt heo tươi, <em>được</em> sơ chế sạch.</p><p> Bảo quản 0-4°C </p>'
+        '<div class="row"><div class="col-5">Khối lượng</div><div class="col-7">500g</div></div></div>'
+        '<table><tbody><tr><td>Thương hiệu</td><td>Meat Deli</td></tr><tr><th>Xuất xứ</th><td>Việt Nam</td></tr>'
+        '<tr><td colspan="2">Ghi chú</td></tr></tbody></table>'
+        f'<script>window.__STATE__ = {state};</script></body></html>'
+    )
+    return [("sample://home", home), ("sample://listing", listing), ("sample://detail", detail)]
+
+
+def iter_archive_pages(root: str, limit: int) -> Iterator[Tuple[str, str]]:
+    """Các trang HTML trong archive WARC (bản mới nhất của mỗi URL)"""
+    count = 0
+    for entry in iter_index(root):
+        if not (entry["content_type"] or "").startswith("text/html"):
+            continue
+        _, body = read_record(os.path.join(root, entry["warc_file"]), entry["offset"], entry["length"])
+        yield entry["url"], body.decode("utf-8", errors="replace")
+        count += 1
+        if count >= limit:
+            return
+
+
+def iter_html_files(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """Các file .html trong danh sách đường dẫn (file hoặc thư mục)"""
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names if name.endswith(".html")
+        )
+        for file_path in files:
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                yield file_path, f.read()
+
+
+def extractors(parser: DataParser) -> Dict[str, Callable[[Any], Any]]:
+    """Các hàm trích xuất cần cho kết quả giống nhau giữa các backend"""
+    extract = {
+        "categories": lambda doc: parser.parse_category_data(doc, config.CATEGORY_CSS_SELECTOR),
+        "product_list": lambda doc: parser.parse_product_list(doc, config.PRODUCT_CSS_SELECTOR, "test"),
+        "product_details": lambda doc: parser.parse_product_details(doc, config.SELECTORS),
+    }
+    try:
+        # parse_detail_page nằm trong crawler Selenium, chỉ kiểm tra khi import được
+        from crawl_product_details import ProductDetailsCrawler
+        extract["detail_page"] = lambda doc: ProductDetailsCrawler.parse_detail_page(doc, {})
+    except ImportError:
+        pass
+    return extract
+
+
+def run_backend(backend: str, pages: List[Tuple[str, str]]) -> Tuple[Dict[str, Dict[str, Any]], float, float]:
+    """
+    Chạy mọi hàm trích xuất trên các trang bằng một backend
+
+    Returns:
+        Tuple[Dict[str, Dict[str, Any]], float, float]: Kết quả theo URL, thời gian phân tích và thời gian trích xuất (giây)
+    """
+    parser = DataParser(backend)
+    extract = extractors(parser)
+    results: Dict[str, Dict[str, Any]] = {}
+    parse_time = extract_time = 0.0
+    for url, html in pages:
+        start = time.perf_counter()
+        document = parser.parse_html(html)
+        parse_time += time.perf_counter() - start
+        start = time.perf_counter()
+        output = {}
+        for name, function in extract.items():
+            try:
+                output[name] = function(document)
+            except Exception as e:
+                output[name] = f"error: {type(e).__name__}: {e}"
+        extract_time += time.perf_counter() - start
+        results[url] = output
+    return results, parse_time, extract_time
+
+
+def diff(expected: Dict[str, Dict[str, Any]], actual: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Các khác biệt giữa hai bộ kết quả (URL / hàm trích xuất)"""
+    differences = []
+    for url, outputs in expected.items():
+        for name, value in outputs.items():
+            other = actual.get(url, {}).get(name)
+            if json.dumps(value, ensure_ascii=False, sort_keys=True) != json.dumps(other, ensure_ascii=False, sort_keys=True):
+                differences.append(f"{url} [{name}]\n    chuẩn:  {json.dumps(value, ensure_ascii=False)[:300]}\n"
+                                   f"    nhận:   {json.dumps(other, ensure_ascii=False)[:300]}")
+    return differences
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kiểm tra kết quả trích xuất giống nhau giữa các backend HTML")
+    parser.add_argument("--archive", type=str, default=None, help="Thư mục archive WARC (page_archive.py)")
+    parser.add_argument("--html", nargs="*", default=[], help="File hoặc thư mục chứa file .html")
+    parser.add_argument("--limit", type=int, default=500, help="Số trang tối đa lấy từ archive")
+    parser.add_argument("--backends", nargs="*", default=None, help="Backend cần kiểm tra (mặc định: tất cả đã cài)")
+    parser.add_argument("--golden", type=str, default=None, help="So sánh với kết quả chuẩn đã lưu thay vì chạy html.parser")
+    parser.add_argument("--save-golden", type=str, default=None, help="Lưu kết quả của html.parser làm kết quả chuẩn")
+    args = parser.parse_args()
+
+    pages = list(iter_html_files(args.html))
+    if args.archive:
+        pages += list(iter_archive_pages(args.archive, args.limit))
+    if not pages:
+        pages = sample_pages()
+    total_mb = sum(len(html) for _, html in pages) / 1024 / 1024
+    print(f"{len(pages)} trang ({total_mb:.1f} MB), backend khả dụng: {', '.join(available_backends())}")
+
+    backends = args.backends or available_backends()
+    reference, parse_time, extract_time = run_backend(REFERENCE_BACKEND, pages)
+    print(f"{REFERENCE_BACKEND:<12} phân tích {parse_time * 1000:8.1f} ms   trích xuất {extract_time * 1000:8.1f} ms")
+    reference_total = parse_time + extract_time
+
+    if args.save_golden:
+        with open(args.save_golden, "w", encoding="utf-8") as f:
+            json.dump(reference, f, ensure_ascii=False, indent=2)
+        print(f"Đã lưu kết quả chuẩn: {args.save_golden}")
+    expected = reference
+    if args.golden:
+        with open(args.golden, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        backends = list(dict.fromkeys([REFERENCE_BACKEND] + backends))
+
+    failed = False
+    for backend in backends:
+        if backend == REFERENCE_BACKEND and not args.golden:
+            continue
+        if backend == REFERENCE_BACKEND:
+            results, parse_time, extract_time = reference, 0.0, 0.0
+        else:
+            results, parse_time, extract_time = run_backend(backend, pages)
+            print(f"{backend:<12} phân tích {parse_time * 1000:8.1f} ms   trích xuất {extract_time * 1000:8.1f} ms   "
+                  f"(nhanh hơn {reference_total / max(parse_time + extract_time, 1e-9):.1f} lần)")
+        differences = diff(expected, json.loads(json.dumps(results, ensure_ascii=False)))
+        if differences:
+            failed = True
+            print(f"  {backend}: {len(differences)} khác biệt")
+            for difference in differences[:20]:
+                print(f"  - {difference}")
+        else:
+            print(f"  {backend}: kết quả giống hệt")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Gộp các file đầu ra theo lần chạy (data/products/<subcategory>_<timestamp>.json) thành một dataset
+mỗi subcategory một file, loại trùng theo URL sản phẩm chuẩn hóa và giữ bản ghi mới nhất.
+Các subcategory được gộp song song trên nhiều process; file đầu vào được chuyển vào archive (hoặc xóa).
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config_playwright import OUTPUT_DIR, COMPACT_DIR, COMPACT_ARCHIVE_DIR, COMPACT_WORKERS
+from stream_readers import iter_json_array
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_DIR = os.path.join(OUTPUT_DIR, "products")
+MANIFEST_FILE = "manifest.json"
+RUN_FILE_PATTERN = re.compile(r"^(?P<partition>.+)_(?P<timestamp>\d{8}_\d{6})\.json$")
+TRACKING_PARAMS = ("utm_", "gclid", "fbclid")
+
+
+def canonical_url(url: str) -> str:
+    """Chuẩn hóa URL sản phẩm: scheme/host chữ thường, bỏ fragment, tham số tracking và dấu '/' cuối"""
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMS)]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ""))
+
+
+def product_key(product: Dict[str, Any]) -> str:
+    """Khóa loại trùng của sản phẩm (URL chuẩn hóa, nếu không có thì id hoặc tên)"""
+    url = canonical_url(product.get("product_url") or product.get("url") or "")
+    if url:
+        return url
+    return f"id:{product.get('id') or product.get('product_id') or product.get('name', '')}"
+
+
+def find_run_files(input_dir: str = PRODUCTS_DIR) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Tìm các file JSON theo lần chạy và nhóm theo subcategory
+
+    Args:
+        input_dir: Thư mục chứa file <subcategory>_<timestamp>.json
+
+    Returns:
+        Dict[str, List[Tuple[str, str]]]: subcategory -> [(timestamp, đường dẫn)] theo thứ tự thời gian
+    """
+    partitions: Dict[str, List[Tuple[str, str]]] = {}
+    if not os.path.isdir(input_dir):
+        return partitions
+    for filename in os.listdir(input_dir):
+        match = RUN_FILE_PATTERN.match(filename)
+        if match:
+            partitions.setdefault(match.group("partition"), []).append(
+                (match.group("timestamp"), os.path.join(input_dir, filename))
+            )
+    for files in partitions.values():
+        files.sort()
+    return partitions
+
+
+def compact_partition(partition: str, files: List[Tuple[str, str]], output_dir: str = COMPACT_DIR) -> Dict[str, Any]:
+    """
+    Gộp các file của một subcategory (cùng với file đã gộp trước đó) thành một file JSON
+
+    Args:
+        partition: Tên subcategory
+        files: [(timestamp, đường dẫn)] theo thứ tự thời gian
+        output_dir: Thư mục dataset đã gộp
+
+    Returns:
+        Dict[str, Any]: Số liệu của subcategory (số bản ghi đọc, số sản phẩm sau khi loại trùng...)
+    """
+    output_path = os.path.join(output_dir, f"{partition}.json")
+    products: Dict[str, Dict[str, Any]] = {}
+    records_in = 0
+
+    # File đã gộp ở lần trước là dữ liệu cũ nhất, các file theo lần chạy ghi đè theo thứ tự thời gian
+    for path in [output_path] + [path for _, path in files]:
+        for product in iter_json_array(path):
+            records_in += 1
+            key = product_key(product)
+            products.pop(key, None)
+            products[key] = product
+
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(list(products.values()), f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, output_path)
+
+    return {
+        "partition": partition,
+        "file": os.path.basename(output_path),
+        "inputs": len(files),
+        "records_in": records_in,
+        "products": len(products),
+        "latest_run": files[-1][0] if files else None,
+    }
+
+
+def archive_inputs(files: List[Tuple[str, str]], partition: str,
+                   archive_dir: Optional[str] = COMPACT_ARCHIVE_DIR) -> int:
+    """
+    Chuyển các file đã gộp vào archive/<subcategory>/ (archive_dir=None để xóa)
+
+    Returns:
+        int: Số file đã xử lý
+    """
+    handled = 0
+    for _, path in files:
+        try:
+            if archive_dir:
+                target_dir = os.path.join(archive_dir, partition)
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(path, os.path.join(target_dir, os.path.basename(path)))
+            else:
+                os.remove(path)
+            handled += 1
+        except Exception as e:
+            logger.error(f"Lỗi khi dọn file {path}: {e}")
+    return handled
+
+
+def load_manifest(output_dir: str = COMPACT_DIR) -> Dict[str, Any]:
+    """Đọc manifest của dataset đã gộp (dict rỗng nếu chưa gộp lần nào)"""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc manifest {path}: {e}")
+        return {}
+
+
+def compact_outputs(input_dir: str = PRODUCTS_DIR,
+                    output_dir: str = COMPACT_DIR,
+                    archive_dir: Optional[str] = COMPACT_ARCHIVE_DIR,
+                    workers: Optional[int] = COMPACT_WORKERS) -> Dict[str, Any]:
+    """
+    Gộp toàn bộ file theo lần chạy thành dataset đã loại trùng và cập nhật manifest
+
+    Args:
+        input_dir: Thư mục chứa file <subcategory>_<timestamp>.json
+        output_dir: Thư mục dataset đã gộp
+        archive_dir: Thư mục archive cho file đầu vào (None = xóa sau khi gộp)
+        workers: Số process gộp song song (None = số nhân CPU)
+
+    Returns:
+        Dict[str, Any]: Manifest sau khi gộp
+    """
+    start_time = time.time()
+    partitions = find_run_files(input_dir)
+    manifest = load_manifest(output_dir)
+    manifest.setdefault("partitions", {})
+    if not partitions:
+        logger.info(f"Không có file nào cần gộp trong {input_dir}")
+        return manifest
+
+    os.makedirs(output_dir, exist_ok=True)
+    input_files = sum(len(files) for files in partitions.values())
+    logger.info(f"Gộp {input_files} file của {len(partitions)} subcategory từ {input_dir}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(compact_partition, partition, files, output_dir): partition
+            for partition, files in partitions.items()
+        }
+        for future in as_completed(futures):
+            partition = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                # File đầu vào được giữ nguyên để lần gộp sau thử lại
+                logger.error(f"Lỗi khi gộp subcategory {partition}: {e}")
+                continue
+            archive_inputs(partitions[partition], partition, archive_dir)
+            manifest["partitions"][partition] = stats
+            logger.info(f"{partition}: {stats['records_in']} bản ghi từ {stats['inputs']} file -> {stats['products']} sản phẩm")
+
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    manifest["total_products"] = sum(stats["products"] for stats in manifest["partitions"].values())
+    temp_path = os.path.join(output_dir, MANIFEST_FILE + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, os.path.join(output_dir, MANIFEST_FILE))
+
+    elapsed = time.time() - start_time
+    logger.info(f"Đã gộp xong trong {elapsed:.2f} giây: {manifest['total_products']} sản phẩm "
+                f"trong {len(manifest['partitions'])} subcategory tại {output_dir}")
+    return manifest
+
+
+def load_compacted(output_dir: str = COMPACT_DIR, partitions: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Đọc lần lượt các sản phẩm của dataset đã gộp
+
+    Args:
+        output_dir: Thư mục dataset đã gộp
+        partitions: Các subcategory cần đọc (None = tất cả)
+
+    Returns:
+        Iterator[Dict[str, Any]]: Các sản phẩm
+    """
+    for partition, stats in sorted(load_manifest(output_dir).get("partitions", {}).items()):
+        if partitions is None or partition in partitions:
+            yield from iter_json_array(os.path.join(output_dir, stats["file"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gộp các file sản phẩm theo lần chạy thành dataset đã loại trùng")
+    parser.add_argument("--input", type=str, default=PRODUCTS_DIR, help="Thư mục chứa file <subcategory>_<timestamp>.json")
+    parser.add_argument("--output", type=str, default=COMPACT_DIR, help="Thư mục dataset đã gộp")
+    parser.add_argument("--archive", type=str, default=COMPACT_ARCHIVE_DIR, help="Thư mục archive cho file đầu vào")
+    parser.add_argument("--delete", action="store_true", help="Xóa file đầu vào sau khi gộp thay vì chuyển vào archive")
+    parser.add_argument("--workers", type=int, default=COMPACT_WORKERS, help="Số process gộp song song")
+    args = parser.parse_args()
+
+    compact_outputs(args.input, args.output, None if args.delete else args.archive, args.workers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -27,7 +27,7 @@ SELECTORS = {
     ],
     "original_price": [
         "div.line-through", 
-        ".text-[#9da7bc].line-through", 
+        ".text-\\[\\#9da7bc\\].line-through",  # Ký tự đặc biệt của class Tailwind phải escape trong CSS selector
         ".original-price"
     ],
     "discount": [
@@ -43,6 +43,22 @@ SELECTORS = {
     ]
 }
 
+# Selector cần xuất hiện để coi là trang đã sẵn sàng, theo loại trang.
+# Mỗi nhóm cần ít nhất một selector khớp, tất cả các nhóm phải thỏa mãn.
+READY_SELECTORS = {
+    "home": [
+        [".mb-2.flex.flex-wrap .cate", ".cate_parent .cate", ".cate_parent"]
+    ],
+    "listing": [
+        [".box_product", ".this-item", ".product-item", ".cate-pro-item", "article.product"]
+    ],
+    "detail": [
+        [".detail-style", ".product-description", ".detail-content"],
+        [".product_price", ".product-price", ".price", "span.price"]
+    ]
+}
+READY_TIMEOUT = 15  # Thời gian chờ tối đa để trang sẵn sàng (giây)
+
 # Trường dữ liệu bắt buộc cho sản phẩm
 REQUIRED_KEYS = [
     "name",
@@ -56,12 +72,56 @@ REQUIRED_KEYS = [
 OUTPUT_DIR = "data"  # Thư mục lưu dữ liệu
 OUTPUT_FILE_CSV = "products.csv"  # Tên file CSV mặc định
 OUTPUT_FILE_JSON = "products.json"  # Tên file JSON mặc định
+IMAGE_STORE_DIR = os.path.join(OUTPUT_DIR, "image_store")  # Kho hình ảnh định địa chỉ theo nội dung, dùng chung cho mọi crawler
+VALIDATOR_CACHE_FILE = os.path.join(OUTPUT_DIR, "validators.sqlite3")  # Cache ETag/Last-Modified theo URL cho conditional GET
+IMAGE_REVALIDATE_AFTER = 24 * 3600  # Hình ảnh đã có trong kho được kiểm tra lại (conditional GET) sau khoảng này (giây); None = không kiểm tra lại
+CRAWL_STATE_FILE = os.path.join(OUTPUT_DIR, "crawl_state.sqlite3")  # Trạng thái từng sản phẩm (lần tải cuối, hash nội dung, giá) cho chế độ incremental
+RECRAWL_MAX_AGE = 7 * 24 * 3600  # Chế độ incremental: sản phẩm được tải lại khi lần tải cuối cũ hơn khoảng này (giây)
+RECRAWL_JITTER = 0.3  # Tỷ lệ rải đều thời hạn tải lại theo URL để mỗi lần chạy chỉ chạm một phần danh mục
+RECRAWL_FAILED_AFTER = 3600  # Sản phẩm tải lỗi được thử lại sau khoảng này (giây)
+JSONL_FSYNC = "batch"  # Chính sách fsync khi ghi JSONL: always (mỗi record), batch (mỗi batch), never
+JSONL_COMPRESS = False  # Nén file JSONL bằng zstd (cần cài zstandard)
+JOURNAL_FILE = os.path.join(OUTPUT_DIR, "crawl_journal.jsonl")  # Journal các URL/danh mục đã hoàn thành, dùng cho --checkpoint
+JOURNAL_FSYNC = "always"  # Chính sách fsync cho mỗi dòng journal: always hoặc never
+JOURNAL_COMPACT_EVERY = 500  # Số dòng journal trước khi ghi snapshot và làm rỗng journal
+PAGE_ARCHIVE_ENABLED = True  # Lưu HTML cuối cùng của mỗi trang (và JSON XHR) vào file WARC để chạy lại parser offline (reextract.py)
+PAGE_ARCHIVE_DIR = os.path.join(OUTPUT_DIR, "warc")  # Thư mục chứa file .warc.gz và chỉ mục URL (index.sqlite3)
+PAGE_ARCHIVE_MAX_FILE_SIZE = 256 * 1024 * 1024  # Kích thước tối đa của một file WARC (byte) trước khi chuyển sang file mới
+SEARCH_INDEX_FILE = os.path.join(OUTPUT_DIR, "search_index.sqlite3")  # Chỉ mục tìm kiếm sản phẩm (SQLite FTS5, không phân biệt dấu tiếng Việt)
+SEARCH_INDEX_SKIP_DIRS = ["images", "image_store", "warc", "dataset", "screenshots"]  # Thư mục con không quét khi cập nhật chỉ mục
+SEARCH_INDEX_SKIP_FILES = ["categor", "checkpoint", "journal", "manifest", "url_check", "summary", "report"]  # File có tên chứa các chuỗi này không phải file sản phẩm
 
 # Cấu hình crawler
 MAX_RETRIES = 3  # Số lần thử lại tối đa
 WAIT_TIME = 45   # Thời gian chờ tối đa (giây)
 CRAWL_DELAY = 2  # Thời gian chờ giữa các request (giây)
 SCROLL_TIME = 20  # Thời gian tối đa để scroll trang (giây)
+HTML_PARSER_BACKEND = "auto"  # Backend phân tích HTML: auto (nhanh nhất đã cài), selectolax, lxml hoặc html.parser (html_backends.py)
+
+# Cấu hình lấy HTML từ trình duyệt Selenium (html_capture.py)
+HTML_CAPTURE_MODE = "full"  # full: toàn bộ driver.page_source, region: chỉ outerHTML của các vùng trong CAPTURE_REGIONS
+# Vùng cần lấy theo loại trang, phải chứa mọi phần tử mà parser dùng; trang không khớp vùng nào thì lấy toàn bộ HTML
+CAPTURE_REGIONS = {
+    "home": [".mb-2.flex.flex-wrap", ".cate_parent"],
+    "subcategories": [".subcategory", ".subcategories", ".sidebar-categories", ".category-menu"],
+    "listing": [PRODUCT_CSS_SELECTOR],
+    "detail": [
+        # Tên, giá, giảm giá và mô tả (SELECTORS)
+        "h1", ".product_name", ".product-title", "meta[property='og:title']",
+        ".product_price", ".price", ".current-price", ".line-through", ".original-price",
+        "span.bg-red", ".promotion-badge", ".discount",
+        ".detail-style", ".mb-4px.block.leading-3", ".product-description", ".detail-content",
+        # Thông số kỹ thuật, hình ảnh và đánh giá (crawl_product_details.py)
+        "table.specifications", "table.product-specs", ".product-attributes", ".product-specs", ".specifications",
+        ".product-image-gallery", ".product-images", ".gallery", ".product-gallery", ".swiper-slide",
+        ".product-reviews", ".reviews-list", "#reviews", ".comment-list"
+    ]
+}
+
+# Cấu hình chế độ --fetcher http (tải HTML trực tiếp, không mở trình duyệt)
+HTTP_CONCURRENCY = 8  # Số request HTTP đồng thời tới cùng một host
+HTTP_MAX_CONNECTIONS = 20  # Số kết nối keep-alive tối đa trong pool
+HTTP_MIN_INTERVAL = 0.25  # Khoảng cách tối thiểu giữa hai request tới cùng host (giây)
 
 # Cấu hình đa luồng/đa tiến trình
 MAX_WORKERS = 4  # Số worker tối đa cho đa luồng/đa tiến trình
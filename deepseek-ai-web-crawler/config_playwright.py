@@ -27,6 +27,125 @@ MAX_RETRIES = 3
 # Thời gian chờ giữa các request (giây)
 CRAWL_DELAY = 1
 
+# Cấu hình crawl song song (page pool)
+CONCURRENCY = 4  # Số page (worker) chạy song song
+HOST_MAX_CONCURRENCY = 4  # Số request đồng thời tối đa tới cùng một host
+HOST_MIN_INTERVAL = 0.5  # Khoảng cách tối thiểu (giây) giữa hai request tới cùng một host
+HOST_INTERVAL_JITTER = 0.5  # Thời gian ngẫu nhiên cộng thêm (giây) để tránh request đều đặn
+
+# Chặn tài nguyên không cần thiết khi tải trang (URL hình ảnh vẫn đọc được từ thuộc tính src)
+BLOCK_RESOURCES = True
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+BLOCKED_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "analytics.tiktok.com",
+    "hotjar.com",
+    "clarity.ms",
+    "criteo.com",
+    "criteo.net",
+    "sp.zalo.me",
+]
+# Domain luôn được phép tải, kể cả khi khớp loại tài nguyên hoặc domain bị chặn
+ALLOWED_DOMAINS = []
+
+# Bắt JSON/XHR của API danh sách sản phẩm (--listing-source api)
+API_CAPTURE_URL_PATTERNS = [r"/api/", r"apibhx", r"[Pp]roduct", r"[Cc]ategory"]  # Regex URL của response cần ghi lại
+API_PAGE_PARAMS = ["pageIndex", "PageIndex", "pageNumber", "PageNumber", "page", "Page", "p"]  # Tên tham số phân trang
+API_REPLAY_MAX_PAGES = 50  # Số trang tối đa khi gọi lại endpoint
+# Các tên trường có thể gặp trong JSON sản phẩm, theo thứ tự ưu tiên
+API_FIELD_ALIASES = {
+    "product_id": ["id", "productId", "productID", "ProductId", "Id", "sku"],
+    "name": ["name", "productName", "ProductName", "Name", "title"],
+    "product_url": ["url", "productUrl", "ProductUrl", "Url", "link", "href", "slug"],
+    "price": ["price", "Price", "salePrice", "finalPrice", "sysPrice"],
+    "original_price": ["originalPrice", "basePrice", "listPrice", "oldPrice"],
+    "discount_percent": ["discountPercent", "discount", "promotionPercent"],
+    "image_url": ["image", "imageUrl", "avatar", "thumbnail", "img", "images"],
+}
+
+# Pipeline tải hình ảnh bất đồng bộ
+IMAGE_WORKERS = 8  # Số worker tải hình ảnh chạy song song
+IMAGE_HOST_CONCURRENCY = 6  # Số kết nối đồng thời tối đa tới cùng một host CDN
+IMAGE_MAX_CONNECTIONS = 16  # Số kết nối tối đa trong connection pool
+IMAGE_CHUNK_SIZE = 64 * 1024  # Kích thước mỗi lần ghi khi stream hình ảnh xuống đĩa (bytes)
+IMAGE_MIN_BYTES = 100  # Hình ảnh nhỏ hơn kích thước này bị coi là lỗi
+
+# Stage tạo thumbnail chạy trên process pool
+THUMBNAIL_SIZES = [200, 400]  # Kích thước cạnh dài (px); kích thước đầu tiên lưu với tiền tố 'thumb_', các kích thước khác 'thumb<size>_'
+THUMBNAIL_WORKERS = None  # Số process tạo thumbnail (None = số nhân CPU)
+THUMBNAIL_BATCH_SIZE = 16  # Số hình ảnh tối đa trong một batch gửi sang process
+THUMBNAIL_BATCH_WAIT = 0.2  # Thời gian chờ gom batch (giây)
+
+# Cấu hình dataset dạng cột (Parquet phân vùng theo ngày crawl/danh mục + Arrow IPC)
+DATASET_DIR = f"{OUTPUT_DIR}/dataset"  # Thư mục gốc của dataset
+DATASET_WRITE_IPC = True  # Ghi thêm file Arrow IPC cho mỗi lần chạy (memory-map được, đọc zero-copy)
+DATASET_COMPRESSION = "zstd"  # Codec nén Parquet (zstd, snappy, gzip hoặc none)
+
+# Cấu hình gộp file đầu ra theo subcategory (compact_outputs.py)
+COMPACT_DIR = f"{OUTPUT_DIR}/products/compacted"  # Mỗi subcategory một file JSON đã loại trùng + manifest.json
+COMPACT_ARCHIVE_DIR = f"{OUTPUT_DIR}/products/archive"  # Nơi chuyển các file theo lần chạy sau khi gộp
+COMPACT_WORKERS = None  # Số process gộp song song (None = số nhân CPU)
+
+# Trường lấy từ mỗi thẻ sản phẩm trên trang danh sách (listing_cards.py): trường -> (selector trong thẻ, thuộc tính)
+# Thuộc tính "text" lấy textContent đã bỏ khoảng trắng hai đầu, các thuộc tính khác lấy qua getAttribute
+LISTING_CARD_FIELDS = {
+    "name": (".product_name", "text"),
+    "discounted_price": (".product_price", "text"),
+    "original_price": (".text-12, .line-through, .price-old", "text"),
+    "discount_percent": (".discount-percent, .percent-discount", "text"),
+    "product_url": ("a", "href"),
+    "image_url": ("img", "src")
+}
+
+# Schema trang chi tiết sản phẩm, được biên dịch thành một hàm JavaScript chạy trong một lần page.evaluate (detail_extractor.py)
+# Mỗi trường: type (title, text, table, images) và các selector theo thứ tự ưu tiên
+DETAIL_SCHEMA = {
+    "title": {"type": "title"},
+    "name": {
+        "type": "text",
+        "title_separator": " | ",  # Ưu tiên phần đầu của tiêu đề trang, sau đó đến các selector
+        "selectors": ["h1.product-title", ".product-name", "h1", ".product_name"],
+        "non_empty": True  # Bỏ qua phần tử có văn bản rỗng
+    },
+    "price": {"type": "text", "selectors": [".product-price", ".price", ".product_price"]},
+    "description": {
+        "type": "text",
+        "selectors": [".product-description", ".description", ".detail-content", ".product-content"]
+    },
+    "specifications": {
+        "type": "table",
+        "rows": ".specifications tr, .product-specs tr, .product-attributes tr",
+        "cells": "td, th"  # Ô đầu tiên là tên thông số, ô thứ hai là giá trị
+    },
+    "image_urls": {
+        "type": "images",
+        "selectors": [
+            ".product-image img",
+            ".gallery img",
+            ".product-gallery img",
+            ".product img",
+            ".picture img",
+            "#product-detail-image img",
+            "#product-image img",
+            ".gallery-container img",
+            ".boxprodetail img",
+            ".img-product-big .img-fluid",
+            ".xzoom",
+            ".product-slider-large img"
+        ],
+        "attribute": "src",
+        "extensions": [".jpg", ".jpeg", ".png", ".gif", ".webp"],  # URL hợp lệ nếu có đuôi hình ảnh
+        "keywords": ["image", "photo", "img", "upload"],  # hoặc chứa một trong các từ khóa này
+        "fallback_min_size": 100  # Không selector nào có ảnh: lấy mọi ảnh lớn hơn kích thước này (px)
+    }
+}
+
 # Cấu hình cho trình duyệt
 BROWSER_CONFIG = {
     "headless": False,  # True để chạy ẩn, False để hiển thị UI
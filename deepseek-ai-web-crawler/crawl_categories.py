@@ -8,13 +8,10 @@ import time
 import logging
 import argparse
 from typing import List, Dict, Any
-from bs4 import BeautifulSoup
 import requests
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException
 
 from config import (
     BASE_URL, 
@@ -23,8 +20,12 @@ from config import (
     WAIT_TIME, 
     MAX_RETRIES,
     CRAWL_DELAY,
-    USER_AGENT
+    USER_AGENT,
+    HTML_CAPTURE_MODE
 )
+from page_readiness import wait_until_ready_driver
+from html_backends import parse_html
+from html_capture import capture_html, CAPTURE_MODES
 
 # Thiết lập logging
 logging.basicConfig(
@@ -41,14 +42,16 @@ logger = logging.getLogger(__name__)
 class CategoryCrawler:
     """Crawler chuyên biệt cho việc crawl danh mục"""
     
-    def __init__(self, output_file: str = "categories.json"):
+    def __init__(self, output_file: str = "categories.json", capture_mode: str = HTML_CAPTURE_MODE):
         """
         Khởi tạo CategoryCrawler
         
         Args:
             output_file: Tên file đầu ra để lưu danh mục
+            capture_mode: Cách lấy HTML từ trình duyệt: full (toàn bộ trang) hoặc region (chỉ menu danh mục)
         """
         self.output_file = os.path.join(OUTPUT_DIR, output_file)
+        self.capture_mode = capture_mode
         self.driver = None
         
         # Đảm bảo thư mục đầu ra tồn tại
@@ -72,28 +75,9 @@ class CategoryCrawler:
             self.driver.quit()
             self.driver = None
     
-    def wait_for_page_load(self, timeout: int = WAIT_TIME):
-        """Đợi trang tải xong"""
-        try:
-            self.driver.implicitly_wait(timeout)
-            # Đợi JavaScript hoàn thành
-            WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
-            # Đợi cho phần tử body xuất hiện để đảm bảo DOM được tải
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            # Thêm thời gian chờ để đảm bảo AJAX load xong
-            time.sleep(3)
-            logger.info("Trang đã tải xong")
-            return True
-        except TimeoutException as e:
-            logger.error(f"Timeout khi đợi trang tải: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Lỗi khi đợi trang tải: {e}")
-            return False
+    def wait_for_page_load(self, timeout: int = WAIT_TIME, page_type: str = "home"):
+        """Đợi trang có đủ các selector cần thiết cho loại trang"""
+        return wait_until_ready_driver(self.driver, page_type, timeout)
     
     # def close_popups(self):
         """Đóng các popup và thông báo trên trang web
@@ -276,9 +260,9 @@ class CategoryCrawler:
             # else:
             #     logger.info("Không có popup, tiến hành crawl ngay")
             
-            # Lấy HTML và phân tích với BeautifulSoup
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
+            # Lấy HTML (toàn bộ trang hoặc chỉ menu danh mục) và phân tích (html_backends.py)
+            html, _ = capture_html(self.driver, "home", self.capture_mode)
+            soup = parse_html(html)
             
             # Tìm tất cả các phần tử danh mục
             category_elements = soup.select(CATEGORY_CSS_SELECTOR)
@@ -345,7 +329,7 @@ class CategoryCrawler:
         try:
             # Truy cập trang danh mục
             self.driver.get(category_url)
-            self.wait_for_page_load()
+            self.wait_for_page_load(page_type="listing")
             
             # Đóng các popup sau khi trang đã tải xong
             # popup_detected = self.close_popups()
@@ -354,9 +338,9 @@ class CategoryCrawler:
             # else:
             #     logger.info("Không có popup, tiến hành crawl ngay")
             
-            # Lấy HTML và phân tích
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
+            # Lấy HTML (toàn bộ trang hoặc chỉ vùng danh mục con) và phân tích
+            html, _ = capture_html(self.driver, "subcategories", self.capture_mode)
+            soup = parse_html(html)
             
             # Tìm các danh mục con - thường nằm trong một menu hoặc sidebar
             # (Selector này cần điều chỉnh theo cấu trúc thực tế của trang web)
@@ -434,9 +418,11 @@ def main():
     parser = argparse.ArgumentParser(description="Crawler danh mục và danh mục con")
     parser.add_argument("--output", type=str, default="categories.json",
                        help="Tên file đầu ra (mặc định: categories.json)")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default=HTML_CAPTURE_MODE,
+                       help="Cách lấy HTML: full (toàn bộ trang) hoặc region (chỉ vùng danh mục)")
     args = parser.parse_args()
     
-    crawler = CategoryCrawler(output_file=args.output)
+    crawler = CategoryCrawler(output_file=args.output, capture_mode=args.capture)
     crawler.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Journal ghi trước (write-ahead) cho việc tiếp tục crawl: mỗi URL hoặc danh mục hoàn thành được nối thêm
+một dòng vào file journal. Định kỳ, trạng thái được ghi thành snapshot và journal được làm rỗng,
+nên kích thước file không tăng theo số lần lưu và việc phát lại chỉ mất vài mili giây.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Set
+
+from config import JOURNAL_FILE, JOURNAL_FSYNC, JOURNAL_COMPACT_EVERY
+from jsonl_sink import JsonlSink, read_jsonl
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = ".snapshot.json"
+
+
+class CrawlJournal:
+    """Journal các URL và danh mục đã hoàn thành, kèm snapshot định kỳ"""
+
+    def __init__(self, path: str = JOURNAL_FILE,
+                 fsync: str = JOURNAL_FSYNC,
+                 compact_every: int = JOURNAL_COMPACT_EVERY):
+        """
+        Khởi tạo CrawlJournal
+
+        Args:
+            path: Đường dẫn file journal (snapshot nằm ở <path>.snapshot.json)
+            fsync: Chính sách fsync cho mỗi dòng journal (always hoặc never)
+            compact_every: Số dòng journal trước khi ghi snapshot và làm rỗng journal
+        """
+        self.path = path
+        self.snapshot_path = path + SNAPSHOT_SUFFIX
+        self.compact_every = max(1, compact_every)
+        self.sink = JsonlSink(path, fsync=fsync, compress=False)
+        self.lock = threading.Lock()
+        self.urls: Dict[str, str] = {}  # url -> trạng thái (ok/failed)
+        self.units: Set[str] = set()     # các danh mục/danh mục con đã hoàn thành
+        self.pending = 0                 # số dòng journal kể từ snapshot gần nhất
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _apply(self, record: Dict[str, Any]):
+        if record.get("type") == "url":
+            self.urls[record["url"]] = record.get("status", "ok")
+        elif record.get("type") == "unit":
+            self.units.add(record["key"])
+
+    def replay(self) -> "CrawlJournal":
+        """
+        Nạp snapshot rồi phát lại các dòng journal ghi sau snapshot
+
+        Returns:
+            CrawlJournal: Chính journal này (để gọi nối tiếp)
+        """
+        start_time = time.perf_counter()
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                self.urls.update(snapshot.get("urls", {}))
+                self.units.update(snapshot.get("units", []))
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc snapshot {self.snapshot_path}: {e}")
+
+        for record in read_jsonl(self.path):
+            self._apply(record)
+            self.pending += 1
+
+        elapsed = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Đã phát lại journal {self.path}: {len(self.completed_urls())} URL, "
+                    f"{len(self.units)} danh mục hoàn thành trong {elapsed:.1f} ms")
+        return self
+
+    def reset(self):
+        """Xóa journal và snapshot cũ để bắt đầu lượt crawl mới"""
+        with self.lock:
+            self.sink.close()
+            for path in (self.path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.urls.clear()
+            self.units.clear()
+            self.pending = 0
+
+    def _append(self, record: Dict[str, Any]):
+        with self.lock:
+            self._apply(record)
+            self.sink.write(record)
+            self.sink.flush()
+            self.pending += 1
+            if self.pending >= self.compact_every:
+                self._compact()
+
+    def record_url(self, url: str, status: str = "ok"):
+        """Ghi nhận một URL đã xử lý xong (ok hoặc failed)"""
+        self._append({"type": "url", "url": url, "status": status})
+
+    def record_unit(self, key: str):
+        """Ghi nhận một danh mục/danh mục con đã crawl xong"""
+        self._append({"type": "unit", "key": key})
+
+    def is_unit_done(self, key: str) -> bool:
+        """Kiểm tra danh mục/danh mục con đã hoàn thành ở lần chạy trước chưa"""
+        return key in self.units
+
+    def completed_urls(self) -> Set[str]:
+        """Các URL đã xử lý thành công"""
+        return {url for url, status in self.urls.items() if status == "ok"}
+
+    def _compact(self):
+        # Ghi snapshot vào file tạm rồi đổi tên, sau đó mới làm rỗng journal
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "urls": self.urls,
+                "units": sorted(self.units),
+            }, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self.sink.close()
+        open(self.path, "w").close()
+        self.pending = 0
+        logger.debug(f"Đã nén journal vào snapshot {self.snapshot_path}")
+
+    def compact(self):
+        """Ghi snapshot và làm rỗng journal"""
+        with self.lock:
+            self._compact()
+
+    def close(self):
+        """Nén journal lần cuối và đóng file"""
+        with self.lock:
+            if self.pending:
+                try:
+                    self._compact()
+                except Exception as e:
+                    logger.error(f"Lỗi khi nén journal {self.path}: {e}")
+            self.sink.close()
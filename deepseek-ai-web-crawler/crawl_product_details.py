@@ -3,19 +3,15 @@
 Crawler cho chi tiết sản phẩm từ danh sách sản phẩm đã có
 """
 import os
-import json
 import time
 import csv
 import logging
 import argparse
-from typing import List, Dict, Any, Set
-from bs4 import BeautifulSoup
+from typing import List, Dict, Any, Set, Tuple
 import requests
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException
 
 from config import (
     BASE_URL, 
@@ -24,8 +20,20 @@ from config import (
     WAIT_TIME, 
     MAX_RETRIES,
     CRAWL_DELAY,
-    USER_AGENT
+    USER_AGENT,
+    IMAGE_REVALIDATE_AFTER,
+    RECRAWL_MAX_AGE,
+    HTML_CAPTURE_MODE
 )
+from page_readiness import wait_until_ready_driver
+from html_backends import Document, parse_html
+from html_capture import capture_html, format_capture_stats, CAPTURE_MODES
+from selector_plan import compile_plan
+from image_store import get_image_store
+from validator_cache import get_validator_cache
+from crawl_state import CrawlStateStore
+from jsonl_sink import JsonlSink, jsonl_path_for, read_jsonl, finalize_json, seed_from_json
+from page_archive import archive_page
 
 # Thiết lập logging
 logging.basicConfig(
@@ -45,7 +53,10 @@ class ProductDetailsCrawler:
     def __init__(self, 
                 product_list_file: str = "product_list.csv",
                 output_file: str = "product_details.json",
-                download_images: bool = True):
+                download_images: bool = True,
+                incremental: bool = False,
+                recrawl_after: float = RECRAWL_MAX_AGE,
+                capture_mode: str = HTML_CAPTURE_MODE):
         """
         Khởi tạo ProductDetailsCrawler
         
@@ -53,18 +64,31 @@ class ProductDetailsCrawler:
             product_list_file: Tên file chứa danh sách sản phẩm
             output_file: Tên file đầu ra để lưu chi tiết sản phẩm
             download_images: Tải xuống hình ảnh sản phẩm hay không
+            incremental: Chỉ crawl lại sản phẩm mới, lỗi, quá hạn hoặc đổi giá (theo bảng trạng thái crawl)
+            recrawl_after: Thời hạn (giây) trước khi sản phẩm đã crawl được coi là quá hạn
+            capture_mode: Cách lấy HTML từ trình duyệt: full (toàn bộ trang) hoặc region (chỉ khối chi tiết sản phẩm)
         """
         self.product_list_file = os.path.join(OUTPUT_DIR, product_list_file)
         self.output_file = os.path.join(OUTPUT_DIR, output_file)
+        # Các batch được nối thêm vào file JSONL; file JSON dạng mảng chỉ được tạo khi finalize
+        self.jsonl_file = jsonl_path_for(self.output_file)
+        self.sink = JsonlSink(self.jsonl_file)
         self.download_images = download_images
+        self.capture_mode = capture_mode
         self.image_dir = os.path.join(OUTPUT_DIR, "images")
         self.driver = None
         self.processed_urls = set()  # Các URL đã xử lý
+        self.incremental = incremental
+        self.state = CrawlStateStore(max_age=recrawl_after)
         
         # Đảm bảo thư mục đầu ra tồn tại
         os.makedirs(OUTPUT_DIR, exist_ok=True)
+        self.image_store = None
+        self.validators = None
         if download_images:
             os.makedirs(self.image_dir, exist_ok=True)
+            self.image_store = get_image_store()
+            self.validators = get_validator_cache()
     
     def setup_driver(self):
         """Thiết lập driver với các options để tránh phát hiện"""
@@ -84,27 +108,9 @@ class ProductDetailsCrawler:
             self.driver.quit()
             self.driver = None
     
-    def wait_for_page_load(self, timeout: int = WAIT_TIME):
-        """Đợi trang tải xong"""
-        try:
-            self.driver.implicitly_wait(timeout)
-            # Đợi JavaScript hoàn thành
-            WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
-            # Đợi cho phần tử body xuất hiện để đảm bảo DOM được tải
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            # Thêm thời gian chờ để đảm bảo AJAX load xong
-            time.sleep(3)
-            return True
-        except TimeoutException as e:
-            logger.error(f"Timeout khi đợi trang tải: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Lỗi khi đợi trang tải: {e}")
-            return False
+    def wait_for_page_load(self, timeout: int = WAIT_TIME, page_type: str = "detail"):
+        """Đợi trang có đủ các selector cần thiết cho loại trang"""
+        return wait_until_ready_driver(self.driver, page_type, timeout)
     
     def close_popups(self):
         """Đóng các popup và thông báo trên trang web
@@ -290,7 +296,8 @@ class ProductDetailsCrawler:
     
     def load_processed_urls(self) -> Set[str]:
         """
-        Tải danh sách URL sản phẩm đã xử lý từ file đầu ra (nếu có)
+        Tải danh sách URL sản phẩm đã xử lý từ file JSONL đầu ra (nếu có).
+        Nếu chỉ có file JSON dạng mảng của phiên bản cũ, dữ liệu được chuyển sang JSONL một lần.
         
         Returns:
             Set[str]: Tập hợp các URL đã xử lý
@@ -298,20 +305,21 @@ class ProductDetailsCrawler:
         processed_urls = set()
         
         try:
-            if os.path.exists(self.output_file):
-                with open(self.output_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                    for product in existing_data:
-                        if 'product_url' in product:
-                            processed_urls.add(product['product_url'])
-                            
-                logger.info(f"Đã tải {len(processed_urls)} URL sản phẩm đã xử lý từ {self.output_file}")
+            if not os.path.exists(self.jsonl_file) and os.path.exists(self.output_file):
+                seed_from_json(self.output_file, self.sink)
+            
+            for product in read_jsonl(self.jsonl_file):
+                if 'product_url' in product:
+                    processed_urls.add(product['product_url'])
+            
+            if processed_urls:
+                logger.info(f"Đã tải {len(processed_urls)} URL sản phẩm đã xử lý từ {self.jsonl_file}")
         except Exception as e:
             logger.error(f"Lỗi khi tải URL đã xử lý: {e}")
         
         return processed_urls
     
-    def crawl_product_details(self, product: Dict[str, Any]) -> Dict[str, Any]:
+    def crawl_product_details(self, product: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         """
         Crawl chi tiết sản phẩm từ URL
         
@@ -319,7 +327,7 @@ class ProductDetailsCrawler:
             product: Thông tin cơ bản về sản phẩm
             
         Returns:
-            Dict[str, Any]: Chi tiết sản phẩm
+            Tuple[Dict[str, Any], bool]: Chi tiết sản phẩm và True nếu trang chi tiết tải và phân tích thành công
         """
         product_url = product['product_url']
         product_name = product['name']
@@ -341,94 +349,104 @@ class ProductDetailsCrawler:
             else:
                 logger.info("Không có popup, tiến hành crawl ngay")
             
-            # Lấy HTML và phân tích
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Trích xuất thông tin chi tiết sử dụng các selectors trong config
-            for key, selector_list in SELECTORS.items():
-                # Bỏ qua các trường đã có trong thông tin cơ bản
-                if key in product_details and product_details[key]:
-                    continue
-                
-                # Thử lần lượt các selector cho đến khi tìm thấy thông tin
-                for selector in selector_list:
-                    elements = soup.select(selector)
-                    if elements:
-                        if key == "description":
-                            # Đối với mô tả, kết hợp văn bản từ nhiều phần tử
-                            product_details[key] = "\n".join([elem.get_text(strip=True) for elem in elements])
-                        else:
-                            # Đối với các trường khác, lấy văn bản từ phần tử đầu tiên
-                            product_details[key] = elements[0].get_text(strip=True)
-                        break
-            
-            # Trích xuất các thông số kỹ thuật từ bảng (nếu có)
-            specs_table = {}
-            table_selectors = ["table.specifications", "table.product-specs", ".product-attributes table"]
+            # Lấy HTML (toàn bộ trang hoặc chỉ khối chi tiết sản phẩm), lưu vào archive và phân tích
+            html, scoped = capture_html(self.driver, "detail", self.capture_mode)
+            if not scoped:
+                archive_page(product_url, html, "detail", source="product_details")
+            soup = parse_html(html)
+            product_details = self.parse_detail_page(soup, product_details)
             
-            for table_selector in table_selectors:
-                tables = soup.select(table_selector)
-                if tables:
-                    for table in tables:
-                        rows = table.select("tr")
-                        for row in rows:
-                            cells = row.select("td, th")
-                            if len(cells) >= 2:
-                                key = cells[0].get_text(strip=True)
-                                value = cells[1].get_text(strip=True)
-                                if key:
-                                    specs_table[key] = value
-                    
-                    # Nếu đã tìm thấy bảng thông số, thoát khỏi vòng lặp
-                    if specs_table:
-                        break
-            
-            # Nếu không tìm thấy bảng, thử các phương pháp khác
-            if not specs_table:
-                # Thử tìm trong các cặp div
-                spec_rows = soup.select(".product-specs .row, .specifications .item")
-                for row in spec_rows:
-                    key_elem = row.select_one(".spec-name, .label")
-                    value_elem = row.select_one(".spec-value, .value")
-                    if key_elem and value_elem:
-                        key = key_elem.get_text(strip=True)
-                        value = value_elem.get_text(strip=True)
-                        if key:
-                            specs_table[key] = value
-            
-            # Thêm thông số kỹ thuật vào chi tiết sản phẩm
-            if specs_table:
-                product_details['specifications'] = specs_table
-            
-            # Trích xuất các URL hình ảnh
-            image_urls = self.extract_image_urls(soup)
-            if image_urls:
-                product_details['image_urls'] = image_urls
+            # Tải xuống hình ảnh nếu được yêu cầu
+            image_urls = product_details.get('image_urls')
+            if image_urls and self.download_images:
+                downloaded_images = self.download_product_images(image_urls, product_name)
+                if downloaded_images:
+                    product_details['local_images'] = downloaded_images
                 
-                # Tải xuống hình ảnh nếu được yêu cầu
-                if self.download_images:
-                    downloaded_images = self.download_product_images(image_urls, product_name)
-                    if downloaded_images:
-                        product_details['local_images'] = downloaded_images
-            
-            # Trích xuất đánh giá và bình luận (nếu có)
-            reviews = self.extract_reviews(soup)
-            if reviews:
-                product_details['reviews'] = reviews
-                
-            return product_details
+            return product_details, True
             
         except Exception as e:
             logger.error(f"Lỗi khi crawl chi tiết sản phẩm {product_name}: {e}")
-            return product_details  # Trả về thông tin cơ bản nếu có lỗi
+            return product_details, False  # Trả về thông tin cơ bản nếu có lỗi
     
-    def extract_image_urls(self, soup: BeautifulSoup) -> List[str]:
+    @staticmethod
+    def parse_detail_page(soup: Document, product: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Trích xuất chi tiết sản phẩm từ HTML trang sản phẩm (không cần trình duyệt, dùng lại được cho reextract.py)
+        
+        Args:
+            soup: Tài liệu HTML của trang
+            product: Thông tin cơ bản về sản phẩm
+            
+        Returns:
+            Dict[str, Any]: Chi tiết sản phẩm (bản sao của product kèm các trường trích xuất được)
+        """
+        product_details = dict(product)
+        
+        # Trích xuất thông tin chi tiết sử dụng các selectors trong config
+        # (mọi selector dự phòng chạy trong một lần duyệt DOM, mô tả nối văn bản của mọi phần tử khớp)
+        for key, value in compile_plan(SELECTORS).extract(soup).items():
+            # Bỏ qua các trường đã có trong thông tin cơ bản
+            if not product_details.get(key):
+                product_details[key] = value
+        
+        # Trích xuất các thông số kỹ thuật từ bảng (nếu có)
+        specs_table = {}
+        table_selectors = ["table.specifications", "table.product-specs", ".product-attributes table"]
+        
+        for table_selector in table_selectors:
+            tables = soup.select(table_selector)
+            if tables:
+                for table in tables:
+                    rows = table.select("tr")
+                    for row in rows:
+                        cells = row.select("td, th")
+                        if len(cells) >= 2:
+                            key = cells[0].get_text(strip=True)
+                            value = cells[1].get_text(strip=True)
+                            if key:
+                                specs_table[key] = value
+                
+                # Nếu đã tìm thấy bảng thông số, thoát khỏi vòng lặp
+                if specs_table:
+                    break
+        
+        # Nếu không tìm thấy bảng, thử các phương pháp khác
+        if not specs_table:
+            # Thử tìm trong các cặp div
+            spec_rows = soup.select(".product-specs .row, .specifications .item")
+            for row in spec_rows:
+                key_elem = row.select_one(".spec-name, .label")
+                value_elem = row.select_one(".spec-value, .value")
+                if key_elem and value_elem:
+                    key = key_elem.get_text(strip=True)
+                    value = value_elem.get_text(strip=True)
+                    if key:
+                        specs_table[key] = value
+        
+        # Thêm thông số kỹ thuật vào chi tiết sản phẩm
+        if specs_table:
+            product_details['specifications'] = specs_table
+        
+        # Trích xuất các URL hình ảnh
+        image_urls = ProductDetailsCrawler.extract_image_urls(soup)
+        if image_urls:
+            product_details['image_urls'] = image_urls
+        
+        # Trích xuất đánh giá và bình luận (nếu có)
+        reviews = ProductDetailsCrawler.extract_reviews(soup)
+        if reviews:
+            product_details['reviews'] = reviews
+        
+        return product_details
+    
+    @staticmethod
+    def extract_image_urls(soup: Document) -> List[str]:
         """
         Trích xuất các URL hình ảnh từ trang sản phẩm
         
         Args:
-            soup: Đối tượng BeautifulSoup của trang
+            soup: Tài liệu HTML của trang
             
         Returns:
             List[str]: Danh sách các URL hình ảnh
@@ -502,17 +520,35 @@ class ProductDetailsCrawler:
                 img_filename = f"{safe_name}_{i+1}.{ext}"
                 img_path = os.path.join(self.image_dir, img_filename)
                 
-                # Tải và lưu hình ảnh
+                # URL đã có trong kho hình ảnh: tạo hard link, không gọi mạng
+                # (validator đã cũ thì kiểm tra lại bằng conditional GET)
+                cached_blob = self.image_store.lookup(img_url)
+                if cached_blob and not self.validators.needs_revalidation(img_url, IMAGE_REVALIDATE_AFTER):
+                    if self.image_store.materialize(cached_blob, img_path):
+                        downloaded_images.append(img_path)
+                        continue
+                
+                # Tải vào file tạm rồi đưa vào kho hình ảnh
                 headers = {'User-Agent': USER_AGENT}
+                if cached_blob:
+                    headers.update(self.validators.conditional_headers(img_url))
                 response = requests.get(img_url, headers=headers, stream=True, timeout=10)
                 
-                if response.status_code == 200:
-                    with open(img_path, 'wb') as f:
+                if response.status_code == 304 and cached_blob:
+                    # Hình ảnh không đổi, dùng lại blob trong kho
+                    self.validators.mark_not_modified(img_url, response.headers)
+                    if self.image_store.materialize(cached_blob, img_path):
+                        downloaded_images.append(img_path)
+                elif response.status_code == 200:
+                    temp_path = img_path + ".part"
+                    with open(temp_path, 'wb') as f:
                         for chunk in response.iter_content(1024):
                             f.write(chunk)
                     
-                    downloaded_images.append(img_path)
-                    logger.info(f"Đã tải hình ảnh: {img_path}")
+                    if self.image_store.store_download(img_url, temp_path, img_path, f".{ext}"):
+                        self.validators.update(img_url, response.headers)
+                        downloaded_images.append(img_path)
+                        logger.info(f"Đã tải hình ảnh: {img_path}")
                 else:
                     logger.warning(f"Không thể tải hình ảnh từ {img_url}: HTTP {response.status_code}")
             except Exception as e:
@@ -520,12 +556,13 @@ class ProductDetailsCrawler:
         
         return downloaded_images
     
-    def extract_reviews(self, soup: BeautifulSoup) -> List[Dict[str, Any]]:
+    @staticmethod
+    def extract_reviews(soup: Document) -> List[Dict[str, Any]]:
         """
         Trích xuất đánh giá và bình luận từ trang sản phẩm
         
         Args:
-            soup: Đối tượng BeautifulSoup của trang
+            soup: Tài liệu HTML của trang
             
         Returns:
             List[Dict[str, Any]]: Danh sách các đánh giá
@@ -595,37 +632,38 @@ class ProductDetailsCrawler:
     
     def save_products_json(self, products: List[Dict[str, Any]], append: bool = True):
         """
-        Lưu chi tiết sản phẩm vào file JSON
+        Lưu chi tiết sản phẩm bằng cách nối thêm vào file JSONL (chi phí chỉ phụ thuộc kích thước batch)
         
         Args:
             products: Danh sách chi tiết sản phẩm
-            append: Nếu True, sẽ thêm vào file hiện có
+            append: Nếu True, sẽ thêm vào file hiện có; False sẽ ghi lại từ đầu
         """
         if not products:
             logger.warning("Không có chi tiết sản phẩm để lưu")
             return
         
-        existing_data = []
-        
-        # Nếu cần thêm vào file hiện có và file đã tồn tại
-        if append and os.path.exists(self.output_file):
-            try:
-                with open(self.output_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                    logger.info(f"Đã tải {len(existing_data)} sản phẩm từ file hiện có")
-            except Exception as e:
-                logger.error(f"Lỗi khi tải dữ liệu hiện có: {e}")
-        
-        # Gộp dữ liệu hiện có và dữ liệu mới
-        all_data = existing_data + products
-        
         try:
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_data, f, ensure_ascii=False, indent=4)
-            logger.info(f"Đã lưu {len(all_data)} sản phẩm vào {self.output_file}")
+            if not append:
+                self.sink.close()
+                if os.path.exists(self.jsonl_file):
+                    os.remove(self.jsonl_file)
+            self.sink.write_many(products)
+            logger.info(f"Đã lưu {len(products)} sản phẩm vào {self.jsonl_file}")
         except Exception as e:
             logger.error(f"Lỗi khi lưu chi tiết sản phẩm: {e}")
     
+    def finalize_output(self) -> int:
+        """
+        Tạo file JSON dạng mảng từ file JSONL (bản crawl lại thay thế bản cũ cùng URL)
+        
+        Returns:
+            int: Số sản phẩm trong file JSON
+        """
+        self.sink.close()
+        if not os.path.exists(self.jsonl_file):
+            return 0
+        return finalize_json(self.jsonl_file, self.output_file)
+    
     def run(self, batch_size: int = 10):
         """
         Hàm chính để chạy crawler
@@ -646,8 +684,15 @@ class ProductDetailsCrawler:
             self.setup_driver()
         
         try:
-            # Lọc ra các sản phẩm chưa xử lý
-            unprocessed_products = [p for p in product_list if p['product_url'] not in self.processed_urls]
+            if self.incremental:
+                # Sản phẩm trong file đầu ra cũ được nhập vào bảng trạng thái như vừa crawl
+                self.state.import_urls(self.processed_urls)
+                unprocessed_products = [p for p in product_list
+                                        if self.state.should_fetch(p['product_url'], p.get('price'))]
+                logger.info(f"Trạng thái crawl: {self.state.format_stats()}")
+            else:
+                # Lọc ra các sản phẩm chưa xử lý
+                unprocessed_products = [p for p in product_list if p['product_url'] not in self.processed_urls]
             logger.info(f"Cần crawl chi tiết cho {len(unprocessed_products)}/{len(product_list)} sản phẩm")
             
             if not unprocessed_products:
@@ -660,11 +705,16 @@ class ProductDetailsCrawler:
             
             for product in unprocessed_products:
                 # Crawl chi tiết sản phẩm
-                product_details = self.crawl_product_details(product)
+                product_details, success = self.crawl_product_details(product)
                 
                 # Thêm vào danh sách và đánh dấu là đã xử lý
                 detailed_products.append(product_details)
                 self.processed_urls.add(product['product_url'])
+                
+                if success:
+                    self.state.record(product['product_url'], product_details)
+                else:
+                    self.state.record_failure(product['product_url'])
                 total_processed += 1
                 
                 # Lưu theo batch để tránh mất dữ liệu
@@ -682,11 +732,16 @@ class ProductDetailsCrawler:
                 logger.info(f"Đã lưu batch cuối cùng, tổng cộng {total_processed}/{len(unprocessed_products)} sản phẩm")
             
             logger.info(f"Hoàn thành crawl chi tiết {total_processed} sản phẩm")
+            if self.incremental:
+                logger.info(f"Trạng thái crawl: {self.state.format_stats()}")
+            if format_capture_stats():
+                logger.info(f"Lấy HTML theo vùng: {format_capture_stats()}")
             
         except Exception as e:
             logger.error(f"Lỗi khi chạy crawler chi tiết sản phẩm: {e}")
         finally:
             self.close_driver()
+            self.finalize_output()
 
 def main():
     """Hàm main để chạy từ dòng lệnh"""
@@ -699,12 +754,21 @@ def main():
                       help="Tải xuống hình ảnh sản phẩm")
     parser.add_argument("--batch-size", type=int, default=10,
                       help="Số lượng sản phẩm xử lý trước khi lưu (mặc định: 10)")
+    parser.add_argument("--incremental", action="store_true",
+                      help="Chỉ crawl lại sản phẩm mới, lỗi, quá hạn hoặc đổi giá")
+    parser.add_argument("--recrawl-after", type=float, default=RECRAWL_MAX_AGE / 3600,
+                      help="Chế độ incremental: tải lại sản phẩm đã crawl sau số giờ này")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default=HTML_CAPTURE_MODE,
+                      help="Cách lấy HTML: full (toàn bộ trang) hoặc region (chỉ khối chi tiết sản phẩm)")
     args = parser.parse_args()
     
     crawler = ProductDetailsCrawler(
         product_list_file=args.product_list,
         output_file=args.output,
-        download_images=args.download_images
+        download_images=args.download_images,
+        incremental=args.incremental,
+        recrawl_after=args.recrawl_after * 3600,
+        capture_mode=args.capture
     )
     crawler.run(batch_size=args.batch_size)
 
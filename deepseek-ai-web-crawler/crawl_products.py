@@ -9,12 +9,9 @@ import csv
 import logging
 import argparse
 from typing import List, Dict, Any, Set
-from bs4 import BeautifulSoup
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException
 
 from config import (
     BASE_URL, 
@@ -23,8 +20,14 @@ from config import (
     WAIT_TIME, 
     MAX_RETRIES,
     CRAWL_DELAY,
-    USER_AGENT
+    USER_AGENT,
+    HTML_CAPTURE_MODE
 )
+from page_readiness import wait_until_ready_driver
+from html_backends import parse_html
+from html_capture import capture_html, format_capture_stats, CAPTURE_MODES
+from stream_readers import collect_field
+from page_archive import archive_page
 
 # Thiết lập logging
 logging.basicConfig(
@@ -43,18 +46,26 @@ class ProductListCrawler:
     
     def __init__(self, 
                 category_file: str = "categories.json",
-                output_file: str = "product_list.csv"):
+                output_file: str = "product_list.csv",
+                incremental: bool = False,
+                capture_mode: str = HTML_CAPTURE_MODE):
         """
         Khởi tạo ProductListCrawler
         
         Args:
             category_file: Tên file chứa danh sách danh mục
             output_file: Tên file đầu ra để lưu danh sách sản phẩm
+            incremental: Liệt kê lại toàn bộ sản phẩm với giá hiện tại (ghi đè file đầu ra)
+                để crawler chi tiết so sánh với bảng trạng thái crawl
+            capture_mode: Cách lấy HTML từ trình duyệt: full (toàn bộ trang) hoặc region (chỉ các thẻ sản phẩm)
         """
         self.category_file = os.path.join(OUTPUT_DIR, category_file)
         self.output_file = os.path.join(OUTPUT_DIR, output_file)
+        self.incremental = incremental
+        self.capture_mode = capture_mode
         self.driver = None
         self.seen_urls = set()  # Tập hợp URL đã thấy để tránh trùng lặp
+        self.overwrite_output = False  # Lần ghi đầu tiên ghi đè file đầu ra (chế độ incremental)
         
         # Đảm bảo thư mục đầu ra tồn tại
         os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -77,27 +88,9 @@ class ProductListCrawler:
             self.driver.quit()
             self.driver = None
     
-    def wait_for_page_load(self, timeout: int = WAIT_TIME):
-        """Đợi trang tải xong"""
-        try:
-            self.driver.implicitly_wait(timeout)
-            # Đợi JavaScript hoàn thành
-            WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
-            # Đợi cho phần tử body xuất hiện để đảm bảo DOM được tải
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            # Thêm thời gian chờ để đảm bảo AJAX load xong
-            time.sleep(3)
-            return True
-        except TimeoutException as e:
-            logger.error(f"Timeout khi đợi trang tải: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Lỗi khi đợi trang tải: {e}")
-            return False
+    def wait_for_page_load(self, timeout: int = WAIT_TIME, page_type: str = "listing"):
+        """Đợi trang có đủ các selector cần thiết cho loại trang"""
+        return wait_until_ready_driver(self.driver, page_type, timeout)
     
     def scroll_page_slowly(self, max_scroll_time: int = 20):
         """Scroll trang chậm để tải nội dung lazy load"""
@@ -148,14 +141,16 @@ class ProductListCrawler:
         """
         seen_urls = set()
         
+        if self.incremental:
+            # Giá ở trang danh sách là tín hiệu để phát hiện thay đổi, nên không bỏ qua sản phẩm đã thấy
+            logger.info("Chế độ incremental: liệt kê lại toàn bộ sản phẩm để so sánh giá")
+            return seen_urls
+        
         try:
             if os.path.exists(self.output_file):
-                with open(self.output_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if 'product_url' in row and row['product_url']:
-                            seen_urls.add(row['product_url'])
-                    logger.info(f"Đã tải {len(seen_urls)} URL sản phẩm đã thấy từ {self.output_file}")
+                # Chỉ đọc cột product_url, không tạo dict cho toàn bộ dòng
+                seen_urls = collect_field(self.output_file, 'product_url')
+                logger.info(f"Đã tải {len(seen_urls)} URL sản phẩm đã thấy từ {self.output_file}")
         except Exception as e:
             logger.error(f"Lỗi khi tải URL đã thấy: {e}")
         
@@ -350,9 +345,11 @@ class ProductListCrawler:
             # Scroll trang để tải tất cả sản phẩm (nếu có lazy load)
             self.scroll_page_slowly()
             
-            # Lấy HTML và phân tích
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
+            # Lấy HTML (toàn bộ trang hoặc chỉ vùng thẻ sản phẩm) và phân tích
+            html, scoped = capture_html(self.driver, "listing", self.capture_mode)
+            if not scoped:
+                archive_page(category_url, html, "listing", source="products")
+            soup = parse_html(html)
             
             # Tìm tất cả sản phẩm
             product_elements = soup.select(PRODUCT_CSS_SELECTOR)
@@ -421,6 +418,9 @@ class ProductListCrawler:
             logger.warning("Không có sản phẩm để lưu")
             return
         
+        if self.overwrite_output:
+            append = False
+            self.overwrite_output = False
         mode = 'a' if append and os.path.exists(self.output_file) else 'w'
         
         try:
@@ -452,6 +452,7 @@ class ProductListCrawler:
             self.setup_driver()
         
         self.seen_urls = self.load_seen_urls()
+        self.overwrite_output = self.incremental
         
         try:
             # Các danh mục đã được tải từ file
@@ -492,6 +493,8 @@ class ProductListCrawler:
                 time.sleep(CRAWL_DELAY)
             
             logger.info(f"Đã crawl tổng cộng {len(all_products)} sản phẩm từ {len(categories)} danh mục")
+            if format_capture_stats():
+                logger.info(f"Lấy HTML theo vùng: {format_capture_stats()}")
             
         except Exception as e:
             logger.error(f"Lỗi khi chạy crawler: {e}")
@@ -510,11 +513,17 @@ def main():
                       help="File chứa danh sách danh mục (mặc định: categories.json)")
     parser.add_argument("--output", type=str, default="product_list.csv",
                       help="File đầu ra cho danh sách sản phẩm (mặc định: product_list.csv)")
+    parser.add_argument("--incremental", action="store_true",
+                      help="Liệt kê lại toàn bộ sản phẩm với giá hiện tại (ghi đè file đầu ra)")
+    parser.add_argument("--capture", choices=CAPTURE_MODES, default=HTML_CAPTURE_MODE,
+                      help="Cách lấy HTML: full (toàn bộ trang) hoặc region (chỉ các thẻ sản phẩm)")
     args = parser.parse_args()
     
     crawler = ProductListCrawler(
         category_file=args.category_file,
-        output_file=args.output
+        output_file=args.output,
+        incremental=args.incremental,
+        capture_mode=args.capture
     )
     crawler.run()
 
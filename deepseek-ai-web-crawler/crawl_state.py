@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Trạng thái crawl bền vững theo từng URL sản phẩm (SQLite): lần tải cuối, hash nội dung, giá và trạng thái.
+Chế độ incremental dùng bảng này để chỉ tải lại sản phẩm mới, lỗi, quá hạn hoặc đổi giá.
+"""
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional, Set
+
+from config import (
+    CRAWL_STATE_FILE,
+    RECRAWL_MAX_AGE,
+    RECRAWL_JITTER,
+    RECRAWL_FAILED_AFTER
+)
+
+logger = logging.getLogger(__name__)
+
+# Các trường thay đổi mỗi lần tải, không tính vào hash nội dung
+VOLATILE_FIELDS = {"crawled_at", "crawl_time", "timestamp", "local_images", "local_image_paths", "thumbnails"}
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def normalize_price(price: Any) -> str:
+    """Chuẩn hóa giá để so sánh (chỉ giữ chữ số, ví dụ '25.000đ' -> '25000')"""
+    if price is None:
+        return ""
+    return re.sub(r"\D", "", str(price))
+
+
+def content_hash(product: Dict[str, Any]) -> str:
+    """Hash SHA-256 của nội dung sản phẩm (bỏ qua các trường thay đổi mỗi lần tải)"""
+    stable = {key: value for key, value in product.items() if key not in VOLATILE_FIELDS}
+    payload = json.dumps(stable, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CrawlStateStore:
+    """Bảng trạng thái crawl một dòng cho mỗi URL sản phẩm (an toàn khi dùng từ nhiều thread)"""
+
+    def __init__(self,
+                 db_path: str = CRAWL_STATE_FILE,
+                 max_age: float = RECRAWL_MAX_AGE,
+                 jitter: float = RECRAWL_JITTER,
+                 retry_failed_after: float = RECRAWL_FAILED_AFTER):
+        """
+        Khởi tạo CrawlStateStore
+
+        Args:
+            db_path: Đường dẫn file SQLite
+            max_age: Sản phẩm được coi là quá hạn khi lần tải cuối cũ hơn khoảng này (giây)
+            jitter: Tỷ lệ rút ngắn thời hạn theo URL (0-1) để việc tải lại rải đều qua các lần chạy
+            retry_failed_after: Sản phẩm tải lỗi được thử lại sau khoảng này (giây)
+        """
+        self.db_path = db_path
+        self.max_age = max_age
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.retry_failed_after = retry_failed_after
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                url TEXT PRIMARY KEY,
+                last_fetched REAL,
+                content_hash TEXT,
+                price TEXT,
+                status TEXT,
+                fetch_count INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+        self.stats = {"new": 0, "stale": 0, "failed": 0, "price_changed": 0,
+                      "fresh": 0, "changed": 0, "unchanged": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Lấy trạng thái của một URL (None nếu chưa từng tải)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT last_fetched, content_hash, price, status, fetch_count FROM products WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"url": url, "last_fetched": row[0], "content_hash": row[1],
+                "price": row[2], "status": row[3], "fetch_count": row[4]}
+
+    def _effective_max_age(self, url: str) -> float:
+        # Mỗi URL có thời hạn cố định trong [max_age * (1 - jitter), max_age] để không hết hạn cùng lúc
+        fraction = (zlib.crc32(url.encode("utf-8")) % 1000) / 1000
+        return self.max_age * (1 - self.jitter * fraction)
+
+    def due_reason(self, url: str, listing_price: Any = None) -> Optional[str]:
+        """
+        Lý do cần tải lại URL
+
+        Args:
+            url: URL sản phẩm
+            listing_price: Giá đang hiển thị ở trang danh sách (nếu có)
+
+        Returns:
+            Optional[str]: new, failed, price_changed, stale hoặc None nếu sản phẩm còn mới
+        """
+        state = self.get(url)
+        if not state:
+            return "new"
+        age = time.time() - (state["last_fetched"] or 0)
+        if state["status"] != STATUS_OK:
+            return "failed" if age >= self.retry_failed_after else None
+        if listing_price not in (None, "") and state["price"] \
+                and normalize_price(listing_price) != state["price"]:
+            return "price_changed"
+        if age >= self._effective_max_age(url):
+            return "stale"
+        return None
+
+    def should_fetch(self, url: str, listing_price: Any = None) -> bool:
+        """Kiểm tra URL có cần tải lại không (và cập nhật số liệu theo lý do)"""
+        reason = self.due_reason(url, listing_price)
+        self.stats[reason or "fresh"] += 1
+        return reason is not None
+
+    def fresh_urls(self) -> Set[str]:
+        """Các URL đã tải thành công và chưa quá hạn (không xét thay đổi giá)"""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, last_fetched FROM products WHERE status = ? AND last_fetched >= ?",
+                (STATUS_OK, now - self.max_age)
+            ).fetchall()
+        # Cùng điều kiện "stale" với due_reason() nhưng chỉ một truy vấn cho toàn bảng
+        return {url for url, last_fetched in rows if now - last_fetched < self._effective_max_age(url)}
+
+    def fetched_urls(self) -> Set[str]:
+        """Các URL đã từng tải thành công"""
+        with self.lock:
+            rows = self.conn.execute("SELECT url FROM products WHERE status = ?", (STATUS_OK,)).fetchall()
+        return {url for (url,) in rows}
+
+    def record(self, url: str, product: Dict[str, Any], status: str = STATUS_OK) -> bool:
+        """
+        Ghi nhận kết quả tải một sản phẩm
+
+        Args:
+            url: URL sản phẩm
+            product: Dữ liệu sản phẩm vừa tải
+            status: Trạng thái (ok hoặc failed)
+
+        Returns:
+            bool: True nếu nội dung khác lần tải trước (hoặc sản phẩm mới)
+        """
+        digest = content_hash(product)
+        previous = self.get(url)
+        changed = not previous or previous["content_hash"] != digest
+        if status == STATUS_OK:
+            self.stats["changed" if changed else "unchanged"] += 1
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO products (url, last_fetched, content_hash, price, status, fetch_count) "
+                "VALUES (?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT(url) DO UPDATE SET last_fetched = excluded.last_fetched, "
+                "content_hash = excluded.content_hash, price = excluded.price, "
+                "status = excluded.status, fetch_count = fetch_count + 1",
+                (url, time.time(), digest, normalize_price(product.get("price")), status)
+            )
+            self.conn.commit()
+        return changed
+
+    def record_failure(self, url: str):
+        """Ghi nhận sản phẩm tải lỗi (giữ lại hash và giá của lần thành công trước)"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO products (url, last_fetched, status, fetch_count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT(url) DO UPDATE SET last_fetched = excluded.last_fetched, "
+                "status = excluded.status, fetch_count = fetch_count + 1",
+                (url, time.time(), STATUS_FAILED)
+            )
+            self.conn.commit()
+
+    def import_urls(self, urls: Iterable[str]) -> int:
+        """
+        Nhập các URL đã crawl từ checkpoint/file đầu ra cũ (coi như vừa tải, chưa có hash nội dung)
+
+        Returns:
+            int: Số URL mới được thêm vào bảng trạng thái
+        """
+        now = time.time()
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO products (url, last_fetched, status, fetch_count) VALUES (?, ?, ?, 0)",
+                [(url, now, STATUS_OK) for url in urls if url]
+            )
+            self.conn.commit()
+            added = self.conn.total_changes - before
+        if added:
+            logger.info(f"Đã nhập {added} URL đã crawl vào bảng trạng thái {self.db_path}")
+        return added
+
+    def count(self) -> int:
+        """Số URL trong bảng trạng thái"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def format_stats(self) -> str:
+        """Định dạng số liệu để ghi log"""
+        stats = self.stats
+        due = stats["new"] + stats["stale"] + stats["failed"] + stats["price_changed"]
+        return (f"cần tải {due}/{due + stats['fresh']} sản phẩm "
+                f"({stats['new']} mới, {stats['price_changed']} đổi giá, {stats['stale']} quá hạn, "
+                f"{stats['failed']} lỗi trước đó), bỏ qua {stats['fresh']} còn mới; "
+                f"nội dung thay đổi {stats['changed']}, không đổi {stats['unchanged']}")
+
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self.lock:
+            self.conn.close()
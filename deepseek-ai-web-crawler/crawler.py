@@ -5,15 +5,17 @@ import json
 from typing import Dict, List, Any, Optional, Set
 
 import requests
-from bs4 import BeautifulSoup
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, NoSuchElementException
+from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode
 
 from config import WAIT_TIME, MAX_RETRIES
+from page_readiness import wait_until_ready_driver
+from html_backends import parse_html
+from html_capture import capture_html
+from selector_plan import compile_plan
+from page_archive import archive_page
 from utils.scraper_utils import (
     get_browser_config,
     get_llm_strategy_for_categories,
@@ -65,26 +67,13 @@ class WebCrawler:
                 last_height = new_height
         self.logger.info("Finished scrolling page.")
         
-    def wait_for_page_load(self, timeout=WAIT_TIME, selector="body"):
-        """Đợi trang tải xong với timeout và selector tùy chỉnh"""
+    def wait_for_page_load(self, timeout=WAIT_TIME, selector="body", page_type=None):
+        """Đợi trang có đủ các selector cần thiết (theo loại trang hoặc selector tùy chỉnh)"""
         if not self.driver:
             self.logger.error("Driver chưa được khởi tạo")
             return False
             
-        try:
-            WebDriverWait(self.driver, timeout).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
-            WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-            )
-            # Thêm thời gian chờ để đảm bảo AJAX load xong
-            time.sleep(3)
-            self.logger.info(f"Page loaded successfully with elements matching '{selector}'.")
-            return True
-        except TimeoutException:
-            self.logger.warning(f"Timeout waiting for page load or elements '{selector}' after {timeout} seconds.")
-            return False
+        return wait_until_ready_driver(self.driver, page_type, timeout, selector)
 
     def close_popups(self):
         """Đóng các popup và thông báo trên trang web
@@ -243,7 +232,7 @@ class WebCrawler:
             
         return popup_detected
 
-    def get_page_content(self, url, selector=None, retry=3, delay=2):
+    def get_page_content(self, url, selector=None, retry=3, delay=2, page_type=None):
         """Lấy nội dung trang web với cơ chế thử lại"""
         if not self.driver:
             self.setup_driver()
@@ -252,15 +241,10 @@ class WebCrawler:
             try:
                 self.driver.get(url)
                 
-                # Đợi trang load xong
-                if selector:
-                    loaded = self.wait_for_page_load(selector=selector)
-                    if not loaded:
-                        continue
-                else:
-                    loaded = self.wait_for_page_load()
-                    if not loaded:
-                        continue
+                # Đợi trang có đủ selector cần thiết
+                loaded = self.wait_for_page_load(selector=selector or "body", page_type=page_type)
+                if not loaded:
+                    continue
                 
                 # Đóng các popup sau khi trang đã load
                 popup_detected = self.close_popups()
@@ -272,7 +256,10 @@ class WebCrawler:
                 # Scroll để tải nội dung lazy load
                 self.scroll_page_slowly()
                 
-                return BeautifulSoup(self.driver.page_source, 'html.parser')
+                html, scoped = capture_html(self.driver, page_type)
+                if not scoped:
+                    archive_page(url, html, page_type, source="main")
+                return parse_html(html)
             except Exception as e:
                 self.logger.error(f"Lỗi khi lấy nội dung trang {url}, lần thử {attempt+1}: {str(e)}")
                 if attempt < retry - 1:
@@ -282,20 +269,8 @@ class WebCrawler:
         return None
 
     def extract_page_data(self, soup, selectors):
-        """Trích xuất dữ liệu từ trang dựa trên các selector"""
-        results = {}
-        
-        for key, selector_list in selectors.items():
-            for selector in selector_list:
-                elements = soup.select(selector)
-                if elements:
-                    if key == "description":
-                        results[key] = "\n".join([elem.get_text(strip=True) for elem in elements])
-                    else:
-                        results[key] = elements[0].get_text(strip=True)
-                    break
-        
-        return results
+        """Trích xuất dữ liệu từ trang dựa trên các selector (kế hoạch trích xuất biên dịch một lần, selector_plan.py)"""
+        return compile_plan(selectors).extract(soup)
         
     def extract_links(self, soup, selector, base_url=""):
         """Trích xuất các liên kết từ trang"""
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Ghi sản phẩm thành dataset dạng cột: Parquet phân vùng theo ngày crawl và danh mục (hive: crawl_date=.../category=...)
+và một file Arrow IPC cho mỗi lần chạy (memory-map được để đọc zero-copy).
+specifications được giữ dạng map<string, string>, image_urls/local_images dạng list<string>.
+"""
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+    PYARROW_SUPPORT = True
+except ImportError:
+    PYARROW_SUPPORT = False
+
+from slugify import slugify
+
+from config_playwright import DATASET_DIR, DATASET_WRITE_IPC, DATASET_COMPRESSION
+from crawl_state import normalize_price
+
+logger = logging.getLogger(__name__)
+
+# Các cột chuỗi đã biết; trường khác được gom vào cột extra (JSON) để schema ổn định giữa các lần chạy
+STRING_FIELDS = [
+    "id", "product_id", "name", "title", "price", "original_price", "discount_percent",
+    "description", "product_url", "image_url", "subcategory",
+]
+LIST_FIELDS = ["image_urls", "local_images"]
+PARTITION_FIELDS = ["crawl_date", "category"]
+
+if PYARROW_SUPPORT:
+    PRODUCT_SCHEMA = pa.schema(
+        [pa.field(name, pa.string()) for name in STRING_FIELDS]
+        + [
+            pa.field("price_value", pa.int64()),
+            pa.field("specifications", pa.map_(pa.string(), pa.string())),
+        ]
+        + [pa.field(name, pa.list_(pa.string())) for name in LIST_FIELDS]
+        + [
+            pa.field("extra", pa.string()),
+            pa.field("crawled_at", pa.timestamp("s")),
+            pa.field("crawl_date", pa.string()),
+            pa.field("category", pa.string()),
+        ]
+    )
+
+
+def product_row(product: Dict[str, Any], category: str, crawled_at: datetime) -> Dict[str, Any]:
+    """Chuyển product dict thành một dòng theo PRODUCT_SCHEMA"""
+    row = {name: (str(product[name]) if product.get(name) is not None else None) for name in STRING_FIELDS}
+
+    digits = normalize_price(product.get("price"))
+    row["price_value"] = int(digits) if digits else None
+
+    specs = product.get("specifications")
+    row["specifications"] = [(str(key), str(value)) for key, value in specs.items()] if isinstance(specs, dict) else None
+
+    for name in LIST_FIELDS:
+        values = product.get(name)
+        row[name] = [str(value) for value in values] if isinstance(values, list) else None
+
+    known = set(STRING_FIELDS) | set(LIST_FIELDS) | {"specifications"}
+    extra = {key: value for key, value in product.items() if key not in known}
+    row["extra"] = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+
+    row["crawled_at"] = crawled_at
+    row["crawl_date"] = crawled_at.strftime("%Y-%m-%d")
+    row["category"] = category
+    return row
+
+
+class DatasetWriter:
+    """Ghi từng batch sản phẩm vào dataset Parquet phân vùng và file Arrow IPC của lần chạy"""
+
+    def __init__(self, root: str = DATASET_DIR, write_ipc: bool = DATASET_WRITE_IPC,
+                 compression: str = DATASET_COMPRESSION):
+        """
+        Khởi tạo DatasetWriter
+
+        Args:
+            root: Thư mục gốc của dataset (parquet/ và arrow/ nằm bên trong)
+            write_ipc: Ghi thêm file Arrow IPC cho lần chạy này
+            compression: Codec nén Parquet
+        """
+        self.root = root
+        self.parquet_dir = os.path.join(root, "parquet")
+        self.arrow_dir = os.path.join(root, "arrow")
+        self.write_ipc = write_ipc
+        self.compression = compression
+        self.ipc_writer = None
+        self.ipc_path = None
+        self.rows = 0
+        self.files = 0
+
+        if not PYARROW_SUPPORT:
+            logger.warning("Không thể ghi dataset Parquet/Arrow. Hãy cài đặt pyarrow: pip install pyarrow")
+            return
+        os.makedirs(self.parquet_dir, exist_ok=True)
+
+    def write_products(self, products: List[Dict[str, Any]], category: str) -> Optional[str]:
+        """
+        Ghi một batch sản phẩm (thường là một subcategory) thành một file Parquet trong phân vùng tương ứng
+
+        Args:
+            products: Danh sách sản phẩm
+            category: Tên danh mục/subcategory (dùng làm phân vùng)
+
+        Returns:
+            Optional[str]: Đường dẫn file Parquet đã ghi hoặc None nếu lỗi
+        """
+        if not PYARROW_SUPPORT or not products:
+            return None
+
+        crawled_at = datetime.now().replace(microsecond=0)
+        category = slugify(category) or "unknown"
+        try:
+            table = pa.Table.from_pylist([product_row(product, category, crawled_at) for product in products],
+                                         schema=PRODUCT_SCHEMA)
+
+            # Cột phân vùng nằm trong tên thư mục, không lặp lại trong file
+            partition_dir = os.path.join(self.parquet_dir, f"crawl_date={crawled_at:%Y-%m-%d}", f"category={category}")
+            os.makedirs(partition_dir, exist_ok=True)
+            file_path = os.path.join(partition_dir, f"part-{crawled_at:%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+            pq.write_table(table.drop_columns(PARTITION_FIELDS), file_path, compression=self.compression)
+            self.files += 1
+            self.rows += table.num_rows
+
+            if self.write_ipc:
+                self._write_ipc(table)
+
+            logger.info(f"Đã ghi {table.num_rows} sản phẩm vào dataset: {file_path}")
+            return file_path
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi dataset cho {category}: {e}")
+            return None
+
+    def _write_ipc(self, table):
+        if not self.ipc_writer:
+            os.makedirs(self.arrow_dir, exist_ok=True)
+            self.ipc_path = os.path.join(self.arrow_dir, f"products_{datetime.now():%Y%m%d_%H%M%S}.arrow")
+            self.ipc_writer = pa.ipc.new_file(self.ipc_path, PRODUCT_SCHEMA)
+        self.ipc_writer.write_table(table)
+
+    def close(self):
+        """Đóng file Arrow IPC (file IPC chỉ đọc được sau khi đóng)"""
+        if self.ipc_writer:
+            self.ipc_writer.close()
+            self.ipc_writer = None
+            logger.info(f"Đã ghi file Arrow IPC: {self.ipc_path}")
+        if self.files:
+            logger.info(f"Dataset: {self.rows} sản phẩm trong {self.files} file Parquet tại {self.parquet_dir}")
+
+
+def load_dataset(root: str = DATASET_DIR, columns: Optional[List[str]] = None, filter=None):
+    """
+    Đọc dataset Parquet, chỉ đọc các cột và phân vùng cần thiết
+
+    Args:
+        root: Thư mục gốc của dataset
+        columns: Các cột cần đọc (None = tất cả)
+        filter: Biểu thức lọc pyarrow.dataset, ví dụ ds.field("crawl_date") >= "2025-04-01"
+
+    Returns:
+        pyarrow.Table: Kết quả đọc (None nếu chưa cài pyarrow)
+    """
+    if not PYARROW_SUPPORT:
+        logger.error("Không thể đọc dataset Parquet. Hãy cài đặt pyarrow: pip install pyarrow")
+        return None
+    dataset = ds.dataset(os.path.join(root, "parquet"), format="parquet", partitioning="hive")
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def open_ipc(path: str):
+    """Mở file Arrow IPC bằng memory-map (không sao chép dữ liệu vào bộ nhớ; None nếu chưa cài pyarrow)"""
+    if not PYARROW_SUPPORT:
+        logger.error("Không thể đọc file Arrow IPC. Hãy cài đặt pyarrow: pip install pyarrow")
+        return None
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
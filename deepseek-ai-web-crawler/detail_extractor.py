@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Biên dịch schema trang chi tiết sản phẩm (DETAIL_SCHEMA) thành một hàm JavaScript duy nhất. Toàn bộ trường
+(tên, giá, mô tả, thông số, URL hình ảnh đã loại trùng) được lấy trong một lần page.evaluate thay vì một
+round-trip CDP cho mỗi selector, mỗi ô bảng và mỗi thẻ <img>. Hàm trả về kèm thời gian xử lý từng trường (ms)
+để theo dõi trường nào chậm đi giữa các lần chạy. extract_details_from_html áp dụng cùng schema trên HTML đã lưu
+(reextract.py) mà không cần trình duyệt.
+"""
+import json
+import logging
+from typing import Dict, Any, Optional, Union
+
+from config_playwright import DETAIL_SCHEMA
+from html_backends import parse_html
+
+logger = logging.getLogger(__name__)
+
+# Đoạn mã JavaScript cho từng loại trường; "cfg" là cấu hình của trường, kết quả ghi vào data[field]
+FIELD_TEMPLATES = {
+    "title": """
+        if (document.title) {
+            data[field] = document.title;
+        }""",
+    "text": """
+        if (cfg.title_separator && document.title) {
+            const part = document.title.split(cfg.title_separator)[0].trim();
+            if (part) {
+                data[field] = part;
+            }
+        }
+        if (!(field in data)) {
+            for (const selector of cfg.selectors) {
+                const element = document.querySelector(selector);
+                if (!element) {
+                    continue;
+                }
+                const value = text(element);
+                if (value || !cfg.non_empty) {
+                    data[field] = value;
+                    break;
+                }
+            }
+        }""",
+    "table": """
+        const table = {};
+        for (const row of document.querySelectorAll(cfg.rows)) {
+            const cells = row.querySelectorAll(cfg.cells);
+            if (cells.length >= 2) {
+                const key = text(cells[0]);
+                if (key) {
+                    table[key] = text(cells[1]);
+                }
+            }
+        }
+        if (Object.keys(table).length) {
+            data[field] = table;
+        }""",
+    "images": """
+        const urls = new Set();
+        for (const selector of cfg.selectors) {
+            for (const element of document.querySelectorAll(selector)) {
+                const src = element.getAttribute(cfg.attribute);
+                if (!src) {
+                    continue;
+                }
+                const lower = src.toLowerCase();
+                if (cfg.extensions.some(ext => lower.endsWith(ext)) || cfg.keywords.some(word => lower.includes(word))) {
+                    urls.add(src);
+                }
+            }
+            if (urls.size) {
+                break;
+            }
+        }
+        if (!urls.size && cfg.fallback_min_size) {
+            // Không selector nào có ảnh: lấy các ảnh lớn (có thể là ảnh sản phẩm chính), bỏ icon và logo
+            for (const img of document.querySelectorAll("img")) {
+                const rect = img.getBoundingClientRect();
+                if (rect.width > cfg.fallback_min_size && rect.height > cfg.fallback_min_size && img.src) {
+                    urls.add(img.src);
+                }
+            }
+            if (urls.size) {
+                fallbacks.push(field);
+            }
+        }
+        if (urls.size) {
+            data[field] = Array.from(urls);
+        }""",
+}
+
+_compiled: Dict[str, str] = {}
+
+
+def compile_detail_schema(schema: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Biên dịch schema thành hàm JavaScript () => {data, timings, errors, fallbacks} (kết quả được cache theo schema)
+
+    Args:
+        schema: Trường -> cấu hình (type và các selector), xem DETAIL_SCHEMA trong config_playwright.py
+
+    Returns:
+        str: Mã nguồn hàm JavaScript dùng cho page.evaluate
+    """
+    key = json.dumps(schema, sort_keys=True, ensure_ascii=False)
+    script = _compiled.get(key)
+    if script is not None:
+        return script
+
+    blocks = []
+    for field, cfg in schema.items():
+        template = FIELD_TEMPLATES.get(cfg.get("type"))
+        if template is None:
+            logger.warning(f"Bỏ qua trường {field}: loại không hợp lệ {cfg.get('type')}")
+            continue
+        blocks.append(f"""
+    {{
+        const field = {json.dumps(field, ensure_ascii=False)};
+        const cfg = {json.dumps(cfg, ensure_ascii=False)};
+        const start = performance.now();
+        try {{{template}
+        }} catch (e) {{
+            errors[field] = String(e);
+        }}
+        timings[field] = performance.now() - start;
+    }}""")
+
+    script = ("() => {\n"
+              "    const data = {}, timings = {}, errors = {}, fallbacks = [];\n"
+              "    const text = element => (element.textContent || \"\").trim();"
+              + "".join(blocks) +
+              "\n    return {data, timings, errors, fallbacks};\n}")
+    _compiled[key] = script
+    return script
+
+
+class DetailTimings:
+    """Cộng dồn thời gian trích xuất từng trường qua nhiều trang để phát hiện trường chậm đi"""
+
+    def __init__(self):
+        self.pages = 0
+        self.fields: Dict[str, Dict[str, float]] = {}
+
+    def add(self, timings: Dict[str, float]):
+        """Thêm thời gian (ms) của một trang"""
+        self.pages += 1
+        for field, elapsed in timings.items():
+            stats = self.fields.setdefault(field, {"total": 0.0, "max": 0.0})
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+
+    def format_stats(self) -> str:
+        """Định dạng thời gian trung bình và lớn nhất của từng trường để ghi log"""
+        if not self.pages:
+            return "chưa có trang nào"
+        parts = [f"{field} {stats['total'] / self.pages:.2f}/{stats['max']:.2f} ms"
+                 for field, stats in sorted(self.fields.items(), key=lambda item: item[1]["total"], reverse=True)]
+        return f"{self.pages} trang, trung bình/lớn nhất: " + ", ".join(parts)
+
+
+async def extract_product_details(page, schema: Optional[Dict[str, Dict[str, Any]]] = None,
+                                  timings: Optional[DetailTimings] = None) -> Dict[str, Any]:
+    """
+    Trích xuất mọi trường của trang chi tiết sản phẩm trong một lần page.evaluate
+
+    Args:
+        page: Page của Playwright đang mở trang chi tiết
+        schema: Schema trang chi tiết (mặc định DETAIL_SCHEMA)
+        timings: Bộ cộng dồn thời gian từng trường (None nếu không cần)
+
+    Returns:
+        Dict[str, Any]: Trường -> giá trị (trường không tìm thấy bị bỏ qua)
+    """
+    try:
+        result = await page.evaluate(compile_detail_schema(schema or DETAIL_SCHEMA))
+    except Exception as e:
+        logger.error(f"Lỗi khi trích xuất trang chi tiết {page.url}: {e}")
+        return {}
+
+    for field, error in result["errors"].items():
+        logger.warning(f"Lỗi khi trích xuất trường {field} trên {page.url}: {error}")
+    for field in result["fallbacks"]:
+        logger.info(f"Không có {field} theo selector, đã lấy {len(result['data'].get(field, []))} hình ảnh lớn trên trang")
+    if timings is not None:
+        timings.add(result["timings"])
+    logger.debug("Thời gian trích xuất (ms): " +
+                 ", ".join(f"{field}={elapsed:.2f}" for field, elapsed in result["timings"].items()))
+    return result["data"]
+
+
+def _image_size(element) -> int:
+    """Kích thước nhỏ nhất theo thuộc tính width/height của thẻ <img> (0 nếu không có)"""
+    try:
+        return min(int(str(element.get("width", "0")).rstrip("px")), int(str(element.get("height", "0")).rstrip("px")))
+    except ValueError:
+        return 0
+
+
+def extract_details_from_html(html: Union[str, bytes], schema: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Trích xuất trang chi tiết theo schema từ HTML đã lưu (cùng quy tắc với hàm JavaScript của compile_detail_schema)
+
+    Không có layout nên ảnh dự phòng (fallback_min_size) được xét theo thuộc tính width/height của thẻ <img>
+    thay vì kích thước hiển thị.
+
+    Args:
+        html: HTML của trang chi tiết
+        schema: Schema trang chi tiết (mặc định DETAIL_SCHEMA)
+
+    Returns:
+        Dict[str, Any]: Trường -> giá trị (trường không tìm thấy bị bỏ qua)
+    """
+    soup = parse_html(html)
+    data: Dict[str, Any] = {}
+    title_element = soup.select_one("title")
+    page_title = title_element.get_text().strip() if title_element else ""
+
+    for field, cfg in (schema or DETAIL_SCHEMA).items():
+        field_type = cfg.get("type")
+        try:
+            if field_type == "title":
+                if page_title:
+                    data[field] = page_title
+            elif field_type == "text":
+                if cfg.get("title_separator") and page_title:
+                    part = page_title.split(cfg["title_separator"])[0].strip()
+                    if part:
+                        data[field] = part
+                        continue
+                for selector in cfg["selectors"]:
+                    element = soup.select_one(selector)
+                    if element is None:
+                        continue
+                    value = element.get_text().strip()
+                    if value or not cfg.get("non_empty"):
+                        data[field] = value
+                        break
+            elif field_type == "table":
+                table = {}
+                for row in soup.select(cfg["rows"]):
+                    cells = row.select(cfg["cells"])
+                    if len(cells) >= 2:
+                        key = cells[0].get_text().strip()
+                        if key:
+                            table[key] = cells[1].get_text().strip()
+                if table:
+                    data[field] = table
+            elif field_type == "images":
+                urls: Dict[str, None] = {}
+                for selector in cfg["selectors"]:
+                    for element in soup.select(selector):
+                        src = element.get(cfg["attribute"])
+                        if not src:
+                            continue
+                        lower = src.lower()
+                        if lower.endswith(tuple(cfg["extensions"])) or any(word in lower for word in cfg["keywords"]):
+                            urls[src] = None
+                    if urls:
+                        break
+                if not urls and cfg.get("fallback_min_size"):
+                    for element in soup.select("img"):
+                        if element.get("src") and _image_size(element) > cfg["fallback_min_size"]:
+                            urls[element.get("src")] = None
+                if urls:
+                    data[field] = list(urls)
+            else:
+                logger.warning(f"Bỏ qua trường {field}: loại không hợp lệ {field_type}")
+        except Exception as e:
+            logger.warning(f"Lỗi khi trích xuất trường {field} từ HTML: {e}")
+    return data
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Xuất Excel dạng stream bằng chế độ write-only của openpyxl: các dòng được ghi ngay khi có dữ liệu
+(mỗi sheet được đệm trên đĩa), định dạng header/cột chỉ áp dụng một lần nên bộ nhớ không tăng theo số dòng.
+Một workbook có thể chứa nhiều sheet, ví dụ một sheet cho mỗi subcategory của cả lượt crawl.
+"""
+import re
+import json
+import logging
+from typing import Dict, List, Any
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    from openpyxl.utils import get_column_letter
+    OPENPYXL_SUPPORT = True
+except ImportError:
+    OPENPYXL_SUPPORT = False
+
+logger = logging.getLogger(__name__)
+
+# Các trường không xuất ra Excel và các trường được đưa lên đầu
+EXCLUDED_FIELDS = {"image_urls", "specifications", "local_images"}
+IMPORTANT_FIELDS = ["id", "name", "price", "subcategory", "product_url", "description"]
+
+# Chiều rộng cột theo tên trường (mặc định DEFAULT_COLUMN_WIDTH)
+COLUMN_WIDTHS = {"name": 40, "description": 60, "product_url": 50, "price": 15}
+DEFAULT_COLUMN_WIDTH = 20
+DATA_ROW_HEIGHT = 30
+
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+MAX_SHEET_NAME = 31
+
+
+def excel_fields(products: List[Dict[str, Any]]) -> List[str]:
+    """Danh sách cột: các trường quan trọng trước, sau đó các trường còn lại theo thứ tự xuất hiện"""
+    seen = []
+    for product in products:
+        for key in product:
+            if key not in EXCLUDED_FIELDS and key not in seen:
+                seen.append(key)
+    return [field for field in IMPORTANT_FIELDS if field in seen] + \
+           [field for field in seen if field not in IMPORTANT_FIELDS]
+
+
+class ExcelStreamWriter:
+    """Workbook write-only: tạo sheet, ghi dòng theo từng batch và lưu file khi close()"""
+
+    def __init__(self, file_path: str):
+        """
+        Khởi tạo ExcelStreamWriter
+
+        Args:
+            file_path: Đường dẫn file .xlsx
+        """
+        self.file_path = file_path
+        self.workbook = Workbook(write_only=True)
+        self.sheets: Dict[str, Dict[str, Any]] = {}
+        self.rows = 0
+
+        # Style dùng chung được đăng ký một lần cho cả workbook
+        thin = Side(style="thin")
+        border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        self.header_style = NamedStyle(
+            name="product_header",
+            font=Font(bold=True, color="FFFFFF"),
+            fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+            border=border
+        )
+        self.data_style = NamedStyle(
+            name="product_data",
+            alignment=Alignment(vertical="top", wrap_text=True),
+            border=border
+        )
+        self.workbook.add_named_style(self.header_style)
+        self.workbook.add_named_style(self.data_style)
+
+    def _sheet_title(self, name: str) -> str:
+        title = INVALID_SHEET_CHARS.sub("_", name).strip("'") or "Sheet"
+        title = title[:MAX_SHEET_NAME]
+        base, index = title, 2
+        while title in self.sheets:
+            suffix = f"_{index}"
+            title = base[:MAX_SHEET_NAME - len(suffix)] + suffix
+            index += 1
+        return title
+
+    def add_sheet(self, name: str, fields: List[str]) -> str:
+        """
+        Tạo sheet mới với header và định dạng cột
+
+        Args:
+            name: Tên sheet mong muốn (được chuẩn hóa theo giới hạn của Excel)
+            fields: Danh sách cột
+
+        Returns:
+            str: Tên sheet thực tế
+        """
+        title = self._sheet_title(name)
+        worksheet = self.workbook.create_sheet(title)
+
+        # Định dạng cột, chiều cao dòng và cố định header chỉ đặt một lần
+        for index, field in enumerate(fields, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = COLUMN_WIDTHS.get(field, DEFAULT_COLUMN_WIDTH)
+        worksheet.sheet_format.defaultRowHeight = DATA_ROW_HEIGHT
+        worksheet.sheet_format.customHeight = True
+        worksheet.freeze_panes = "A2"
+
+        header = []
+        for field in fields:
+            cell = WriteOnlyCell(worksheet, value=field)
+            cell.style = self.header_style.name
+            header.append(cell)
+        worksheet.append(header)
+
+        self.sheets[title] = {"worksheet": worksheet, "fields": fields, "rows": 0}
+        return title
+
+    def write_rows(self, title: str, products: List[Dict[str, Any]]) -> int:
+        """
+        Ghi các sản phẩm vào sheet (trường không có trong header sẽ bị bỏ qua)
+
+        Args:
+            title: Tên sheet trả về từ add_sheet
+            products: Danh sách sản phẩm
+
+        Returns:
+            int: Số dòng đã ghi
+        """
+        sheet = self.sheets[title]
+        worksheet = sheet["worksheet"]
+        for product in products:
+            row = []
+            for field in sheet["fields"]:
+                value = product.get(field, "")
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, ensure_ascii=False)
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.style = self.data_style.name
+                row.append(cell)
+            worksheet.append(row)
+        sheet["rows"] += len(products)
+        self.rows += len(products)
+        return len(products)
+
+    def add_products(self, name: str, products: List[Dict[str, Any]]) -> str:
+        """Tạo sheet cho một nhóm sản phẩm (ví dụ một subcategory) và ghi toàn bộ dòng"""
+        title = self.add_sheet(name, excel_fields(products))
+        self.write_rows(title, products)
+        return title
+
+    def close(self) -> str:
+        """
+        Đặt lọc tự động cho từng sheet rồi lưu file
+
+        Returns:
+            str: Đường dẫn file đã lưu
+        """
+        for sheet in self.sheets.values():
+            last_column = get_column_letter(max(1, len(sheet["fields"])))
+            sheet["worksheet"].auto_filter.ref = f"A1:{last_column}{sheet['rows'] + 1}"
+        self.workbook.save(self.file_path)
+        logger.info(f"Đã lưu {self.rows} dòng trong {len(self.sheets)} sheet vào file Excel: {self.file_path}")
+        return self.file_path
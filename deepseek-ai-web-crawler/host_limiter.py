@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Giới hạn tốc độ truy cập (politeness) theo từng host cho các worker bất đồng bộ
+"""
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict
+from urllib.parse import urlparse
+
+
+class HostLimiter:
+    """Giới hạn số request đồng thời và khoảng cách giữa các request tới cùng một host"""
+
+    def __init__(self, max_per_host: int = 4, min_interval: float = 0.0, jitter: float = 0.0):
+        """
+        Khởi tạo HostLimiter
+
+        Args:
+            max_per_host: Số request đồng thời tối đa tới cùng một host
+            min_interval: Khoảng cách tối thiểu (giây) giữa hai lần bắt đầu request tới cùng host
+            jitter: Thời gian ngẫu nhiên cộng thêm vào min_interval (giây)
+        """
+        self.max_per_host = max(1, max_per_host)
+        self.min_interval = max(0.0, min_interval)
+        self.jitter = max(0.0, jitter)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        """Lấy host (netloc) của URL"""
+        return urlparse(url).netloc.lower()
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Giữ một suất truy cập tới host của URL trong suốt khối `async with`"""
+        host = self.host_of(url)
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        async with semaphore:
+            await self._wait_turn(host)
+            yield
+
+    async def _wait_turn(self, host: str):
+        """Đợi đến lượt được bắt đầu request tới host"""
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._next_start.get(host, 0.0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            interval = self.min_interval + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+            self._next_start[host] = time.monotonic() + interval
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Backend phân tích HTML cho DataParser và các crawler. Mọi backend trả về đối tượng có cùng tập API
+mà dự án dùng (select, select_one, get_text, get, has_attr, [...]):
+- selectolax: parser HTML5 viết bằng C (lexbor), nhanh nhất; được bọc bởi SelectolaxNode
+- lxml: BeautifulSoup với tree builder lxml (nhanh hơn html.parser, vẫn là đối tượng BeautifulSoup)
+- html.parser: BeautifulSoup thuần Python, luôn có sẵn
+Kiểm tra kết quả trích xuất giữa các backend: python check_parser_parity.py
+"""
+import logging
+from typing import Dict, List, Any, Optional, Union
+
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_SUPPORT = True
+except ImportError:
+    SELECTOLAX_SUPPORT = False
+
+try:
+    import lxml  # noqa: F401
+    LXML_SUPPORT = True
+except ImportError:
+    LXML_SUPPORT = False
+
+from config import HTML_PARSER_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự ưu tiên khi HTML_PARSER_BACKEND = "auto"
+BACKENDS = ["selectolax", "lxml", "html.parser"]
+# Nội dung của các thẻ này không được tính vào get_text() (giống BeautifulSoup)
+NON_TEXT_TAGS = frozenset(["script", "style"])
+
+_warned_backends = set()
+
+
+class SelectolaxNode:
+    """Bọc node selectolax theo API BeautifulSoup mà dự án sử dụng"""
+
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __repr__(self) -> str:
+        return self.node.html or ""
+
+    def __str__(self) -> str:
+        return self.node.html or ""
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, SelectolaxNode) and self.node.mem_id == other.node.mem_id
+
+    def __hash__(self) -> int:
+        return hash(self.node.mem_id)
+
+    @property
+    def name(self) -> str:
+        return self.node.tag
+
+    @property
+    def attrs(self) -> Dict[str, str]:
+        # Thuộc tính không có giá trị (<input disabled>) trả về chuỗi rỗng như BeautifulSoup
+        return {key: "" if value is None else value for key, value in self.node.attributes.items()}
+
+    def select(self, selector: str) -> List["SelectolaxNode"]:
+        return [SelectolaxNode(node) for node in self.node.css(selector)]
+
+    def select_one(self, selector: str) -> Optional["SelectolaxNode"]:
+        node = self.node.css_first(selector)
+        return SelectolaxNode(node) if node is not None else None
+
+    def get_text(self, separator: str = "", strip: bool = False) -> str:
+        if self.node.css_first("script, style") is None:
+            # Đường nhanh: lấy toàn bộ text node trong một lần gọi C, "\x00" đánh dấu ranh giới giữa các text node
+            parts = self.node.text(deep=True, separator="\x00").split("\x00")
+        else:
+            parts = [child.text_content or "" for child in self.node.traverse(include_text=True)
+                     if child.tag == "-text" and child.parent.tag not in NON_TEXT_TAGS]
+        if strip:
+            return separator.join(part for part in (part.strip() for part in parts) if part)
+        return separator.join(parts)
+
+    @property
+    def text(self) -> str:
+        return self.get_text()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attributes = self.node.attributes
+        if key not in attributes:
+            return default
+        value = attributes[key]
+        return "" if value is None else value
+
+    def has_attr(self, key: str) -> bool:
+        return key in self.node.attributes
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+
+Document = Union[BeautifulSoup, SelectolaxNode]
+
+
+def available_backends() -> List[str]:
+    """Các backend dùng được trong môi trường hiện tại (theo thứ tự ưu tiên)"""
+    support = {"selectolax": SELECTOLAX_SUPPORT, "lxml": LXML_SUPPORT, "html.parser": True}
+    return [backend for backend in BACKENDS if support[backend]]
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """
+    Chọn backend thực tế
+
+    Args:
+        backend: selectolax, lxml, html.parser hoặc auto (None = HTML_PARSER_BACKEND trong config)
+
+    Returns:
+        str: Backend sẽ dùng; backend chưa cài đặt được thay bằng backend khả dụng tiếp theo
+    """
+    backend = backend or HTML_PARSER_BACKEND
+    available = available_backends()
+    if backend == "auto":
+        return available[0]
+    if backend in available:
+        return backend
+    if backend not in _warned_backends:
+        _warned_backends.add(backend)
+        if backend in BACKENDS:
+            logger.warning(f"Backend HTML {backend} chưa được cài đặt, dùng {available[0]}. "
+                           f"Hãy cài đặt: pip install {backend}")
+        else:
+            logger.warning(f"Backend HTML không hợp lệ: {backend}, dùng {available[0]}")
+    return available[0]
+
+
+def parse_html(html: Union[str, bytes], backend: Optional[str] = None) -> Document:
+    """
+    Phân tích HTML bằng backend đã chọn
+
+    Args:
+        html: Nội dung HTML
+        backend: Tên backend (None = HTML_PARSER_BACKEND trong config)
+
+    Returns:
+        Document: Đối tượng hỗ trợ select/select_one/get_text/get (BeautifulSoup hoặc SelectolaxNode)
+    """
+    backend = resolve_backend(backend)
+    if backend == "selectolax":
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="replace")
+        return SelectolaxNode(LexborHTMLParser(html).root)
+    return BeautifulSoup(html, backend)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Lấy HTML từ trình duyệt Selenium cho parser. Ở chế độ "region", trình duyệt chỉ gửi outerHTML của các vùng
+cấu hình trong CAPTURE_REGIONS (thẻ sản phẩm, khối chi tiết...) thay vì toàn bộ driver.page_source
+(header, footer, menu, script inline), nên dữ liệu truyền qua WebDriver và dữ liệu phải phân tích nhỏ hơn nhiều.
+Các vùng được giữ nguyên thứ tự trong tài liệu, vùng nằm trong vùng khác không bị lấy lặp lại.
+Trang lấy theo vùng không được lưu vào archive WARC (page_archive.py): reextract.py cần toàn bộ trang,
+nên muốn có archive thì phải chạy với --capture full.
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+from config import HTML_CAPTURE_MODE, CAPTURE_REGIONS, PAGE_ARCHIVE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MODES = ("full", "region")
+
+# Trả về {html, regions, full_length} hoặc null nếu không selector nào khớp;
+# full_length (kích thước toàn trang) chỉ được tính khi arguments[1] là true vì phải serialize cả tài liệu
+REGION_CAPTURE_JS = """
+const selectors = arguments[0];
+const measure = arguments[1];
+const matched = new Set();
+for (const selector of selectors) {
+    try {
+        document.querySelectorAll(selector).forEach(element => matched.add(element));
+    } catch (e) {
+        // Bỏ qua selector không hợp lệ
+    }
+}
+if (!matched.size) {
+    return null;
+}
+const roots = Array.from(matched).filter(element => {
+    for (let parent = element.parentElement; parent; parent = parent.parentElement) {
+        if (matched.has(parent)) {
+            return false;
+        }
+    }
+    return true;
+});
+roots.sort((a, b) => (a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING) ? -1 : 1);
+const title = document.createElement("title");
+title.textContent = document.title;
+return {
+    html: "<html><head>" + title.outerHTML + "</head><body>\\n" +
+          roots.map(element => element.outerHTML).join("\\n") + "\\n</body></html>",
+    regions: roots.length,
+    full_length: measure ? document.documentElement.outerHTML.length : null
+};
+"""
+
+# Số liệu cộng dồn của các trang đã lấy theo vùng (full_chars/measured_chars chỉ có khi log ở mức DEBUG)
+_totals: Dict[str, int] = {"pages": 0, "regions": 0, "captured_chars": 0, "fallbacks": 0,
+                           "measured_pages": 0, "measured_chars": 0, "full_chars": 0}
+_archive_warned = False
+
+
+def capture_html(driver, page_type: Optional[str] = None, mode: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Lấy HTML của trang hiện tại để phân tích
+
+    Args:
+        driver: WebDriver của Selenium
+        page_type: Loại trang trong CAPTURE_REGIONS (home, subcategories, listing, detail)
+        mode: "full" hoặc "region" (None = HTML_CAPTURE_MODE trong config)
+
+    Returns:
+        Tuple[str, bool]: HTML và True nếu HTML chỉ gồm các vùng cấu hình (không lưu vào archive được);
+                          toàn bộ page_source nếu chế độ full, loại trang không có vùng cấu hình hay không vùng nào khớp
+    """
+    global _archive_warned
+    mode = mode or HTML_CAPTURE_MODE
+    selectors = CAPTURE_REGIONS.get(page_type) if mode == "region" else None
+    if not selectors:
+        return driver.page_source, False
+
+    if PAGE_ARCHIVE_ENABLED and not _archive_warned:
+        _archive_warned = True
+        logger.warning("Chế độ --capture region: trang lấy theo vùng không được lưu vào archive WARC "
+                       "(reextract.py cần toàn bộ trang, hãy chạy với --capture full)")
+    measure = logger.isEnabledFor(logging.DEBUG)
+    try:
+        result = driver.execute_script(REGION_CAPTURE_JS, selectors, measure)
+    except Exception as e:
+        logger.warning(f"Lỗi khi lấy HTML theo vùng ({page_type}), dùng toàn bộ trang: {e}")
+        result = None
+    if not result:
+        _totals["fallbacks"] += 1
+        logger.info(f"Không tìm thấy vùng nào cho trang {page_type}, dùng toàn bộ trang")
+        return driver.page_source, False
+
+    html = result["html"]
+    _totals["pages"] += 1
+    _totals["regions"] += result["regions"]
+    _totals["captured_chars"] += len(html)
+    if result["full_length"]:
+        _totals["measured_pages"] += 1
+        _totals["measured_chars"] += len(html)
+        _totals["full_chars"] += result["full_length"]
+        logger.debug(f"Lấy {result['regions']} vùng ({page_type}): {len(html) / 1024:.1f} KB "
+                     f"thay vì {result['full_length'] / 1024:.1f} KB")
+    return html, True
+
+
+def format_capture_stats() -> str:
+    """Định dạng số liệu lấy HTML theo vùng để ghi log (chuỗi rỗng nếu chưa lấy trang nào theo vùng)"""
+    if not _totals["pages"] and not _totals["fallbacks"]:
+        return ""
+    captured_mb = _totals["captured_chars"] / 1024 / 1024
+    stats = (f"{_totals['pages']} trang lấy theo vùng ({_totals['regions']} vùng, {captured_mb:.2f} MB), "
+             f"{_totals['fallbacks']} trang dùng toàn bộ HTML")
+    if _totals["measured_pages"]:
+        ratio = _totals["full_chars"] / max(_totals["measured_chars"], 1)
+        stats += f"; {_totals['measured_pages']} trang đã đo nhỏ hơn {ratio:.1f} lần so với toàn trang"
+    return stats
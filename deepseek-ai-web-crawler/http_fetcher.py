@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tải HTML trực tiếp bằng HTTP client bất đồng bộ (keep-alive, connection pool, HTTP/2 nếu có)
+cho các trang mà dữ liệu sản phẩm đã nằm sẵn trong HTML ban đầu
+"""
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+# httpx + h2 cho phép dùng HTTP/2, nếu không có thì dùng aiohttp (HTTP/1.1 keep-alive)
+try:
+    import httpx
+    HTTPX_SUPPORT = True
+except ImportError:
+    HTTPX_SUPPORT = False
+
+try:
+    import h2  # noqa: F401
+    HTTP2_SUPPORT = HTTPX_SUPPORT
+except ImportError:
+    HTTP2_SUPPORT = False
+
+from config import (
+    USER_AGENT,
+    MAX_RETRIES,
+    CONNECTION_TIMEOUT,
+    READ_TIMEOUT,
+    HTTP_MAX_CONNECTIONS
+)
+from host_limiter import HostLimiter
+from html_backends import Document, parse_html
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7",
+}
+
+
+class HttpFetcher:
+    """HTTP client dùng chung một connection pool cho toàn bộ quá trình crawl"""
+
+    def __init__(self,
+                 limiter: Optional[HostLimiter] = None,
+                 max_connections: int = HTTP_MAX_CONNECTIONS,
+                 max_retries: int = MAX_RETRIES,
+                 headers: Optional[Dict[str, str]] = None):
+        """
+        Khởi tạo HttpFetcher
+
+        Args:
+            limiter: Bộ giới hạn request theo host (None nếu không giới hạn)
+            max_connections: Số kết nối tối đa trong pool
+            max_retries: Số lần thử lại khi request lỗi
+            headers: Header gửi kèm mỗi request
+        """
+        self.limiter = limiter
+        self.max_connections = max_connections
+        self.max_retries = max(1, max_retries)
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.client = None
+        self.backend = None
+        self.stats = {
+            "pages": 0,
+            "errors": 0,
+            "bytes": 0,
+            "elapsed": 0.0,
+        }
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """Tạo HTTP client (httpx nếu có, ngược lại aiohttp)"""
+        if self.client:
+            return
+        if HTTPX_SUPPORT:
+            self.client = httpx.AsyncClient(
+                http2=HTTP2_SUPPORT,
+                headers=self.headers,
+                follow_redirects=True,
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECTION_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            self.backend = "httpx (HTTP/2)" if HTTP2_SUPPORT else "httpx (HTTP/1.1)"
+        else:
+            self.client = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(sock_connect=CONNECTION_TIMEOUT, sock_read=READ_TIMEOUT)
+            )
+            self.backend = "aiohttp (HTTP/1.1)"
+        logger.info(f"Khởi tạo HTTP client: {self.backend}, tối đa {self.max_connections} kết nối")
+
+    async def close(self):
+        """Đóng HTTP client và giải phóng các kết nối"""
+        if not self.client:
+            return
+        if HTTPX_SUPPORT:
+            await self.client.aclose()
+        else:
+            await self.client.close()
+        self.client = None
+
+    async def _get(self, url: str) -> Tuple[int, Optional[str]]:
+        """Gửi một request GET, trả về mã trạng thái và nội dung HTML (None nếu mã trạng thái không phải 200)"""
+        if HTTPX_SUPPORT:
+            response = await self.client.get(url)
+            if response.status_code != 200:
+                return response.status_code, None
+            self.stats["bytes"] += len(response.content)
+            return response.status_code, response.text
+
+        async with self.client.get(url) as response:
+            if response.status != 200:
+                return response.status, None
+            body = await response.read()
+            self.stats["bytes"] += len(body)
+            return response.status, body.decode(response.get_encoding() or "utf-8", errors="replace")
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """
+        Tải HTML của một URL với cơ chế thử lại
+
+        Args:
+            url: URL cần tải
+
+        Returns:
+            Optional[str]: Nội dung HTML hoặc None nếu không tải được
+        """
+        if not self.client:
+            await self.open()
+
+        for attempt in range(self.max_retries):
+            start_time = time.perf_counter()
+            try:
+                if self.limiter:
+                    async with self.limiter.slot(url):
+                        status, html = await self._get(url)
+                else:
+                    status, html = await self._get(url)
+                elapsed = time.perf_counter() - start_time
+                if html is not None:
+                    self.stats["pages"] += 1
+                    self.stats["elapsed"] += elapsed
+                    logger.debug(f"Đã tải {url} trong {elapsed * 1000:.0f} ms")
+                    return html
+                logger.warning(f"HTTP {status} khi tải {url}")
+                # Lỗi phía client (trừ 429) thì thử lại cũng không có kết quả khác
+                if 400 <= status < 500 and status != 429:
+                    break
+            except Exception as e:
+                logger.warning(f"Lỗi khi tải {url} (lần {attempt + 1}/{self.max_retries}): {e}")
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(2 ** attempt)
+
+        self.stats["errors"] += 1
+        logger.error(f"Không thể tải {url}")
+        return None
+
+    async def fetch_soup(self, url: str) -> Optional[Document]:
+        """Tải URL và trả về tài liệu HTML đã phân tích bằng backend trong config (None nếu không tải được)"""
+        html = await self.fetch(url)
+        if html is None:
+            return None
+        return parse_html(html)
+
+    def format_stats(self) -> str:
+        """Định dạng số liệu để ghi log"""
+        pages = self.stats["pages"]
+        average_ms = self.stats["elapsed"] / pages * 1000 if pages else 0.0
+        average_kb = self.stats["bytes"] / pages / 1024 if pages else 0.0
+        return (f"{pages} trang qua {self.backend or 'HTTP'}, {self.stats['errors']} lỗi, "
+                f"trung bình {average_ms:.0f} ms và {average_kb:.1f} KB mỗi trang")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Pipeline tải hình ảnh bất đồng bộ: một connection pool dùng chung, giới hạn kết nối theo host CDN,
+stream dữ liệu xuống đĩa và chạy như một stage riêng để việc crawl trang chi tiết không phải đợi I/O hình ảnh
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional, Callable
+
+import aiohttp
+
+from config_playwright import (
+    MAX_RETRIES,
+    BROWSER_CONFIG,
+    IMAGE_WORKERS,
+    IMAGE_HOST_CONCURRENCY,
+    IMAGE_MAX_CONNECTIONS,
+    IMAGE_CHUNK_SIZE,
+    IMAGE_MIN_BYTES
+)
+from host_limiter import HostLimiter
+from thumbnails import ThumbnailStage
+from image_store import ImageStore, get_image_store
+from validator_cache import ValidatorCache, get_validator_cache
+from config import IMAGE_REVALIDATE_AFTER
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 30  # Timeout cho mỗi request hình ảnh (giây)
+
+
+class ImageDownloader:
+    """Tải hình ảnh qua một aiohttp session dùng chung, ghi stream vào file tạm rồi đổi tên"""
+
+    def __init__(self,
+                 host_concurrency: int = IMAGE_HOST_CONCURRENCY,
+                 max_connections: int = IMAGE_MAX_CONNECTIONS,
+                 max_retries: int = MAX_RETRIES,
+                 store: Optional[ImageStore] = None,
+                 validators: Optional[ValidatorCache] = None,
+                 revalidate_after: Optional[float] = IMAGE_REVALIDATE_AFTER):
+        """
+        Khởi tạo ImageDownloader
+
+        Args:
+            host_concurrency: Số request đồng thời tối đa tới cùng một host
+            max_connections: Số kết nối tối đa trong pool
+            max_retries: Số lần thử lại khi tải lỗi
+            store: Kho hình ảnh định địa chỉ theo nội dung (mặc định dùng kho chung)
+            validators: Cache ETag/Last-Modified (mặc định dùng cache chung)
+            revalidate_after: Sau bao lâu (giây) hình ảnh trong kho được kiểm tra lại bằng conditional GET
+        """
+        self.limiter = HostLimiter(max_per_host=host_concurrency)
+        self.max_connections = max_connections
+        self.max_retries = max(1, max_retries)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.store = store or get_image_store()
+        self.validators = validators or get_validator_cache()
+        self.revalidate_after = revalidate_after
+        self.stats = {
+            "downloaded": 0,
+            "skipped": 0,
+            "cached": 0,
+            "not_modified": 0,
+            "failed": 0,
+            "bytes": 0,
+        }
+
+    async def open(self):
+        """Tạo aiohttp session (gọi trong event loop)"""
+        if self.session:
+            return
+        self.session = aiohttp.ClientSession(
+            headers={"User-Agent": BROWSER_CONFIG["user_agent"]},
+            connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+
+    async def close(self):
+        """Đóng session và giải phóng các kết nối"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _stream_to_file(self, image_url: str, file_path: str, cached_blob: Optional[str] = None) -> Optional[int]:
+        """
+        Stream hình ảnh vào file tạm rồi đưa vào kho hình ảnh
+
+        Args:
+            image_url: URL hình ảnh
+            file_path: Đường dẫn lưu file
+            cached_blob: Blob đã có của URL; khi có, request được gửi kèm validator (conditional GET)
+
+        Returns:
+            Optional[int]: Số bytes đã ghi, None nếu server trả 304 và blob cũ được dùng lại
+        """
+        temp_path = file_path + ".part"
+        written = 0
+        conditional = self.validators.conditional_headers(image_url) if cached_blob else {}
+        try:
+            async with self.limiter.slot(image_url):
+                async with self.session.get(image_url, headers=conditional) as response:
+                    if response.status == 304 and cached_blob:
+                        self.validators.mark_not_modified(image_url, response.headers)
+                        if not self.store.materialize(cached_blob, file_path):
+                            raise OSError(f"Không thể tạo {file_path} từ kho hình ảnh")
+                        return None
+                    response.raise_for_status()
+                    with open(temp_path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                            f.write(chunk)
+                            written += len(chunk)
+                    response_headers = response.headers
+
+            if written < IMAGE_MIN_BYTES:
+                raise ValueError(f"Hình ảnh quá nhỏ ({written} bytes)")
+            extension = os.path.splitext(file_path)[1] or ".jpg"
+            if not self.store.store_download(image_url, temp_path, file_path, extension):
+                raise OSError(f"Không thể tạo {file_path} từ kho hình ảnh")
+            self.validators.update(image_url, response_headers)
+            return written
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def download(self, image_url: str, file_path: str) -> bool:
+        """
+        Tải một hình ảnh về file_path (bỏ qua nếu file đã tồn tại)
+
+        Args:
+            image_url: URL hình ảnh
+            file_path: Đường dẫn lưu file
+
+        Returns:
+            bool: True nếu file có sẵn hoặc tải thành công
+        """
+        if os.path.exists(file_path):
+            self.stats["skipped"] += 1
+            return True
+
+        # URL đã có trong kho: tạo hard link tới blob, không gọi mạng
+        # (trừ khi validator đã cũ hơn revalidate_after, khi đó gửi conditional GET)
+        cached_blob = self.store.lookup(image_url)
+        if cached_blob and not self.validators.needs_revalidation(image_url, self.revalidate_after):
+            if self.store.materialize(cached_blob, file_path):
+                self.stats["cached"] += 1
+                return True
+
+        if not self.session:
+            await self.open()
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        for attempt in range(self.max_retries):
+            try:
+                written = await self._stream_to_file(image_url, file_path, cached_blob)
+                if written is None:
+                    self.stats["not_modified"] += 1
+                else:
+                    self.stats["downloaded"] += 1
+                    self.stats["bytes"] += written
+                return True
+            except aiohttp.ClientResponseError as e:
+                logger.warning(f"HTTP {e.status} khi tải hình ảnh {image_url} (lần thử {attempt+1}/{self.max_retries})")
+                # Lỗi phía client (trừ 429) thì thử lại cũng không có kết quả khác
+                if 400 <= e.status < 500 and e.status != 429:
+                    break
+            except Exception as e:
+                logger.warning(f"Lỗi khi tải hình ảnh {image_url} (lần thử {attempt+1}/{self.max_retries}): {e}")
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(1)
+
+        self.stats["failed"] += 1
+        logger.error(f"Không thể tải hình ảnh: {image_url}")
+        return False
+
+
+class ImagePipeline:
+    """Hàng đợi tải hình ảnh với các worker riêng; submit() trả về future để bên gọi đợi khi cần"""
+
+    def __init__(self,
+                 workers: int = IMAGE_WORKERS,
+                 downloader: Optional[ImageDownloader] = None,
+                 postprocess: Optional[Callable[[str], Any]] = None,
+                 thumbnails: Optional[ThumbnailStage] = None):
+        """
+        Khởi tạo ImagePipeline
+
+        Args:
+            workers: Số worker tải hình ảnh
+            downloader: ImageDownloader dùng chung (tạo mới nếu None)
+            postprocess: Hàm xử lý file sau khi tải (ví dụ tạo thumbnail), chạy trong thread pool
+            thumbnails: Stage tạo thumbnail trên process pool (pipeline quản lý vòng đời của stage)
+        """
+        self.workers = max(1, workers)
+        self.downloader = downloader or ImageDownloader()
+        self.postprocess = postprocess
+        self.thumbnails = thumbnails
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+        self.start_time = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Khởi động các worker"""
+        if self._tasks:
+            return
+        await self.downloader.open()
+        if self.thumbnails:
+            await self.thumbnails.start()
+        self.start_time = time.perf_counter()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, image_url: str, file_path: str) -> asyncio.Future:
+        """Đưa một hình ảnh vào hàng đợi, trả về future nhận kết quả True/False"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((image_url, file_path, future))
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            image_url, file_path, future = await self.queue.get()
+            try:
+                success = await self.downloader.download(image_url, file_path)
+                if success and self.postprocess:
+                    try:
+                        await loop.run_in_executor(None, self.postprocess, file_path)
+                    except Exception as e:
+                        logger.warning(f"Không thể xử lý sau khi tải {file_path}: {e}")
+                if success and self.thumbnails:
+                    # Worker không đợi thumbnail; future hoàn tất khi batch chứa file này xử lý xong
+                    self.thumbnails.submit(file_path).add_done_callback(
+                        lambda _, future=future: future.done() or future.set_result(True))
+                elif not future.done():
+                    future.set_result(success)
+            except Exception as e:
+                logger.error(f"Lỗi trong pipeline hình ảnh với {image_url}: {e}")
+                if not future.done():
+                    future.set_result(False)
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        """Đợi hàng đợi trống, dừng worker, đóng session và ghi log thông lượng"""
+        if self._tasks:
+            await self.queue.join()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            logger.info(f"Pipeline hình ảnh: {self.format_stats()}")
+            logger.info(f"Kho hình ảnh: {self.downloader.store.format_stats()}")
+            logger.info(f"Conditional GET: {self.downloader.validators.format_stats()}")
+        if self.thumbnails:
+            await self.thumbnails.close()
+        await self.downloader.close()
+
+    def format_stats(self) -> str:
+        """Định dạng số liệu thông lượng để ghi log"""
+        stats: Dict[str, Any] = self.downloader.stats
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        rate = stats["downloaded"] / elapsed if elapsed > 0 else 0.0
+        return (f"tải {stats['downloaded']} hình ảnh ({stats['bytes'] / 1024 / 1024:.2f} MB), "
+                f"bỏ qua {stats['skipped']} đã có, lấy {stats['cached']} từ kho, "
+                f"{stats['not_modified']} không đổi (304), lỗi {stats['failed']}, "
+                f"trong {elapsed:.2f} giây - {rate:.1f} ảnh/giây")
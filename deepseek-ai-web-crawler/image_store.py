@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Kho hình ảnh định địa chỉ theo nội dung (content-addressed), dùng chung cho mọi đường tải hình ảnh.
+
+Mỗi hình ảnh được lưu một lần dưới dạng blob theo SHA-256 của nội dung. File manifest.jsonl ghi
+ánh xạ URL -> blob, nhờ đó URL đã lưu được bỏ qua mà không cần gọi mạng, và các URL khác nhau
+có cùng nội dung dùng chung một blob. Thư mục của từng sản phẩm chỉ chứa hard link tới blob.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from config import IMAGE_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024  # Kích thước mỗi lần đọc khi tính hash file (bytes)
+
+_stores: Dict[str, "ImageStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def url_key(url: str) -> str:
+    """Khóa của URL trong manifest (SHA-256 của URL)"""
+    return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    """Tính SHA-256 của file theo từng khối"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """Kho blob hình ảnh với manifest ánh xạ URL -> nội dung"""
+
+    def __init__(self, root: str = IMAGE_STORE_DIR):
+        """
+        Khởi tạo ImageStore và nạp manifest
+
+        Args:
+            root: Thư mục gốc của kho
+        """
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_path = os.path.join(root, "manifest.jsonl")
+        self.url_index: Dict[str, str] = {}   # url_key -> sha256
+        self.blob_index: Dict[str, str] = {}  # sha256 -> đường dẫn blob
+        self.lock = threading.Lock()
+        self.stats = {"url_hits": 0, "content_dedup": 0, "stored": 0, "bytes_saved": 0}
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.url_index[record["url_key"]] = record["sha256"]
+                    self.blob_index[record["sha256"]] = os.path.join(self.root, record["path"])
+            logger.info(f"Đã nạp kho hình ảnh: {len(self.url_index)} URL, {len(self.blob_index)} blob")
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc manifest kho hình ảnh {self.manifest_path}: {e}")
+
+    def _append_manifest(self, record: Dict[str, Any]):
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        Tìm blob của URL đã lưu trước đó (không gọi mạng)
+
+        Args:
+            url: URL hình ảnh
+
+        Returns:
+            Optional[str]: Đường dẫn blob hoặc None nếu URL chưa có trong kho
+        """
+        sha256 = self.url_index.get(url_key(url))
+        if not sha256:
+            return None
+        blob_path = self.blob_index.get(sha256)
+        if blob_path and os.path.exists(blob_path):
+            self.stats["url_hits"] += 1
+            return blob_path
+        return None
+
+    def put_file(self, url: str, file_path: str, extension: str = ".jpg") -> str:
+        """
+        Đưa file vừa tải vào kho (file được chuyển vào kho hoặc xóa nếu nội dung đã có)
+
+        Args:
+            url: URL nguồn của hình ảnh
+            file_path: File tạm chứa nội dung đã tải
+            extension: Phần mở rộng của blob (ví dụ ".jpg")
+
+        Returns:
+            str: Đường dẫn blob trong kho
+        """
+        sha256 = file_sha256(file_path)
+        extension = extension if extension.startswith(".") else f".{extension}"
+        size = os.path.getsize(file_path)
+
+        with self.lock:
+            blob_path = self.blob_index.get(sha256)
+            if blob_path and os.path.exists(blob_path):
+                # Cùng nội dung với blob đã có (URL khác hoặc tải lại), chỉ ghi thêm ánh xạ URL
+                os.remove(file_path)
+                self.stats["content_dedup"] += 1
+                self.stats["bytes_saved"] += size
+            else:
+                relative_path = os.path.join("blobs", sha256[:2], f"{sha256}{extension}")
+                blob_path = os.path.join(self.root, relative_path)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(file_path, blob_path)
+                self.blob_index[sha256] = blob_path
+                self.stats["stored"] += 1
+
+            key = url_key(url)
+            if self.url_index.get(key) != sha256:
+                self.url_index[key] = sha256
+                self._append_manifest({
+                    "url_key": key,
+                    "url": url,
+                    "sha256": sha256,
+                    "path": os.path.relpath(blob_path, self.root),
+                    "size": size,
+                    "stored_at": datetime.now().isoformat(timespec="seconds"),
+                })
+        return blob_path
+
+    def materialize(self, blob_path: str, dest_path: str) -> bool:
+        """
+        Tạo file dest_path trỏ tới blob (hard link, sao chép nếu hệ thống không hỗ trợ)
+
+        Args:
+            blob_path: Đường dẫn blob trong kho
+            dest_path: Đường dẫn file cần tạo
+
+        Returns:
+            bool: True nếu thành công
+        """
+        try:
+            if os.path.exists(dest_path):
+                if os.path.samefile(dest_path, blob_path):
+                    return True
+                os.remove(dest_path)
+            os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+            try:
+                os.link(blob_path, dest_path)
+            except OSError:
+                shutil.copy2(blob_path, dest_path)
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo file {dest_path} từ kho hình ảnh: {e}")
+            return False
+
+    def link_cached(self, url: str, dest_path: str) -> bool:
+        """Nếu URL đã có trong kho thì tạo dest_path từ blob và trả về True (không gọi mạng)"""
+        blob_path = self.lookup(url)
+        return bool(blob_path) and self.materialize(blob_path, dest_path)
+
+    def store_download(self, url: str, temp_path: str, dest_path: str, extension: str = ".jpg") -> bool:
+        """Đưa file tạm vừa tải vào kho rồi tạo dest_path trỏ tới blob"""
+        return self.materialize(self.put_file(url, temp_path, extension), dest_path)
+
+    def format_stats(self) -> str:
+        """Định dạng số liệu để ghi log"""
+        return (f"dùng lại {self.stats['url_hits']} URL đã lưu (không tải lại), "
+                f"{self.stats['content_dedup']} hình ảnh trùng nội dung "
+                f"({self.stats['bytes_saved'] / 1024 / 1024:.2f} MB tiết kiệm), "
+                f"lưu mới {self.stats['stored']} blob")
+
+
+def get_image_store(root: str = IMAGE_STORE_DIR) -> ImageStore:
+    """Lấy ImageStore dùng chung cho thư mục root (mỗi tiến trình chỉ nạp manifest một lần)"""
+    with _stores_lock:
+        key = os.path.abspath(root)
+        if key not in _stores:
+            _stores[key] = ImageStore(root)
+        return _stores[key]
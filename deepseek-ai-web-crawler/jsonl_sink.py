@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Ghi dữ liệu dạng JSON Lines chỉ nối thêm (append-only): mỗi batch chỉ ghi các dòng mới nên chi phí
+không phụ thuộc vào kích thước file. File JSON dạng mảng chỉ được tạo ở bước finalize.
+"""
+import io
+import os
+import json
+import logging
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+from config import JSONL_FSYNC, JSONL_COMPRESS
+from stream_readers import iter_json_array
+
+# zstandard là tùy chọn: mỗi lần flush ghi một frame zstd riêng, các frame nối tiếp vẫn là file .zst hợp lệ
+try:
+    import zstandard
+    ZSTD_SUPPORT = True
+except ImportError:
+    ZSTD_SUPPORT = False
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "batch", "never")
+ZSTD_SUFFIX = ".zst"
+
+
+def jsonl_path_for(json_path: str, compress: bool = JSONL_COMPRESS) -> str:
+    """Đường dẫn file JSONL tương ứng với file JSON (ví dụ product_details.json -> product_details.jsonl)"""
+    base = os.path.splitext(json_path)[0] + ".jsonl"
+    return base + ZSTD_SUFFIX if compress and ZSTD_SUPPORT else base
+
+
+class JsonlSink:
+    """Ghi record vào file JSONL (tùy chọn nén zstd) theo kiểu chỉ nối thêm"""
+
+    def __init__(self, path: str, fsync: str = JSONL_FSYNC, compress: Optional[bool] = None):
+        """
+        Khởi tạo JsonlSink
+
+        Args:
+            path: Đường dẫn file (.jsonl hoặc .jsonl.zst)
+            fsync: Chính sách fsync: always (sau mỗi record), batch (sau mỗi lần write_many/flush), never
+            compress: Nén zstd (mặc định theo phần mở rộng .zst của path)
+        """
+        if fsync not in FSYNC_POLICIES:
+            logger.warning(f"Chính sách fsync không hợp lệ: {fsync}, dùng 'batch'")
+            fsync = "batch"
+        if compress is None:
+            compress = path.endswith(ZSTD_SUFFIX)
+        if compress and not ZSTD_SUPPORT:
+            logger.warning("Chưa cài zstandard, ghi JSONL không nén")
+            compress = False
+            if path.endswith(ZSTD_SUFFIX):
+                path = path[:-len(ZSTD_SUFFIX)]
+
+        self.path = path
+        self.fsync = fsync
+        self.compress = compress
+        self.compressor = zstandard.ZstdCompressor() if compress else None
+        self.file = None
+        self.buffer = []
+        self.count = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """Mở file ở chế độ nối thêm"""
+        if self.file:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "ab")
+
+    def write(self, record: Dict[str, Any]):
+        """Thêm một record (ghi ngay nếu fsync='always', ngược lại đợi flush)"""
+        self.buffer.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.count += 1
+        if self.fsync == "always":
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict[str, Any]]):
+        """Thêm nhiều record rồi flush như một batch"""
+        for record in records:
+            self.buffer.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self.count += 1
+        self.flush()
+
+    def flush(self):
+        """Ghi các record đang chờ xuống file (và fsync theo chính sách)"""
+        if not self.buffer:
+            return
+        if not self.file:
+            self.open()
+        data = "".join(self.buffer).encode("utf-8")
+        self.buffer = []
+        if self.compressor:
+            data = self.compressor.compress(data)
+        self.file.write(data)
+        self.file.flush()
+        if self.fsync != "never":
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """Flush và đóng file"""
+        if self.file or self.buffer:
+            self.flush()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Đọc lần lượt các record từ file JSONL (hỗ trợ .zst), bỏ qua dòng hỏng (ví dụ dòng cuối ghi dở)
+
+    Args:
+        path: Đường dẫn file
+
+    Returns:
+        Iterator[Dict[str, Any]]: Các record theo thứ tự ghi
+    """
+    if not os.path.exists(path):
+        return
+    if path.endswith(ZSTD_SUFFIX):
+        if not ZSTD_SUPPORT:
+            logger.error(f"Cần cài zstandard để đọc {path}")
+            return
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+        stream = io.TextIOWrapper(reader, encoding="utf-8")
+    else:
+        stream = open(path, "r", encoding="utf-8")
+
+    with stream:
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"Bỏ qua dòng {line_number} không hợp lệ trong {path}")
+
+
+def finalize_json(jsonl_path: str, json_path: str, key: Optional[str] = "product_url") -> int:
+    """
+    Tạo file JSON dạng mảng từ file JSONL (ghi từng record, không nạp toàn bộ vào bộ nhớ).
+    Khi có key, chỉ giữ record cuối cùng của mỗi giá trị key (bản crawl lại thay thế bản cũ).
+
+    Args:
+        jsonl_path: File JSONL nguồn
+        json_path: File JSON đích
+        key: Trường dùng để loại trùng (None = giữ tất cả)
+
+    Returns:
+        int: Số record đã ghi
+    """
+    last_index = {}
+    if key:
+        for index, record in enumerate(read_jsonl(jsonl_path)):
+            if record.get(key):
+                last_index[record[key]] = index
+
+    temp_path = json_path + ".tmp"
+    written = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for index, record in enumerate(read_jsonl(jsonl_path)):
+                if key and record.get(key) and last_index.get(record[key]) != index:
+                    continue
+                f.write(",\n" if written else "\n")
+                # Thụt lề giống json.dump(list, indent=4) (chuỗi JSON không chứa ký tự xuống dòng thật)
+                f.write("    " + json.dumps(record, ensure_ascii=False, indent=4, default=str).replace("\n", "\n    "))
+                written += 1
+            f.write("\n]" if written else "]")
+        os.replace(temp_path, json_path)
+        logger.info(f"Đã tạo {json_path} với {written} record từ {jsonl_path}")
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo {json_path} từ {jsonl_path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return written
+
+
+def seed_from_json(json_path: str, sink: JsonlSink, batch_size: int = 1000) -> int:
+    """Chuyển dữ liệu của file JSON dạng mảng cũ vào sink (dùng một lần khi chưa có file JSONL), đọc dạng stream"""
+    count = 0
+    batch = []
+    try:
+        for record in iter_json_array(json_path):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                sink.write_many(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            sink.write_many(batch)
+            count += len(batch)
+    except Exception as e:
+        logger.error(f"Lỗi khi đọc {json_path}: {e}")
+        return count
+    logger.info(f"Đã chuyển {count} record từ {json_path} sang {sink.path}")
+    return count
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Trích xuất thẻ sản phẩm trên trang danh sách ngay trong trình duyệt. Hàm JavaScript được đăng ký một lần
+cho mỗi page (add_init_script), sau đó mỗi lần trích xuất chỉ cần một page.evaluate trả về số thẻ và
+toàn bộ thẻ dưới dạng mảng JSON, thay vì query_selector/text_content/get_attribute cho từng trường của từng thẻ.
+"""
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urljoin
+
+from config import READY_SELECTORS
+from config_playwright import LISTING_CARD_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Các selector có thể là thẻ sản phẩm; selector khớp nhiều thẻ nhất được dùng (giống count_items)
+LISTING_CARD_SELECTORS = READY_SELECTORS["listing"][0]
+# Các trường chứa URL, được chuyển thành URL tuyệt đối theo URL của trang
+URL_FIELDS = ("product_url",)
+
+# Định nghĩa window.__listingCards(selectors, fields, limit, uniqueField) -> {count, selector, cards}
+# uniqueField: bỏ qua thẻ không có hoặc trùng giá trị trường này, dừng khi đủ limit thẻ khác nhau
+LISTING_CARDS_JS = """
+(() => {
+    if (window.__listingCards) {
+        return;
+    }
+    window.__listingCards = (selectors, fields, limit, uniqueField) => {
+        let cards = [];
+        let cardSelector = null;
+        for (const selector of selectors) {
+            let nodes;
+            try {
+                nodes = document.querySelectorAll(selector);
+            } catch (e) {
+                continue;
+            }
+            if (nodes.length > cards.length) {
+                cards = nodes;
+                cardSelector = selector;
+            }
+        }
+        const items = [];
+        const seen = new Set();
+        const fieldEntries = Object.entries(fields);
+        for (let i = 0; i < cards.length && items.length < limit; i++) {
+            const item = {};
+            for (const [field, [selector, attribute]] of fieldEntries) {
+                let element = null;
+                try {
+                    element = cards[i].querySelector(selector);
+                } catch (e) {
+                    continue;
+                }
+                if (!element) {
+                    continue;
+                }
+                if (attribute === "text") {
+                    item[field] = (element.textContent || "").trim();
+                } else {
+                    const value = element.getAttribute(attribute);
+                    if (value) {
+                        item[field] = value;
+                    }
+                }
+            }
+            if (uniqueField) {
+                const key = item[uniqueField];
+                if (!key || seen.has(key)) {
+                    continue;
+                }
+                seen.add(key);
+            }
+            items.push(item);
+        }
+        return {count: cards.length, selector: cardSelector, cards: items};
+    };
+})();
+"""
+
+# Gọi hàm đã đăng ký; trả về null nếu page chưa có hàm (page chưa đăng ký hoặc đã mở trước khi đăng ký)
+CALL_LISTING_CARDS_JS = """
+([selectors, fields, limit, uniqueField]) =>
+    window.__listingCards ? window.__listingCards(selectors, fields, limit, uniqueField) : null
+"""
+
+
+async def register_listing_script(page) -> bool:
+    """
+    Đăng ký hàm trích xuất thẻ sản phẩm cho page (chạy lại tự động mỗi khi page điều hướng)
+
+    Args:
+        page: Page của Playwright
+
+    Returns:
+        bool: True nếu đăng ký thành công
+    """
+    try:
+        await page.add_init_script(script=LISTING_CARDS_JS)
+        return True
+    except Exception as e:
+        logger.warning(f"Không thể đăng ký script trích xuất thẻ sản phẩm: {e}")
+        return False
+
+
+async def extract_listing_cards(page, limit: int,
+                                selectors: Optional[List[str]] = None,
+                                fields: Optional[Dict[str, Tuple[str, str]]] = None,
+                                unique_field: Optional[str] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Lấy số thẻ sản phẩm và thông tin của tối đa limit thẻ trong một lần page.evaluate
+
+    Args:
+        page: Page của Playwright
+        limit: Số thẻ tối đa cần trích xuất (0 = chỉ đếm)
+        selectors: Các selector thẻ sản phẩm (mặc định LISTING_CARD_SELECTORS)
+        fields: Trường -> (selector trong thẻ, thuộc tính) (mặc định LISTING_CARD_FIELDS)
+        unique_field: Bỏ qua thẻ không có hoặc trùng giá trị trường này (None = lấy mọi thẻ)
+
+    Returns:
+        Tuple[int, List[Dict[str, Any]]]: Tổng số thẻ trên trang và danh sách thông tin thẻ
+    """
+    args = [selectors or LISTING_CARD_SELECTORS, fields or LISTING_CARD_FIELDS, max(0, int(limit)), unique_field]
+    try:
+        result = await page.evaluate(CALL_LISTING_CARDS_JS, args)
+        if result is None:
+            # Page chưa có hàm (chưa đăng ký trước khi điều hướng): định nghĩa trên trang hiện tại rồi gọi lại
+            await page.evaluate(LISTING_CARDS_JS)
+            result = await page.evaluate(CALL_LISTING_CARDS_JS, args)
+    except Exception as e:
+        logger.error(f"Lỗi khi trích xuất thẻ sản phẩm: {e}")
+        return 0, []
+    if not result:
+        return 0, []
+
+    cards = result["cards"]
+    for card in cards:
+        for field in URL_FIELDS:
+            if card.get(field):
+                card[field] = urljoin(page.url, card[field])
+    if cards:
+        logger.debug(f"Trích xuất {len(cards)}/{result['count']} thẻ sản phẩm với selector: {result['selector']}")
+    return result["count"], cards
+
+
+async def count_listing_cards(page, selectors: Optional[List[str]] = None) -> int:
+    """Đếm số thẻ sản phẩm hiện có trên trang (selector khớp nhiều thẻ nhất)"""
+    count, _ = await extract_listing_cards(page, 0, selectors)
+    return count
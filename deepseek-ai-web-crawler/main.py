@@ -7,9 +7,11 @@ import time
 import logging
 import asyncio
 import argparse
+import threading
 from typing import List, Dict, Any, Set
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import urljoin
 
 from dotenv import load_dotenv
 from crawl4ai import AsyncWebCrawler
@@ -18,6 +20,13 @@ import undetected_chromedriver as uc
 from crawler import WebCrawler, AsyncCrawler
 from parser import DataParser
 from storage import DataStorage
+from http_fetcher import HttpFetcher
+from host_limiter import HostLimiter
+from page_readiness import soup_is_ready
+from crawl_state import CrawlStateStore
+from crawl_journal import CrawlJournal
+from product_model import Product, merge_product
+from page_archive import archive_page
 import config
 from utils.scraper_utils import (
     get_browser_config,
@@ -42,10 +51,6 @@ logger = logging.getLogger(__name__)
 # Tải biến môi trường từ file .env
 load_dotenv()
 
-def is_complete_product(product: Dict[str, Any], required_keys: List[str]) -> bool:
-    """Kiểm tra xem sản phẩm có đầy đủ các trường bắt buộc không"""
-    return all(key in product for key in required_keys)
-
 def is_duplicate_product(product_url: str, seen_urls: Set[str]) -> bool:
     """Kiểm tra xem sản phẩm đã được crawl chưa"""
     return product_url in seen_urls
@@ -53,30 +58,108 @@ def is_duplicate_product(product_url: str, seen_urls: Set[str]) -> bool:
 class CrawlerManager:
     """Quản lý và điều phối quá trình crawl dữ liệu"""
     
-    def __init__(self, use_async: bool = True):
+    def __init__(self, use_async: bool = True, incremental: bool = False,
+                 recrawl_after: float = config.RECRAWL_MAX_AGE):
         """
         Khởi tạo CrawlerManager
         
         Args:
             use_async: Sử dụng AsyncCrawler (True) hoặc WebCrawler thông thường (False)
+            incremental: Chỉ tải lại sản phẩm mới, lỗi, quá hạn hoặc đổi giá (theo bảng trạng thái crawl)
+            recrawl_after: Thời hạn (giây) trước khi sản phẩm đã tải được coi là quá hạn
         """
         self.use_async = use_async
         self.crawler = AsyncCrawler() if use_async else WebCrawler()
         self.parser = DataParser()
         self.storage = DataStorage(output_dir=config.OUTPUT_DIR)
+        # CSV được ghi theo từng sản phẩm, mỗi lần chỉ nối thêm dòng mới
+        self.csv_writer = self.storage.open_csv_writer(config.OUTPUT_FILE_CSV)
+        self.output_lock = threading.Lock()
         self.seen_urls = set()
         self.categories = []
         self.products = []
+        self.fallback_crawler = None
+        self.fallback_lock = asyncio.Lock()
+        self.fallback_pages = 0
+        self.incremental = incremental
+        # Bảng trạng thái luôn được cập nhật để lần chạy incremental sau có dữ liệu để so sánh
+        self.state = CrawlStateStore(max_age=recrawl_after)
+        self.journal = CrawlJournal()
         
     def load_checkpoint(self, checkpoint_file: str):
-        """Tải checkpoint từ lần crawl trước"""
+        """
+        Tải checkpoint từ lần crawl trước
+        
+        Args:
+            checkpoint_file: File journal (mặc định JOURNAL_FILE) để phát lại và tiếp tục ghi,
+                hoặc file checkpoint_<timestamp>.json của phiên bản cũ. None sẽ bắt đầu journal mới.
+        """
+        if self.incremental:
+            logger.info(f"Chế độ incremental: {self.state.count()} sản phẩm trong bảng trạng thái crawl")
         if not checkpoint_file:
+            self.journal.reset()
             return
+        
+        if checkpoint_file.endswith(".json"):
+            # Checkpoint dạng danh sách URL của phiên bản cũ
+            urls = self.storage.load_checkpoint(checkpoint_file)
+            self.journal.reset()
+            if urls:
+                self.seen_urls.update(urls)
+                self.state.import_urls(urls)
+                for url in urls:
+                    self.journal.record_url(url)
+                logger.info(f"Đã tải {len(urls)} URL đã crawl từ checkpoint")
+        else:
+            self.journal.close()
+            self.journal = CrawlJournal(os.path.join(config.OUTPUT_DIR, checkpoint_file)).replay()
+            self.seen_urls.update(self.journal.completed_urls())
+        
+        # Tiếp tục ghi vào CSV của lượt trước thay vì ghi đè
+        self.csv_writer = self.storage.open_csv_writer(config.OUTPUT_FILE_CSV, append=True)
+    
+    def category_done(self, category_url: str) -> bool:
+        """Kiểm tra danh mục đã hoàn thành ở lượt crawl được tiếp tục chưa"""
+        if self.journal.is_unit_done(category_url):
+            logger.info(f"Bỏ qua danh mục đã hoàn thành theo journal: {category_url}")
+            return True
+        return False
+    
+    def should_crawl(self, product: Dict[str, Any]) -> bool:
+        """
+        Kiểm tra sản phẩm có cần crawl chi tiết không
+        
+        Args:
+            product: Thông tin sản phẩm ở trang danh sách (product_url, price)
             
-        urls = self.storage.load_checkpoint(checkpoint_file)
-        if urls:
-            self.seen_urls.update(urls)
-            logger.info(f"Đã tải {len(urls)} URL đã crawl từ checkpoint")
+        Returns:
+            bool: False nếu đã crawl trong lượt này/checkpoint, hoặc (chế độ incremental) vẫn còn mới
+        """
+        product_url = product["product_url"]
+        if is_duplicate_product(product_url, self.seen_urls):
+            return False
+        if self.incremental:
+            return self.state.should_fetch(product_url, product.get("price"))
+        return True
+    
+    def record_product(self, product_url: str, product: Dict[str, Any] = None):
+        """
+        Ghi kết quả crawl một sản phẩm: dữ liệu vào CSV trước, sau đó mới ghi journal
+        để khi tiếp tục giữa chừng, mọi URL trong journal đều đã có dữ liệu
+        
+        Args:
+            product_url: URL sản phẩm
+            product: Dữ liệu sản phẩm (None nghĩa là tải lỗi)
+        """
+        if product:
+            with self.output_lock:
+                if not self.storage.append_to_csv(self.csv_writer, [product]):
+                    logger.error(f"Không lưu được sản phẩm {product_url} vào CSV")
+            self.state.record(product_url, product)
+            self.journal.record_url(product_url)
+        else:
+            self.state.record_failure(product_url)
+            self.journal.record_url(product_url, status="failed")
     
     async def run_async(self, max_products_per_category: int = None, checkpoint_file: str = None):
         """Chạy crawler bất đồng bộ"""
@@ -106,10 +189,15 @@ class CrawlerManager:
                 
             logger.info(f"Đã tìm thấy {len(self.categories)} danh mục")
             
+            # Các URL còn mới trong bảng trạng thái (chế độ incremental) chỉ cần tính một lần cho cả lần chạy
+            fresh_urls = self.state.fresh_urls() if self.incremental else set()
+            
             # Bước 2: Crawl từng danh mục để lấy danh sách sản phẩm
             for category in self.categories:
                 category_name = category["category_name"]
                 category_url = config.BASE_URL + category["category_url"].lstrip('/')
+                if self.category_done(category_url):
+                    continue
                 
                 logger.info(f"Đang crawl danh mục: {category_name} ({category_url})")
                 
@@ -122,7 +210,7 @@ class CrawlerManager:
                     get_llm_strategy_for_products(category_name), 
                     session_id,
                     config.REQUIRED_KEYS, 
-                    self.seen_urls, 
+                    (self.seen_urls | fresh_urls) if fresh_urls else self.seen_urls, 
                     max_retries=config.MAX_RETRIES, 
                     retry_delay=config.CRAWL_DELAY,
                     page_load_delay=3.0
@@ -136,24 +224,22 @@ class CrawlerManager:
                 # Đánh dấu các URL đã crawl
                 for product in category_products:
                     self.seen_urls.add(product["product_url"])
+                    self.record_product(product["product_url"], product)
                 
                 # Thêm vào danh sách sản phẩm chung
-                self.products.extend(category_products)
-                
-                # Lưu checkpoint sau mỗi danh mục
-                self.storage.save_checkpoint(list(self.seen_urls))
+                self.products.extend(Product.from_dict(product) for product in category_products)
                 
-                # Lưu sản phẩm đã crawl đến thời điểm hiện tại
-                self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
+                # Ghi nhận danh mục đã hoàn thành vào journal
+                self.journal.record_unit(category_url)
                 
                 # Nghỉ giữa các danh mục để tránh bị chặn
                 await asyncio.sleep(config.CRAWL_DELAY)
             
             # Bước 3: Lưu tất cả sản phẩm vào file
             if self.products:
-                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm")
-                self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
-                self.storage.save_to_json(self.products, config.OUTPUT_FILE_JSON)
+                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm "
+                            f"({self.csv_writer.rows_written} dòng trong {config.OUTPUT_FILE_CSV})")
+                self.storage.save_to_json([product.to_dict() for product in self.products], config.OUTPUT_FILE_JSON)
             else:
                 logger.warning("Không tìm thấy sản phẩm nào")
     
@@ -191,6 +277,8 @@ class CrawlerManager:
             for category in self.categories:
                 category_name = category["category_name"]
                 category_url = config.BASE_URL + category["category_url"].lstrip('/')
+                if self.category_done(category_url):
+                    continue
                 
                 logger.info(f"Đang crawl danh mục: {category_name} ({category_url})")
                 
@@ -218,29 +306,31 @@ class CrawlerManager:
                 for product in category_products:
                     product_url = product["product_url"]
                     
-                    # Kiểm tra trùng lặp
-                    if is_duplicate_product(product_url, self.seen_urls):
-                        logger.info(f"Bỏ qua sản phẩm trùng lặp: {product['name']}")
+                    # Kiểm tra trùng lặp (và sản phẩm còn mới ở chế độ incremental)
+                    if not self.should_crawl(product):
+                        logger.info(f"Bỏ qua sản phẩm đã crawl: {product['name']}")
                         continue
                     
                     # Crawl chi tiết sản phẩm
                     logger.info(f"Đang crawl chi tiết sản phẩm: {product['name']}")
                     
-                    product_soup = crawler.get_page_content(product_url)
+                    product_soup = crawler.get_page_content(product_url, page_type="detail")
                     if not product_soup:
                         logger.warning(f"Không thể tải trang sản phẩm: {product_url}. Bỏ qua.")
+                        self.record_product(product_url)
                         continue
                     
                     # Phân tích chi tiết sản phẩm
                     product_details = self.parser.parse_product_details(product_soup, config.SELECTORS)
                     
-                    # Hợp nhất thông tin cơ bản và chi tiết
-                    detailed_product = {**product, **product_details}
-                    
-                    # Kiểm tra sản phẩm có đầy đủ thông tin không
-                    if is_complete_product(detailed_product, config.REQUIRED_KEYS):
+                    # Hợp nhất thông tin cơ bản và chi tiết, kiểm tra sản phẩm có đầy đủ thông tin không
+                    detailed_product = merge_product(product, product_details, config.REQUIRED_KEYS)
+                    if detailed_product:
                         detailed_products.append(detailed_product)
                         self.seen_urls.add(product_url)
+                        self.record_product(product_url, detailed_product.to_dict())
+                    else:
+                        self.record_product(product_url)
                         
                     # Nghỉ giữa các request để tránh bị chặn
                     time.sleep(config.CRAWL_DELAY)
@@ -248,20 +338,17 @@ class CrawlerManager:
                 # Thêm vào danh sách sản phẩm chung
                 self.products.extend(detailed_products)
                 
-                # Lưu checkpoint sau mỗi danh mục
-                self.storage.save_checkpoint(list(self.seen_urls))
-                
-                # Lưu sản phẩm đã crawl đến thời điểm hiện tại
-                self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
+                # Ghi nhận danh mục đã hoàn thành vào journal
+                self.journal.record_unit(category_url)
                 
                 # Nghỉ giữa các danh mục để tránh bị chặn
                 time.sleep(config.CRAWL_DELAY * 2)
             
             # Bước 4: Lưu tất cả sản phẩm vào file
             if self.products:
-                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm")
-                self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
-                self.storage.save_to_json(self.products, config.OUTPUT_FILE_JSON)
+                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm "
+                            f"({self.csv_writer.rows_written} dòng trong {config.OUTPUT_FILE_CSV})")
+                self.storage.save_to_json([product.to_dict() for product in self.products], config.OUTPUT_FILE_JSON)
             else:
                 logger.warning("Không tìm thấy sản phẩm nào")
                 
@@ -269,6 +356,154 @@ class CrawlerManager:
             # Đóng driver khi hoàn thành
             crawler.close_driver()
     
+    async def run_http(self, max_products_per_category: int = None, checkpoint_file: str = None):
+        """
+        Chạy crawler bằng HTTP client (không mở trình duyệt).
+        Trang nào thiếu các selector cần thiết (READY_SELECTORS) sẽ được tải lại bằng WebCrawler.
+        """
+        
+        # Tải checkpoint nếu có
+        self.load_checkpoint(checkpoint_file)
+        
+        limiter = HostLimiter(max_per_host=config.HTTP_CONCURRENCY, min_interval=config.HTTP_MIN_INTERVAL)
+        self.fallback_pages = 0
+        
+        try:
+            async with HttpFetcher(limiter=limiter) as fetcher:
+                # Bước 1: Lấy danh sách các danh mục
+                logger.info(f"Đang lấy danh sách danh mục từ {config.BASE_URL}")
+                
+                soup = await self._fetch_soup(fetcher, config.BASE_URL, "home")
+                if not soup:
+                    logger.error("Không thể tải trang chủ. Kết thúc.")
+                    return
+                    
+                self.categories = self.parser.parse_category_data(soup, config.CATEGORY_CSS_SELECTOR)
+                
+                if not self.categories:
+                    logger.error("Không tìm thấy danh mục nào. Kết thúc.")
+                    return
+                    
+                logger.info(f"Đã tìm thấy {len(self.categories)} danh mục")
+                
+                # Bước 2: Crawl từng danh mục, chi tiết sản phẩm được tải song song
+                for category in self.categories:
+                    category_name = category["category_name"]
+                    category_url = config.BASE_URL + category["category_url"].lstrip('/')
+                    if self.category_done(category_url):
+                        continue
+                    
+                    logger.info(f"Đang crawl danh mục: {category_name} ({category_url})")
+                    
+                    category_soup = await self._fetch_soup(fetcher, category_url, "listing")
+                    if not category_soup:
+                        logger.warning(f"Không thể tải trang danh mục: {category_url}. Bỏ qua.")
+                        continue
+                    
+                    category_products = self.parser.parse_product_list(
+                        category_soup, 
+                        config.PRODUCT_CSS_SELECTOR, 
+                        category_name
+                    )
+                    
+                    # Giới hạn số lượng sản phẩm nếu cần
+                    if max_products_per_category and len(category_products) > max_products_per_category:
+                        logger.info(f"Giới hạn {max_products_per_category} sản phẩm cho danh mục {category_name}")
+                        category_products = category_products[:max_products_per_category]
+                    
+                    pending = []
+                    for product in category_products:
+                        if not self.should_crawl(product):
+                            logger.info(f"Bỏ qua sản phẩm đã crawl: {product['name']}")
+                            continue
+                        # Đánh dấu trước để không tải trùng trong cùng một lượt
+                        self.seen_urls.add(product["product_url"])
+                        pending.append(product)
+                    
+                    results = await asyncio.gather(
+                        *(self._fetch_product_details(fetcher, product) for product in pending)
+                    )
+                    detailed_products = [product for product in results if product]
+                    
+                    # Thêm vào danh sách sản phẩm chung
+                    self.products.extend(detailed_products)
+                    
+                    # Ghi nhận danh mục đã hoàn thành vào journal
+                    self.journal.record_unit(category_url)
+                
+                logger.info(f"HTTP fetcher: {fetcher.format_stats()}; "
+                            f"{self.fallback_pages} trang phải tải lại bằng trình duyệt")
+            
+            # Bước 3: Lưu tất cả sản phẩm vào file
+            if self.products:
+                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm "
+                            f"({self.csv_writer.rows_written} dòng trong {config.OUTPUT_FILE_CSV})")
+                self.storage.save_to_json([product.to_dict() for product in self.products], config.OUTPUT_FILE_JSON)
+            else:
+                logger.warning("Không tìm thấy sản phẩm nào")
+                
+        finally:
+            # Đóng driver dự phòng nếu đã được mở
+            if self.fallback_crawler:
+                self.fallback_crawler.close_driver()
+                self.fallback_crawler = None
+    
+    async def _fetch_product_details(self, fetcher: HttpFetcher, product: Dict[str, Any]) -> Dict[str, Any]:
+        """Tải và phân tích chi tiết một sản phẩm, trả về None nếu không đủ thông tin"""
+        product_url = product["product_url"]
+        logger.info(f"Đang crawl chi tiết sản phẩm: {product['name']}")
+        
+        product_soup = await self._fetch_soup(fetcher, urljoin(config.BASE_URL, product_url), "detail")
+        if not product_soup:
+            logger.warning(f"Không thể tải trang sản phẩm: {product_url}. Bỏ qua.")
+            self.seen_urls.discard(product_url)
+            self.record_product(product_url)
+            return None
+        
+        # Phân tích chi tiết sản phẩm
+        product_details = self.parser.parse_product_details(product_soup, config.SELECTORS)
+        
+        # Hợp nhất thông tin cơ bản và chi tiết, kiểm tra sản phẩm có đầy đủ thông tin không
+        detailed_product = merge_product(product, product_details, config.REQUIRED_KEYS)
+        if not detailed_product:
+            self.seen_urls.discard(product_url)
+            self.record_product(product_url)
+            return None
+        self.record_product(product_url, detailed_product.to_dict())
+        return detailed_product
+    
+    async def _fetch_soup(self, fetcher: HttpFetcher, url: str, page_type: str):
+        """
+        Tải trang bằng HTTP; nếu HTML thiếu các selector cần thiết thì tải lại bằng trình duyệt
+        
+        Args:
+            fetcher: HTTP fetcher dùng chung
+            url: URL cần tải
+            page_type: Loại trang trong READY_SELECTORS (home, listing, detail)
+            
+        Returns:
+            Document: Nội dung trang hoặc None nếu không tải được
+        """
+        html = await fetcher.fetch(url)
+        soup = self.parser.parse_html(html) if html is not None else None
+        if soup is not None and soup_is_ready(soup, page_type):
+            # Nén gzip và commit SQLite chạy trong thread pool để không chặn các request đồng thời
+            await asyncio.get_running_loop().run_in_executor(None, archive_page, url, html, page_type, "main")
+            return soup
+        
+        logger.info(f"HTML tĩnh thiếu selector cần thiết ({page_type}), tải lại bằng trình duyệt: {url}")
+        self.fallback_pages += 1
+        # WebCrawler không an toàn khi dùng từ nhiều thread, chỉ cho một trang dùng driver tại một thời điểm
+        async with self.fallback_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, self._browser_soup, url, page_type)
+    
+    def _browser_soup(self, url: str, page_type: str):
+        """Tải trang bằng WebCrawler (khởi tạo driver khi cần lần đầu)"""
+        if not self.fallback_crawler:
+            self.fallback_crawler = WebCrawler()
+            self.fallback_crawler.setup_driver()
+        return self.fallback_crawler.get_page_content(url, page_type=page_type)
+    
     def run_multithread(self, max_products_per_category: int = None, 
                         max_workers: int = config.MAX_WORKERS, 
                         checkpoint_file: str = None):
@@ -305,14 +540,19 @@ class CrawlerManager:
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
                 # Tạo futures cho từng danh mục
                 futures = {}
+                category_urls = {}
                 
                 for category in self.categories:
+                    category_url = config.BASE_URL + category["category_url"].lstrip('/')
+                    if self.category_done(category_url):
+                        continue
                     future = executor.submit(
                         self._crawl_category,
                         category,
                         max_products_per_category
                     )
                     futures[future] = category["category_name"]
+                    category_urls[future] = category_url
                 
                 # Xử lý kết quả khi hoàn thành
                 for future in as_completed(futures):
@@ -323,9 +563,8 @@ class CrawlerManager:
                             logger.info(f"Hoàn thành crawl danh mục {category_name}: {len(category_products)} sản phẩm")
                             self.products.extend(category_products)
                             
-                            # Lưu checkpoint và sản phẩm sau mỗi danh mục hoàn thành
-                            self.storage.save_checkpoint(list(self.seen_urls))
-                            self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
+                            # Ghi nhận danh mục đã hoàn thành vào journal
+                            self.journal.record_unit(category_urls[future])
                         else:
                             logger.warning(f"Không tìm thấy sản phẩm nào trong danh mục {category_name}")
                     except Exception as e:
@@ -333,9 +572,9 @@ class CrawlerManager:
             
             # Bước 3: Lưu tất cả sản phẩm vào file
             if self.products:
-                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm")
-                self.storage.save_to_csv(self.products, config.OUTPUT_FILE_CSV)
-                self.storage.save_to_json(self.products, config.OUTPUT_FILE_JSON)
+                logger.info(f"Đã crawl tổng cộng {len(self.products)} sản phẩm "
+                            f"({self.csv_writer.rows_written} dòng trong {config.OUTPUT_FILE_CSV})")
+                self.storage.save_to_json([product.to_dict() for product in self.products], config.OUTPUT_FILE_JSON)
             else:
                 logger.warning("Không tìm thấy sản phẩm nào")
                 
@@ -386,9 +625,9 @@ class CrawlerManager:
             for product in products:
                 product_url = product["product_url"]
                 
-                # Kiểm tra URL đã crawl chưa
-                if product_url in self.seen_urls:
-                    logger.info(f"Bỏ qua sản phẩm trùng lặp: {product['name']}")
+                # Kiểm tra URL đã crawl chưa (và sản phẩm còn mới ở chế độ incremental)
+                if not self.should_crawl(product):
+                    logger.info(f"Bỏ qua sản phẩm đã crawl: {product['name']}")
                     continue
                 
                 # Đánh dấu URL đã được xử lý
@@ -397,20 +636,22 @@ class CrawlerManager:
                 # Crawl chi tiết sản phẩm
                 logger.info(f"Đang crawl chi tiết sản phẩm: {product['name']}")
                 
-                product_soup = thread_crawler.get_page_content(product_url)
+                product_soup = thread_crawler.get_page_content(product_url, page_type="detail")
                 if not product_soup:
                     logger.warning(f"Không thể tải trang sản phẩm: {product_url}")
+                    self.record_product(product_url)
                     continue
                 
                 # Phân tích chi tiết sản phẩm
                 product_details = self.parser.parse_product_details(product_soup, config.SELECTORS)
                 
-                # Hợp nhất thông tin cơ bản và chi tiết
-                detailed_product = {**product, **product_details}
-                
-                # Kiểm tra sản phẩm có đầy đủ thông tin không
-                if is_complete_product(detailed_product, config.REQUIRED_KEYS):
+                # Hợp nhất thông tin cơ bản và chi tiết, kiểm tra sản phẩm có đầy đủ thông tin không
+                detailed_product = merge_product(product, product_details, config.REQUIRED_KEYS)
+                if detailed_product:
                     category_products.append(detailed_product)
+                    self.record_product(product_url, detailed_product.to_dict())
+                else:
+                    self.record_product(product_url)
                     
                 # Nghỉ giữa các request để tránh bị chặn
                 time.sleep(config.CRAWL_DELAY)
@@ -434,20 +675,33 @@ async def main():
                       help="Chế độ chạy: async (bất đồng bộ), sync (đồng bộ), multithread (đa luồng)")
     parser.add_argument("--limit", type=int, default=None,
                       help="Giới hạn số lượng sản phẩm cho mỗi danh mục")
-    parser.add_argument("--checkpoint", type=str, default=None,
-                      help="File checkpoint để tiếp tục crawl")
+    parser.add_argument("--checkpoint", type=str, nargs="?", default=None,
+                      const=os.path.basename(config.JOURNAL_FILE),
+                      help="Tiếp tục crawl từ journal (mặc định: crawl_journal.jsonl trong thư mục dữ liệu) "
+                           "hoặc từ file checkpoint_<timestamp>.json cũ")
     parser.add_argument("--workers", type=int, default=config.MAX_WORKERS,
                       help="Số lượng worker cho chế độ đa luồng")
+    parser.add_argument("--fetcher", choices=["browser", "http"], default="browser",
+                      help="Cách tải trang: browser (trình duyệt) hoặc http (tải HTML trực tiếp, "
+                           "chỉ dùng trình duyệt khi thiếu selector cần thiết)")
+    parser.add_argument("--incremental", action="store_true",
+                      help="Chỉ crawl lại sản phẩm mới, lỗi, quá hạn hoặc đổi giá (theo bảng trạng thái crawl)")
+    parser.add_argument("--recrawl-after", type=float, default=config.RECRAWL_MAX_AGE / 3600,
+                      help="Chế độ incremental: tải lại sản phẩm đã crawl sau số giờ này")
     args = parser.parse_args()
     
     # Khởi tạo crawler manager
-    manager = CrawlerManager(use_async=(args.mode == "async"))
+    manager = CrawlerManager(use_async=(args.mode == "async"),
+                             incremental=args.incremental,
+                             recrawl_after=args.recrawl_after * 3600)
     
     # Chạy crawler theo chế độ đã chọn
     start_time = time.time()
     
     try:
-        if args.mode == "async":
+        if args.fetcher == "http":
+            await manager.run_http(args.limit, args.checkpoint)
+        elif args.mode == "async":
             await manager.run_async(args.limit, args.checkpoint)
         elif args.mode == "multithread":
             manager.run_multithread(args.limit, args.workers, args.checkpoint)
@@ -455,6 +709,11 @@ async def main():
             manager.run_sync(args.limit, args.checkpoint)
     except Exception as e:
         logger.error(f"Lỗi trong quá trình crawl: {str(e)}")
+    finally:
+        if args.incremental:
+            logger.info(f"Trạng thái crawl: {manager.state.format_stats()}")
+        manager.state.close()
+        manager.journal.close()
     
     elapsed_time = time.time() - start_time
     logger.info(f"Hoàn thành crawler trong {elapsed_time:.2f} giây")
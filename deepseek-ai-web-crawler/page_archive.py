@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Lưu HTML cuối cùng của mỗi trang đã tải (và JSON XHR bắt được) vào file WARC nén gzip,
+kèm chỉ mục URL trong SQLite. Mỗi record là một gzip member riêng nên có thể đọc trực tiếp
+theo offset; reextract.py dùng archive này để chạy lại parser mà không cần tải lại trang.
+"""
+import os
+import gzip
+import time
+import uuid
+import base64
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+
+from config import PAGE_ARCHIVE_ENABLED, PAGE_ARCHIVE_DIR, PAGE_ARCHIVE_MAX_FILE_SIZE
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.sqlite3"
+WARC_VERSION = "WARC/1.1"
+
+_archives: Dict[str, "PageArchive"] = {}
+_archives_lock = threading.Lock()
+
+
+def _warc_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _warc_record(warc_type: str, block: bytes, headers: Dict[str, str]) -> bytes:
+    digest = base64.b32encode(hashlib.sha1(block).digest()).decode("ascii")
+    lines = [
+        WARC_VERSION,
+        f"WARC-Type: {warc_type}",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {_warc_date()}",
+    ]
+    lines += [f"{key}: {value}" for key, value in headers.items()]
+    lines += [f"WARC-Block-Digest: sha1:{digest}", f"Content-Length: {len(block)}"]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+
+class PageArchive:
+    """Ghi trang vào file WARC (.warc.gz) và chỉ mục URL -> (file, offset) trong SQLite"""
+
+    def __init__(self, root: str = PAGE_ARCHIVE_DIR, max_file_size: int = PAGE_ARCHIVE_MAX_FILE_SIZE):
+        """
+        Khởi tạo PageArchive
+
+        Args:
+            root: Thư mục chứa file WARC và chỉ mục
+            max_file_size: Kích thước tối đa của một file WARC (byte) trước khi chuyển sang file mới
+        """
+        self.root = root
+        self.max_file_size = max_file_size
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                page_type TEXT,
+                source TEXT,
+                content_type TEXT,
+                warc_file TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                fetched_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_url ON pages (url)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_type ON pages (source, page_type)")
+        self.conn.commit()
+        self.file = None
+        self.file_name = None
+        self.file_count = 0
+        self.stats = {"pages": 0, "bytes": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open_file(self):
+        # Mỗi tiến trình ghi file riêng nên nhiều crawler có thể dùng chung thư mục archive
+        self.file_count += 1
+        self.file_name = f"pages-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{self.file_count:05d}.warc.gz"
+        self.file = open(os.path.join(self.root, self.file_name), "ab")
+        info = "software: deepseek-ai-web-crawler\r\nformat: WARC File Format 1.1\r\n".encode("utf-8")
+        self.file.write(gzip.compress(_warc_record("warcinfo", info, {
+            "WARC-Filename": self.file_name,
+            "Content-Type": "application/warc-fields",
+        })))
+
+    def record(self, url: str, body: Union[str, bytes], page_type: Optional[str] = None,
+               source: Optional[str] = None, content_type: str = "text/html; charset=utf-8") -> bool:
+        """
+        Lưu một trang (hoặc payload XHR) vào archive
+
+        Args:
+            url: URL của trang
+            body: Nội dung (HTML cuối cùng hoặc JSON)
+            page_type: Loại trang (home, listing, detail, xhr...)
+            source: Crawler đã tải trang (main, product_details, playwright...)
+            content_type: Kiểu nội dung
+
+        Returns:
+            bool: True nếu đã lưu
+        """
+        block = body.encode("utf-8") if isinstance(body, str) else body
+        headers = {"WARC-Target-URI": url, "Content-Type": content_type}
+        if page_type:
+            headers["WARC-Page-Type"] = page_type
+        data = gzip.compress(_warc_record("resource", block, headers), compresslevel=6)
+
+        with self.lock:
+            if self.file and self.file.tell() >= self.max_file_size:
+                self.file.close()
+                self.file = None
+            if not self.file:
+                self._open_file()
+            offset = self.file.tell()
+            self.file.write(data)
+            self.file.flush()
+            self.conn.execute(
+                "INSERT INTO pages (url, page_type, source, content_type, warc_file, offset, length, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, page_type, source, content_type, self.file_name, offset, len(data), time.time())
+            )
+            self.conn.commit()
+            self.stats["pages"] += 1
+            self.stats["bytes"] += len(data)
+        return True
+
+    def close(self):
+        """Đóng file WARC hiện tại và chỉ mục"""
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+            self.conn.close()
+        if self.stats["pages"]:
+            logger.info(f"Đã lưu {self.stats['pages']} trang vào archive {self.root} "
+                        f"({self.stats['bytes'] / 1024 / 1024:.2f} MB nén)")
+
+
+def get_page_archive(root: str = PAGE_ARCHIVE_DIR) -> PageArchive:
+    """Lấy PageArchive dùng chung cho thư mục root trong tiến trình hiện tại"""
+    with _archives_lock:
+        key = os.path.abspath(root)
+        if key not in _archives:
+            _archives[key] = PageArchive(root)
+        return _archives[key]
+
+
+def archive_page(url: str, body: Union[str, bytes, None], page_type: Optional[str] = None,
+                 source: Optional[str] = None, content_type: str = "text/html; charset=utf-8") -> bool:
+    """Lưu trang vào archive dùng chung nếu PAGE_ARCHIVE_ENABLED (lỗi chỉ được ghi log, không làm dừng crawl)"""
+    if not PAGE_ARCHIVE_ENABLED or not body:
+        return False
+    try:
+        return get_page_archive().record(url, body, page_type, source, content_type)
+    except Exception as e:
+        logger.warning(f"Không thể lưu trang {url} vào archive: {e}")
+        return False
+
+
+def read_record(warc_path: str, offset: int, length: int) -> Tuple[Dict[str, str], bytes]:
+    """
+    Đọc một record WARC theo offset
+
+    Args:
+        warc_path: Đường dẫn file .warc.gz
+        offset: Vị trí bắt đầu của gzip member
+        length: Độ dài gzip member
+
+    Returns:
+        Tuple[Dict[str, str], bytes]: Header WARC và nội dung
+    """
+    with open(warc_path, "rb") as f:
+        f.seek(offset)
+        raw = gzip.decompress(f.read(length))
+    header_end = raw.index(b"\r\n\r\n")
+    headers = {}
+    for line in raw[:header_end].decode("utf-8").split("\r\n")[1:]:
+        key, _, value = line.partition(":")
+        headers[key.strip()] = value.strip()
+    content_length = int(headers.get("Content-Length", len(raw) - header_end - 8))
+    start = header_end + 4
+    return headers, raw[start:start + content_length]
+
+
+def iter_index(root: str = PAGE_ARCHIVE_DIR, page_type: Optional[str] = None,
+               source: Optional[str] = None, latest_only: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Duyệt chỉ mục archive (không cần mở file WARC)
+
+    Args:
+        root: Thư mục archive
+        page_type: Chỉ lấy loại trang này (None = tất cả)
+        source: Chỉ lấy trang của crawler này (None = tất cả)
+        latest_only: Chỉ lấy bản lưu mới nhất của mỗi URL
+
+    Returns:
+        Iterator[Dict[str, Any]]: Các dòng chỉ mục, sắp theo file và offset
+    """
+    index_path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return
+    conditions, params = [], []
+    if page_type:
+        conditions.append("page_type = ?")
+        params.append(page_type)
+    if source:
+        conditions.append("source = ?")
+        params.append(source)
+    if latest_only:
+        conditions.append("id IN (SELECT MAX(id) FROM pages GROUP BY url, page_type, source)")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = sqlite3.connect(index_path)
+    try:
+        columns = ["id", "url", "page_type", "source", "content_type", "warc_file", "offset", "length", "fetched_at"]
+        for row in conn.execute(f"SELECT {', '.join(columns)} FROM pages {where} ORDER BY warc_file, offset", params):
+            yield dict(zip(columns, row))
+    finally:
+        conn.close()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Đợi trang sẵn sàng dựa trên các selector mà từng loại trang thực sự cần,
+thay cho networkidle và các khoảng sleep cố định
+"""
+import time
+import logging
+from typing import List, Optional
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+from config import READY_SELECTORS, READY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Điều kiện sẵn sàng: mỗi nhóm cần ít nhất một selector khớp, tất cả các nhóm phải thỏa mãn
+READY_CHECK_JS = """
+(groups) => groups.every(group => group.some(selector => {
+    try {
+        return document.querySelector(selector) !== null;
+    } catch (e) {
+        return false;
+    }
+}))
+"""
+
+# Đếm số phần tử lớn nhất trong các selector (dùng khi đợi thêm sản phẩm được load)
+COUNT_ITEMS_JS = """
+(selectors) => Math.max(0, ...selectors.map(selector => {
+    try {
+        return document.querySelectorAll(selector).length;
+    } catch (e) {
+        return 0;
+    }
+}))
+"""
+
+DRIVER_READY_CHECK_JS = f"return ({READY_CHECK_JS})(arguments[0]);"
+
+
+def ready_groups(page_type: Optional[str] = None, selector: Optional[str] = None) -> List[List[str]]:
+    """
+    Xác định các nhóm selector cần đợi
+
+    Args:
+        page_type: Loại trang trong READY_SELECTORS (home, listing, detail)
+        selector: Selector tùy chỉnh, dùng khi không có page_type
+
+    Returns:
+        List[List[str]]: Danh sách nhóm selector
+    """
+    if page_type:
+        if page_type not in READY_SELECTORS:
+            raise ValueError(f"Loại trang không hợp lệ: {page_type}")
+        return READY_SELECTORS[page_type]
+    return [[selector or "body"]]
+
+
+def soup_is_ready(soup, page_type: Optional[str] = None, selector: Optional[str] = None) -> bool:
+    """
+    Kiểm tra HTML tĩnh (BeautifulSoup) đã có đủ các selector cần thiết hay chưa
+
+    Args:
+        soup: Đối tượng BeautifulSoup
+        page_type: Loại trang trong READY_SELECTORS
+        selector: Selector tùy chỉnh, dùng khi không có page_type
+
+    Returns:
+        bool: True nếu mọi nhóm selector đều có ít nhất một phần tử khớp
+    """
+    def group_matches(group: List[str]) -> bool:
+        for item in group:
+            try:
+                if soup.select_one(item) is not None:
+                    return True
+            except Exception:
+                continue
+        return False
+
+    return all(group_matches(group) for group in ready_groups(page_type, selector))
+
+
+async def wait_until_ready(page, page_type: Optional[str] = None, timeout: float = READY_TIMEOUT,
+                           selector: Optional[str] = None) -> bool:
+    """
+    Đợi page Playwright (async) có đủ các selector cần thiết
+
+    Args:
+        page: Page của Playwright
+        page_type: Loại trang trong READY_SELECTORS
+        timeout: Thời gian chờ tối đa (giây)
+        selector: Selector tùy chỉnh, dùng khi không có page_type
+
+    Returns:
+        bool: True nếu trang sẵn sàng trước khi hết thời gian chờ
+    """
+    groups = ready_groups(page_type, selector)
+    label = page_type or selector
+    start_time = time.perf_counter()
+    try:
+        await page.wait_for_function(READY_CHECK_JS, arg=groups, timeout=timeout * 1000)
+        logger.info(f"Trang sẵn sàng ({label}) sau {time.perf_counter() - start_time:.2f} giây")
+        return True
+    except Exception as e:
+        logger.warning(f"Trang chưa sẵn sàng ({label}) sau {time.perf_counter() - start_time:.2f} giây: {e}")
+        return False
+
+
+def wait_until_ready_sync(page, page_type: Optional[str] = None, timeout: float = READY_TIMEOUT,
+                          selector: Optional[str] = None) -> bool:
+    """
+    Đợi page Playwright (sync API) có đủ các selector cần thiết
+
+    Args:
+        page: Page của Playwright
+        page_type: Loại trang trong READY_SELECTORS
+        timeout: Thời gian chờ tối đa (giây)
+        selector: Selector tùy chỉnh, dùng khi không có page_type
+
+    Returns:
+        bool: True nếu trang sẵn sàng trước khi hết thời gian chờ
+    """
+    groups = ready_groups(page_type, selector)
+    label = page_type or selector
+    start_time = time.perf_counter()
+    try:
+        page.wait_for_function(READY_CHECK_JS, arg=groups, timeout=timeout * 1000)
+        logger.info(f"Trang sẵn sàng ({label}) sau {time.perf_counter() - start_time:.2f} giây")
+        return True
+    except Exception as e:
+        logger.warning(f"Trang chưa sẵn sàng ({label}) sau {time.perf_counter() - start_time:.2f} giây: {e}")
+        return False
+
+
+def wait_until_ready_driver(driver, page_type: Optional[str] = None, timeout: float = READY_TIMEOUT,
+                            selector: Optional[str] = None) -> bool:
+    """
+    Đợi trang Selenium có đủ các selector cần thiết
+
+    Args:
+        driver: WebDriver của Selenium
+        page_type: Loại trang trong READY_SELECTORS
+        timeout: Thời gian chờ tối đa (giây)
+        selector: Selector tùy chỉnh, dùng khi không có page_type
+
+    Returns:
+        bool: True nếu trang sẵn sàng trước khi hết thời gian chờ
+    """
+    groups = ready_groups(page_type, selector)
+    label = page_type or selector
+    start_time = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script(DRIVER_READY_CHECK_JS, groups)
+        )
+        logger.info(f"Trang sẵn sàng ({label}) sau {time.perf_counter() - start_time:.2f} giây")
+        return True
+    except TimeoutException:
+        logger.warning(f"Trang chưa sẵn sàng ({label}) sau {timeout} giây")
+        return False
+
+
+async def count_items(page, selectors: List[str]) -> int:
+    """Đếm số phần tử (lớn nhất theo từng selector) hiện có trên page"""
+    return await page.evaluate(COUNT_ITEMS_JS, selectors)
+
+
+async def wait_for_more_items(page, selectors: List[str], previous_count: int, timeout: float) -> int:
+    """
+    Đợi đến khi số phần tử vượt quá previous_count (ví dụ sau khi click "Xem thêm" hoặc cuộn trang)
+
+    Args:
+        page: Page của Playwright
+        selectors: Các selector dùng để đếm phần tử
+        previous_count: Số phần tử trước khi thao tác
+        timeout: Thời gian chờ tối đa (giây)
+
+    Returns:
+        int: Số phần tử hiện tại
+    """
+    start_time = time.perf_counter()
+    try:
+        await page.wait_for_function(
+            f"(selectors) => ({COUNT_ITEMS_JS})(selectors) > {int(previous_count)}",
+            arg=selectors,
+            timeout=timeout * 1000
+        )
+        current = await count_items(page, selectors)
+        logger.info(f"Đã load thêm sản phẩm ({previous_count} -> {current}) sau {time.perf_counter() - start_time:.2f} giây")
+        return current
+    except Exception:
+        logger.info(f"Không có thêm sản phẩm sau {time.perf_counter() - start_time:.2f} giây")
+        return await count_items(page, selectors)
@@ -2,20 +2,41 @@ import logging
 import re
 import json
 from typing import Dict, List, Any, Optional
-from bs4 import BeautifulSoup
+
+from html_backends import Document, parse_html, resolve_backend
+from selector_plan import compile_plan
 
 class DataParser:
     """Lớp xử lý và phân tích dữ liệu trích xuất từ website"""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None):
+        """
+        Khởi tạo DataParser
+        
+        Args:
+            backend: Backend phân tích HTML (selectolax, lxml, html.parser; None = HTML_PARSER_BACKEND trong config)
+        """
         self.logger = logging.getLogger(__name__)
+        self.backend = resolve_backend(backend)
+    
+    def parse_html(self, html: str) -> Document:
+        """
+        Phân tích HTML bằng backend của parser
+        
+        Args:
+            html: Nội dung HTML
+            
+        Returns:
+            Document: Tài liệu HTML dùng cho các hàm parse_* bên dưới
+        """
+        return parse_html(html, self.backend)
     
-    def parse_category_data(self, soup: BeautifulSoup, category_selector: str) -> List[Dict[str, str]]:
+    def parse_category_data(self, soup: Document, category_selector: str) -> List[Dict[str, str]]:
         """
         Phân tích dữ liệu danh mục từ trang web
         
         Args:
-            soup: Đối tượng BeautifulSoup
+            soup: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
             category_selector: CSS selector cho các phần tử danh mục
             
         Returns:
@@ -40,13 +61,13 @@ class DataParser:
         
         return categories
     
-    def parse_product_list(self, soup: BeautifulSoup, product_selector: str, 
+    def parse_product_list(self, soup: Document, product_selector: str, 
                           category_name: str) -> List[Dict[str, Any]]:
         """
         Phân tích dữ liệu danh sách sản phẩm từ trang danh mục
         
         Args:
-            soup: Đối tượng BeautifulSoup
+            soup: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
             product_selector: CSS selector cho các phần tử sản phẩm
             category_name: Tên danh mục
             
@@ -82,29 +103,19 @@ class DataParser:
         
         return products
     
-    def parse_product_details(self, soup: BeautifulSoup, selectors: Dict[str, List[str]]) -> Dict[str, Any]:
+    def parse_product_details(self, soup: Document, selectors: Dict[str, List[str]]) -> Dict[str, Any]:
         """
         Phân tích chi tiết sản phẩm từ trang sản phẩm
         
         Args:
-            soup: Đối tượng BeautifulSoup
+            soup: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
             selectors: Dictionary các CSS selector cho từng loại thông tin
             
         Returns:
             Dict[str, Any]: Chi tiết sản phẩm
         """
-        product_details = {}
-        
-        # Trích xuất các thông tin cơ bản từ selectors
-        for key, selector_list in selectors.items():
-            for selector in selector_list:
-                elements = soup.select(selector)
-                if elements:
-                    if key == "description":
-                        product_details[key] = "\n".join([elem.get_text(strip=True) for elem in elements])
-                    else:
-                        product_details[key] = elements[0].get_text(strip=True)
-                    break
+        # Trích xuất các thông tin cơ bản từ selectors (mọi selector dự phòng chạy trong một lần duyệt DOM)
+        product_details = compile_plan(selectors).extract(soup)
         
         # Trích xuất URL hình ảnh
         product_details["image_urls"] = self.extract_image_urls(soup)
@@ -114,12 +125,12 @@ class DataParser:
         
         return product_details
     
-    def extract_image_urls(self, soup: BeautifulSoup) -> List[str]:
+    def extract_image_urls(self, soup: Document) -> List[str]:
         """
         Trích xuất URL hình ảnh từ trang sản phẩm
         
         Args:
-            soup: Đối tượng BeautifulSoup
+            soup: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
             
         Returns:
             List[str]: Danh sách URL hình ảnh
@@ -161,12 +172,12 @@ class DataParser:
         
         return image_urls
     
-    def extract_table_data(self, soup: BeautifulSoup) -> Dict[str, str]:
+    def extract_table_data(self, soup: Document) -> Dict[str, str]:
         """
         Trích xuất dữ liệu từ bảng thông tin
         
         Args:
-            soup: Đối tượng BeautifulSoup
+            soup: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
             
         Returns:
             Dict[str, str]: Dictionary chứa thông tin từ bảng
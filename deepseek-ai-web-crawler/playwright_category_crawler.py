@@ -5,7 +5,6 @@ import time
 import logging
 import argparse
 from typing import List, Dict, Any
-from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright, Page, Browser
 
 from config_playwright import (
@@ -18,6 +17,8 @@ from config_playwright import (
     CRAWL_DELAY,
     BROWSER_CONFIG
 )
+from page_readiness import wait_until_ready_sync
+from html_backends import parse_html
 
 logging.basicConfig(
     level=logging.INFO,
@@ -59,16 +60,9 @@ class PlaywrightCategoryCrawler:
             self.playwright.stop()
             self.playwright = None
     
-    def wait_for_page_load(self, timeout: int = WAIT_TIME):
-        try:
-            self.page.wait_for_load_state("networkidle", timeout=timeout * 1000)
-            self.page.wait_for_load_state("domcontentloaded", timeout=timeout * 1000)
-            self.page.wait_for_selector("body", timeout=timeout * 1000)
-            logger.info("Trang đã tải xong")
-            return True
-        except Exception as e:
-            logger.error(f"Lỗi khi đợi trang tải: {e}")
-            return False
+    def wait_for_page_load(self, timeout: int = WAIT_TIME, page_type: str = "home"):
+        """Đợi trang có đủ các selector cần thiết cho loại trang (không đợi networkidle)"""
+        return wait_until_ready_sync(self.page, page_type, timeout)
     
     def take_snapshot(self, name: str = "homepage"):
         """Chụp ảnh và lưu HTML của trang hiện tại"""
@@ -349,14 +343,14 @@ class PlaywrightCategoryCrawler:
         
         try:
             self.page.goto(category_url)
-            self.wait_for_page_load()
+            self.wait_for_page_load(page_type="listing")
             
             # Chụp ảnh trang danh mục con để kiểm tra
             snapshot_name = f"category_{category_name.replace(' ', '_').lower()}"
             self.take_snapshot(snapshot_name)
             
             html = self.page.content()
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = parse_html(html)
             
             subcategories = []
             
@@ -6,27 +6,43 @@ import time
 import argparse
 import asyncio
 import csv
-from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 from datetime import datetime
 import logging
 import sys
-import requests
 import random
-from PIL import Image
 import io
 
 try:
-    import pandas as pd
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    EXCEL_SUPPORT = True
+    import pandas as pd  # Chỉ dùng khi xuất CSV
+    PANDAS_SUPPORT = True
 except ImportError:
-    EXCEL_SUPPORT = False
+    PANDAS_SUPPORT = False
 
-from playwright.async_api import async_playwright, ElementHandle, Page
-from config_playwright import OUTPUT_DIR
+from playwright.async_api import async_playwright, Page
+from config_playwright import (
+    OUTPUT_DIR,
+    CONCURRENCY,
+    HOST_MAX_CONCURRENCY,
+    HOST_MIN_INTERVAL,
+    HOST_INTERVAL_JITTER,
+    BLOCK_RESOURCES
+)
+from config import READY_SELECTORS, READY_TIMEOUT, PAGE_ARCHIVE_ENABLED
+from host_limiter import HostLimiter
+from page_readiness import wait_until_ready, wait_for_more_items, count_items
+from resource_blocker import ResourceBlocker
+from xhr_capture import ProductApiCapture
+from image_pipeline import ImagePipeline
+from thumbnails import ThumbnailStage, make_thumbnails
+from dataset_writer import DatasetWriter
+from excel_export import ExcelStreamWriter, OPENPYXL_SUPPORT as EXCEL_SUPPORT
+from compact_outputs import compact_outputs, load_manifest
+from search_index import update_search_index
+from page_archive import archive_page
+from detail_extractor import DetailTimings, extract_product_details
+from listing_cards import register_listing_script, extract_listing_cards, count_listing_cards
 
 # Thiết lập logging với encoding UTF-8
 logging.basicConfig(
@@ -49,6 +65,8 @@ BASE_URL = "https://www.bachhoaxanh.com"
 MAX_RETRIES = 3
 REQUEST_TIMEOUT = 30
 SCROLL_PAUSE_TIME = 1  # Thời gian chờ sau mỗi lần cuộn
+LOAD_MORE_TIMEOUT = 5  # Thời gian chờ tối đa (giây) để sản phẩm mới xuất hiện sau khi click "Xem thêm"
+LISTING_ITEM_SELECTORS = READY_SELECTORS["listing"][0]  # Các selector dùng để đếm thẻ sản phẩm
 MIN_DELAY = 1  # Thời gian chờ tối thiểu giữa các request (giây)
 MAX_DELAY = 3  # Thời gian chờ tối đa giữa các request (giây)
 MAX_IMAGES_PER_PRODUCT = 10  # Số lượng hình ảnh tối đa tải về cho mỗi sản phẩm
@@ -57,15 +75,9 @@ MAX_IMAGES_PER_PRODUCT = 10  # Số lượng hình ảnh tối đa tải về ch
 for directory in [OUTPUT_DIR, PRODUCT_OUTPUT_DIR, IMAGES_OUTPUT_DIR]:
     os.makedirs(directory, exist_ok=True)
 
-async def wait_for_page_load(page: Page, timeout: int = 30000):
-    """Đợi trang web tải hoàn tất"""
-    try:
-        # Đợi cho đến khi network không còn hoạt động trong 500ms
-        await page.wait_for_load_state("networkidle", timeout=timeout)
-        # Đợi cho đến khi DOM đã tải xong
-        await page.wait_for_load_state("domcontentloaded", timeout=timeout)
-    except Exception as e:
-        logger.warning(f"Không thể đợi trang tải hoàn tất: {e}")
+async def wait_for_page_load(page: Page, timeout: int = READY_TIMEOUT * 1000, page_type: str = None):
+    """Đợi trang có đủ các selector cần thiết cho loại trang (listing, detail...)"""
+    return await wait_until_ready(page, page_type, timeout / 1000)
 
 async def save_screenshot(page: Page, filename: str):
     """Lưu ảnh chụp màn hình của trang hiện tại"""
@@ -76,77 +88,10 @@ async def save_screenshot(page: Page, filename: str):
     logger.info(f"Đã lưu ảnh chụp màn hình: {screenshot_path}")
     return screenshot_path
 
-async def extract_product_urls(page: Page, selector: str, limit: int) -> List[str]:
-    """Trích xuất danh sách URL sản phẩm từ trang danh sách"""
-    urls = []
-    try:
-        # Thực hiện JavaScript để lấy tất cả href
-        urls = await page.evaluate(f"""() => {{
-            const productElements = document.querySelectorAll('{selector} a');
-            const urls = [];
-            for (let i = 0; i < productElements.length; i++) {{
-                const href = productElements[i].getAttribute('href');
-                if (href && !urls.includes(href)) {{
-                    urls.push(href);
-                }}
-            }}
-            return urls.slice(0, {limit});
-        }}""")
-        
-        # Thêm domain vào URL nếu cần
-        full_urls = [urljoin(BASE_URL, url) for url in urls]
-        return full_urls
-    except Exception as e:
-        logger.error(f"Lỗi khi trích xuất URL sản phẩm: {e}")
-        return []
-
-async def extract_product_info_from_list(product_element: ElementHandle) -> Dict[str, Any]:
-    """Trích xuất thông tin cơ bản của sản phẩm từ danh sách sản phẩm"""
-    info = {}
-    
-    try:
-        # Lấy tên sản phẩm
-        name_element = await product_element.query_selector(".product_name")
-        if name_element:
-            info["name"] = await name_element.text_content()
-            info["name"] = info["name"].strip() if info["name"] else ""
-        
-        # Lấy giá sau giảm
-        price_element = await product_element.query_selector(".product_price")
-        if price_element:
-            info["discounted_price"] = await price_element.text_content()
-            info["discounted_price"] = info["discounted_price"].strip() if info["discounted_price"] else ""
-        
-        # Lấy giá gốc - Sửa selector không hợp lệ
-        original_price_element = await product_element.query_selector(".text-12, .line-through, .price-old")
-        if original_price_element:
-            info["original_price"] = await original_price_element.text_content()
-            info["original_price"] = info["original_price"].strip() if info["original_price"] else ""
-        
-        # Lấy phần trăm giảm giá - Sửa selector không hợp lệ
-        discount_element = await product_element.query_selector(".discount-percent, .percent-discount")
-        if discount_element:
-            info["discount_percent"] = await discount_element.text_content()
-            info["discount_percent"] = info["discount_percent"].strip() if info["discount_percent"] else ""
-        
-        # Lấy URL sản phẩm
-        link_element = await product_element.query_selector("a")
-        if link_element:
-            href = await link_element.get_attribute("href")
-            if href:
-                info["product_url"] = urljoin(BASE_URL, href)
-        
-        # Lấy URL hình ảnh
-        img_element = await product_element.query_selector("img")
-        if img_element:
-            src = await img_element.get_attribute("src")
-            if src:
-                info["image_url"] = src
-    
-    except Exception as e:
-        logger.error(f"Lỗi khi trích xuất thông tin sản phẩm: {e}")
-    
-    return info
+async def extract_listing_products(page: Page, limit: int) -> List[Dict[str, Any]]:
+    """Trích xuất thông tin cơ bản (tên, giá, URL, hình ảnh) của tối đa limit sản phẩm có URL khác nhau trên trang danh sách"""
+    _, products = await extract_listing_cards(page, limit, unique_field="product_url")
+    return products
 
 async def check_for_captcha(page: Page) -> bool:
     """Kiểm tra xem có đang hiển thị captcha hay không"""
@@ -195,15 +140,15 @@ async def handle_captcha(page: Page) -> bool:
     
     return True
 
-async def get_product_details(page: Page, product_url: str) -> Dict[str, Any]:
-    """Lấy thông tin chi tiết của sản phẩm từ trang sản phẩm"""
+async def get_product_details(page: Page, product_url: str, timings: Optional[DetailTimings] = None) -> Dict[str, Any]:
+    """Lấy thông tin chi tiết của sản phẩm từ trang sản phẩm (timings: bộ cộng dồn thời gian từng trường)"""
     product_details = {}
     
     try:
         for attempt in range(MAX_RETRIES):
             try:
                 await page.goto(product_url, wait_until="domcontentloaded", timeout=30000)
-                await wait_for_page_load(page)
+                await wait_for_page_load(page, page_type="detail")
                 
                 # Kiểm tra captcha
                 captcha_resolved = await handle_captcha(page)
@@ -220,137 +165,20 @@ async def get_product_details(page: Page, product_url: str) -> Dict[str, Any]:
                     logger.error(f"Đã thử tải trang {MAX_RETRIES} lần nhưng không thành công")
                     return product_details
         
-        # Trích xuất tên sản phẩm từ tiêu đề trang
-        try:
-            title = await page.title()
-            if title:
-                # Tách tên sản phẩm từ tiêu đề
-                parts = title.split(" | ")
-                if len(parts) > 0:
-                    product_details["title"] = title
-                    product_details["name"] = parts[0].strip()
-        except Exception as e:
-            logger.warning(f"Lỗi khi lấy tiêu đề trang: {e}")
-        
-        # Lấy tên sản phẩm từ các phần tử DOM nếu chưa có
-        if "name" not in product_details:
-            name_selectors = ["h1.product-title", ".product-name", "h1", ".product_name"]
-            for selector in name_selectors:
-                name_element = await page.query_selector(selector)
-                if name_element:
-                    product_details["name"] = await name_element.text_content()
-                    product_details["name"] = product_details["name"].strip() if product_details["name"] else ""
-                    break
-        
-        # Lấy tên sản phẩm thông qua JavaScript để đảm bảo mã hóa Unicode đúng
-        if not product_details.get("name"):
-            product_details["name"] = await page.evaluate("""
-                () => {
-                    const nameElements = [
-                        document.querySelector('h1.product-title'), 
-                        document.querySelector('.product-name'), 
-                        document.querySelector('h1'), 
-                        document.querySelector('.product_name')
-                    ];
-                    for (const el of nameElements) {
-                        if (el && el.textContent) {
-                            return el.textContent.trim();
-                        }
-                    }
-                    return '';
-                }
-            """)
-        
-        # Lấy giá sản phẩm
-        price_selectors = [".product-price", ".price", ".product_price"]
-        for selector in price_selectors:
-            price_element = await page.query_selector(selector)
-            if price_element:
-                product_details["price"] = await price_element.text_content()
-                product_details["price"] = product_details["price"].strip() if product_details["price"] else ""
-                break
-        
-        # Lấy mô tả sản phẩm
-        description_selectors = [".product-description", ".description", ".detail-content", ".product-content"]
-        for selector in description_selectors:
-            description_element = await page.query_selector(selector)
-            if description_element:
-                product_details["description"] = await description_element.text_content()
-                product_details["description"] = product_details["description"].strip() if product_details["description"] else ""
-                break
-        
-        # Lấy thông số kỹ thuật
-        specs = {}
-        specs_rows = await page.query_selector_all(".specifications tr, .product-specs tr, .product-attributes tr")
-        for row in specs_rows:
-            cells = await row.query_selector_all("td, th")
-            if len(cells) >= 2:
-                key = await cells[0].text_content()
-                value = await cells[1].text_content()
-                if key and key.strip():
-                    specs[key.strip()] = value.strip() if value else ""
-        
-        if specs:
-            product_details["specifications"] = specs
-        
-        # Lấy tất cả hình ảnh sản phẩm
-        image_selectors = [
-            ".product-image img", 
-            ".gallery img", 
-            ".product-gallery img", 
-            ".product img",
-            ".picture img",
-            "#product-detail-image img",
-            "#product-image img",
-            ".gallery-container img",
-            ".boxprodetail img",
-            ".img-product-big .img-fluid",
-            ".xzoom",
-            ".product-slider-large img"
-        ]
-        image_urls = []
-        
-        for selector in image_selectors:
-            image_elements = await page.query_selector_all(selector)
-            if image_elements:
-                for img in image_elements:
-                    src = await img.get_attribute("src")
-                    if src and src not in image_urls:  # Tránh trùng lặp URL
-                        # Chỉ thêm URL có đuôi hình ảnh phổ biến
-                        if any(src.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-                            image_urls.append(src)
-                        # Hoặc, nếu không có đuôi file, kiểm tra URL chứa từ khóa hình ảnh
-                        elif any(keyword in src.lower() for keyword in ['image', 'photo', 'img', 'upload']):
-                            image_urls.append(src)
-                
-                if image_urls:  # Nếu đã tìm thấy hình ảnh, không cần kiểm tra selector khác
-                    break
-        
-        # Nếu không tìm thấy hình ảnh qua selector, thử dùng JS để tìm tất cả hình ảnh trong trang
-        if not image_urls:
+        # Lưu HTML cuối cùng của trang vào archive để có thể trích xuất lại offline
+        # (nén gzip và commit SQLite chạy trong thread pool để không chặn event loop)
+        if PAGE_ARCHIVE_ENABLED:
             try:
-                logger.info("Thử dùng JavaScript để tìm ảnh sản phẩm")
-                image_urls = await page.evaluate("""
-                    () => {
-                        const images = Array.from(document.querySelectorAll('img'));
-                        // Tìm các hình ảnh có kích thước lớn (có thể là hình sản phẩm chính)
-                        return images
-                            .filter(img => {
-                                // Lọc ra hình ảnh có kích thước phù hợp và loại bỏ icon, logo
-                                const rect = img.getBoundingClientRect();
-                                return rect.width > 100 && rect.height > 100 &&
-                                       img.src && img.src.length > 0;
-                            })
-                            .map(img => img.src)
-                            .filter((url, index, self) => self.indexOf(url) === index); // Loại bỏ trùng lặp
-                    }
-                """)
-                logger.info(f"Đã tìm thấy {len(image_urls)} hình ảnh qua JavaScript")
+                html = await page.content()
+                await asyncio.get_running_loop().run_in_executor(None, archive_page, product_url, html, "detail", "playwright")
             except Exception as e:
-                logger.warning(f"Lỗi khi tìm hình ảnh qua JavaScript: {e}")
+                logger.warning(f"Không thể lấy HTML trang {product_url} để lưu archive: {e}")
         
+        # Trích xuất tên, giá, mô tả, thông số và hình ảnh theo DETAIL_SCHEMA trong một lần evaluate
+        product_details.update(await extract_product_details(page, timings=timings))
+        
+        image_urls = product_details.get("image_urls", [])
         if image_urls:
-            product_details["image_urls"] = image_urls
             logger.info(f"Tìm thấy {len(image_urls)} URL hình ảnh cho sản phẩm")
         else:
             logger.warning("Không tìm thấy URL hình ảnh nào cho sản phẩm")
@@ -360,83 +188,18 @@ async def get_product_details(page: Page, product_url: str) -> Dict[str, Any]:
     
     return product_details
 
-async def download_single_image(image_url: str, file_path: str) -> bool:
-    """Tải một hình ảnh từ URL và lưu vào đường dẫn cụ thể"""
-    # Kiểm tra nếu file đã tồn tại
-    if os.path.exists(file_path):
-        return True
-    
-    # Tạo thư mục cha nếu chưa tồn tại
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    # Tải hình ảnh
-    for attempt in range(MAX_RETRIES):
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(image_url, headers=headers, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            
-            # Kiểm tra kích thước và loại hình ảnh hợp lệ
-            if len(response.content) < 100:  # Quá nhỏ có thể là lỗi
-                logger.warning(f"Hình ảnh quá nhỏ ({len(response.content)} bytes): {image_url}")
-                if attempt < MAX_RETRIES - 1:
-                    await asyncio.sleep(1)
-                    continue
-                return False
-            
-            # Lưu file gốc
-            with open(file_path, "wb") as f:
-                f.write(response.content)
-            
-            # Tạo thumbnail
-            try:
-                create_thumbnail(file_path)
-            except Exception as e:
-                logger.warning(f"Không thể tạo thumbnail cho {file_path}: {e}")
-            
-            return True
-        
-        except Exception as e:
-            logger.warning(f"Lỗi khi tải hình ảnh {image_url} (lần thử {attempt+1}/{MAX_RETRIES}): {e}")
-            await asyncio.sleep(1)
+async def download_single_image(image_url: str, file_path: str, pipeline: Optional[ImagePipeline] = None) -> bool:
+    """Tải một hình ảnh qua pipeline hình ảnh (tạo pipeline tạm nếu không truyền vào) và tạo thumbnail"""
+    if pipeline:
+        return await pipeline.submit(image_url, file_path)
     
-    logger.error(f"Không thể tải hình ảnh sau {MAX_RETRIES} lần thử: {image_url}")
-    return False
+    async with ImagePipeline(workers=1, postprocess=create_thumbnail) as temp_pipeline:
+        return await temp_pipeline.submit(image_url, file_path)
 
 def create_thumbnail(original_path: str, max_size: int = 200) -> str:
     """Tạo thumbnail cho hình ảnh và lưu cùng thư mục với tiền tố 'thumb_'"""
-    try:
-        # Xác định đường dẫn thumbnail
-        path_obj = Path(original_path)
-        thumb_path = path_obj.parent / f"thumb_{path_obj.name}"
-        
-        # Nếu thumbnail đã tồn tại, thoát
-        if thumb_path.exists():
-            return str(thumb_path)
-        
-        # Mở và resize hình ảnh
-        with Image.open(original_path) as img:
-            # Giữ tỷ lệ khung hình
-            width, height = img.size
-            if width > height:
-                new_width = max_size
-                new_height = int(height * (max_size / width))
-            else:
-                new_height = max_size
-                new_width = int(width * (max_size / height))
-            
-            # Resize hình ảnh
-            img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-            
-            # Lưu thumbnail
-            img_resized.save(thumb_path)
-        
-        return str(thumb_path)
-    except Exception as e:
-        logger.error(f"Lỗi khi tạo thumbnail: {e}")
-        return ""
+    thumb_paths = make_thumbnails(original_path, [max_size])
+    return thumb_paths[0] if thumb_paths else ""
 
 async def create_product_gallery(product: Dict[str, Any], image_files: List[str]) -> str:
     """Tạo trang HTML hiển thị gallery các hình ảnh sản phẩm"""
@@ -557,11 +320,15 @@ async def create_product_gallery(product: Dict[str, Any], image_files: List[str]
     
     return html_path
 
-async def download_product_images(page: Page, product: Dict[str, Any]) -> List[str]:
-    """Tải tất cả hình ảnh của một sản phẩm và lưu vào thư mục riêng"""
+async def download_product_images(page: Page, product: Dict[str, Any], pipeline: Optional[ImagePipeline] = None) -> List[str]:
+    """Tải tất cả hình ảnh của một sản phẩm (song song qua pipeline hình ảnh) và lưu vào thư mục riêng"""
     if not product.get("image_urls") or not product.get("id"):
         return []
     
+    if pipeline is None:
+        async with ImagePipeline(postprocess=create_thumbnail) as temp_pipeline:
+            return await download_product_images(page, product, temp_pipeline)
+    
     product_id = product["id"]
     product_name = product.get("name", "unknown")
     subcategory = product.get("subcategory", "other")
@@ -591,37 +358,35 @@ async def download_product_images(page: Page, product: Dict[str, Any]) -> List[s
         for idx, url in enumerate(image_urls):
             f.write(f"{idx+1}. {url}\n")
     
-    # Tải các hình ảnh
+    # Đưa tất cả hình ảnh vào pipeline cùng lúc, giới hạn theo host do pipeline đảm nhận
+    filenames = []
+    futures = []
+    for idx, img_url in enumerate(image_urls):
+        # Tạo tên file từ tên sản phẩm, index và URL
+        parsed_url = urlparse(img_url)
+        file_ext = os.path.splitext(parsed_url.path)[1]
+        if not file_ext or len(file_ext) > 5:  # Kiểm tra phần mở rộng hợp lệ
+            file_ext = ".jpg"  # Mặc định là JPG
+        
+        # Tạo tên file có ý nghĩa
+        filename = f"{safe_product_name}_{idx+1}{file_ext}"
+        filenames.append(filename)
+        futures.append(download_single_image(img_url, os.path.join(product_image_dir, filename), pipeline))
+    
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    
     downloaded_images = []
     image_files = []
-    for idx, img_url in enumerate(image_urls):
-        try:
-            # Tạo tên file từ tên sản phẩm, index và URL
-            parsed_url = urlparse(img_url)
-            file_ext = os.path.splitext(parsed_url.path)[1]
-            if not file_ext or len(file_ext) > 5:  # Kiểm tra phần mở rộng hợp lệ
-                file_ext = ".jpg"  # Mặc định là JPG
-            
-            # Tạo tên file có ý nghĩa
-            filename = f"{safe_product_name}_{idx+1}{file_ext}"
-            file_path = os.path.join(product_image_dir, filename)
-            
-            # Tải hình ảnh
-            success = await download_single_image(img_url, file_path)
-            if success:
-                # Đường dẫn tương đối để lưu trong JSON
-                relative_path = os.path.join(subcategory, product_id, filename)
-                downloaded_images.append(relative_path)
-                image_files.append(filename)
-                logger.info(f"Đã tải hình ảnh {idx+1}/{len(image_urls)} cho sản phẩm {product_id}")
-            else:
-                logger.warning(f"Không thể tải hình ảnh {idx+1}/{len(image_urls)} cho sản phẩm {product_id}")
-            
-            # Đợi giữa các lần tải để tránh quá tải server
-            await asyncio.sleep(0.5)
-            
-        except Exception as e:
-            logger.error(f"Lỗi khi tải hình ảnh {idx+1} cho sản phẩm {product_id}: {e}")
+    for idx, (filename, success) in enumerate(zip(filenames, results)):
+        if success is True:
+            # Đường dẫn tương đối để lưu trong JSON
+            downloaded_images.append(os.path.join(subcategory, product_id, filename))
+            image_files.append(filename)
+        elif isinstance(success, Exception):
+            logger.error(f"Lỗi khi tải hình ảnh {idx+1} cho sản phẩm {product_id}: {success}")
+        else:
+            logger.warning(f"Không thể tải hình ảnh {idx+1}/{len(image_urls)} cho sản phẩm {product_id}")
+    logger.info(f"Đã tải {len(downloaded_images)}/{len(image_urls)} hình ảnh cho sản phẩm {product_id}")
     
     # Cập nhật file README với kết quả tải
     with open(readme_path, "a", encoding="utf-8") as f:
@@ -674,18 +439,13 @@ async def click_load_more_button(page: Page, max_clicks: int = 3):
                     await asyncio.sleep(0.5)
                     
                     # Click vào nút
+                    items_before = await count_items(page, LISTING_ITEM_SELECTORS)
                     await page.click(selector)
                     click_count += 1
                     logger.info(f"Đã click nút 'Xem thêm' lần {click_count}")
                     
-                    # Đợi để trang load thêm nội dung
-                    await asyncio.sleep(SCROLL_PAUSE_TIME * 2)  # Đợi lâu hơn sau khi click
-                    
-                    # Đợi cho đến khi network không còn hoạt động
-                    try:
-                        await page.wait_for_load_state("networkidle", timeout=5000)
-                    except Exception as e:
-                        logger.warning(f"Không thể đợi network idle: {e}")
+                    # Đợi đến khi sản phẩm mới xuất hiện thay vì sleep cố định
+                    await wait_for_more_items(page, LISTING_ITEM_SELECTORS, items_before, LOAD_MORE_TIMEOUT)
                     
                     # Đánh dấu đã click thành công
                     is_clicked = True
@@ -712,16 +472,12 @@ async def scroll_to_load_more_products(page: Page, times: int = 5, target_produc
     current_products = 0
     
     # Thử nhiều selector để đếm sản phẩm
-    product_selectors = [".this-item", ".box_product", ".product-item", ".cate-pro-item", "article.product"]
+    product_selectors = LISTING_ITEM_SELECTORS
     
     # Lặp cuộn và kiểm tra
     for i in range(times):
-        # Đếm số lượng sản phẩm hiện tại
-        for selector in product_selectors:
-            count = await page.evaluate(f"document.querySelectorAll('{selector}').length")
-            if count > current_products:
-                current_products = count
-                break
+        # Đếm số lượng sản phẩm hiện tại (một lần evaluate cho mọi selector)
+        current_products = max(current_products, await count_listing_cards(page, product_selectors))
         
         logger.info(f"Đã tìm thấy {current_products} sản phẩm sau {i} lần cuộn")
         
@@ -734,8 +490,7 @@ async def scroll_to_load_more_products(page: Page, times: int = 5, target_produc
         click_success = await click_load_more_button(page, max_clicks=1)
         
         if click_success > 0:
-            logger.info(f"Đã nhấn nút 'Xem thêm', đợi tải thêm sản phẩm")
-            await asyncio.sleep(SCROLL_PAUSE_TIME * 2)  # Đợi lâu hơn sau khi click
+            logger.info(f"Đã nhấn nút 'Xem thêm' và tải thêm sản phẩm")
         else:
             # Cuộn từng đoạn thay vì cuộn thẳng xuống cuối
             current_position = await page.evaluate("window.pageYOffset")
@@ -754,25 +509,16 @@ async def scroll_to_load_more_products(page: Page, times: int = 5, target_produc
             
             logger.info(f"Đã cuộn lần {i+1}/{times}")
             
-            # Đợi để trang load thêm nội dung
-            await asyncio.sleep(SCROLL_PAUSE_TIME)
+            # Đợi sản phẩm lazy load xuất hiện (trả về ngay khi có sản phẩm mới)
+            await wait_for_more_items(page, product_selectors, current_products, SCROLL_PAUSE_TIME * 3)
         
         # Cập nhật lại chiều cao trang
         new_height = await page.evaluate("document.body.scrollHeight")
         if new_height > total_height:
             total_height = new_height
-        
-        # Đợi cho đến khi network không còn hoạt động
-        try:
-            await page.wait_for_load_state("networkidle", timeout=3000)
-        except Exception as e:
-            logger.warning(f"Không thể đợi network idle: {e}")
     
     # Kiểm tra xem có đủ sản phẩm chưa, nếu chưa thì cố gắng click thêm nút "Xem thêm" 
-    for selector in product_selectors:
-        count = await page.evaluate(f"document.querySelectorAll('{selector}').length")
-        if count > current_products:
-            current_products = count
+    current_products = max(current_products, await count_listing_cards(page, product_selectors))
     
     if current_products < target_products:
         logger.info(f"Chưa đủ sản phẩm ({current_products}/{target_products}), thử nhấn nút 'Xem thêm' lần cuối")
@@ -780,46 +526,120 @@ async def scroll_to_load_more_products(page: Page, times: int = 5, target_produc
     
     return current_products
 
+async def open_listing_page(page: Page, subcategory_url: str) -> bool:
+    """Mở trang subcategory, đợi danh sách sản phẩm và xử lý captcha"""
+    await page.goto(subcategory_url, wait_until="domcontentloaded")
+    await wait_for_page_load(page, page_type="listing")
+    
+    # Kiểm tra captcha
+    captcha_resolved = await handle_captcha(page)
+    if not captcha_resolved:
+        logger.error(f"Không thể xử lý captcha trên trang {subcategory_url}, bỏ qua")
+        return False
+    
+    # Lưu ảnh chụp màn hình
+    subcategory_name = subcategory_url.split("/")[-1]
+    await save_screenshot(page, f"subcategory_{subcategory_name}.png")
+    return True
+
+async def collect_product_urls(page: Page, subcategory_url: str, products_limit: int = 20) -> List[str]:
+    """Mở trang subcategory, cuộn để load thêm và trả về danh sách URL sản phẩm"""
+    if not await open_listing_page(page, subcategory_url):
+        return []
+    return await scroll_and_extract_product_urls(page, subcategory_url, products_limit)
+
+async def collect_listing_products(page: Page, subcategory_url: str, products_limit: int = 20) -> List[Dict[str, Any]]:
+    """Mở trang subcategory, cuộn để load thêm và trả về thông tin cơ bản của sản phẩm (ít nhất có product_url)"""
+    if not await open_listing_page(page, subcategory_url):
+        return []
+    return await scroll_and_extract_listing_products(page, subcategory_url, products_limit)
+
+async def scroll_and_extract_product_urls(page: Page, subcategory_url: str, products_limit: int = 20) -> List[str]:
+    """Cuộn trang danh sách đang mở để load thêm và trích xuất URL sản phẩm từ DOM"""
+    products = await scroll_and_extract_listing_products(page, subcategory_url, products_limit)
+    return [product["product_url"] for product in products]
+
+async def scroll_and_extract_listing_products(page: Page, subcategory_url: str, products_limit: int = 20) -> List[Dict[str, Any]]:
+    """Cuộn trang danh sách đang mở để load thêm và trích xuất thông tin cơ bản của sản phẩm từ DOM"""
+    subcategory_name = subcategory_url.split("/")[-1]
+    
+    # Cuộn trang để load thêm sản phẩm
+    max_scroll_attempts = max(5, products_limit // 5)  # Số lần cuộn tối đa dựa trên số lượng sản phẩm cần lấy
+    found_products = await scroll_to_load_more_products(page, times=max_scroll_attempts, target_products=products_limit)
+    logger.info(f"Sau khi cuộn trang, đã tìm thấy {found_products} sản phẩm")
+    
+    # Lấy toàn bộ thẻ sản phẩm trong một lần evaluate
+    products = await extract_listing_products(page, products_limit)
+    
+    if not products:
+        logger.warning(f"Không tìm thấy URL sản phẩm nào trên trang {subcategory_url}")
+        await save_screenshot(page, f"no_products_{subcategory_name}.png")
+        return []
+    
+    logger.info(f"Tìm thấy {len(products)} URL sản phẩm trên trang danh sách")
+    # Giới hạn số lượng sản phẩm
+    return products[:products_limit]
+
+async def collect_products_from_api(page: Page, capture: ProductApiCapture, subcategory_url: str, products_limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Lấy danh sách sản phẩm từ API JSON mà trang danh sách gọi ngầm, sau đó gọi lại endpoint
+    để phân trang thay vì cuộn trang. Nếu không bắt được API thì quay về cách đọc DOM.
+    
+    Returns:
+        List[Dict[str, Any]]: Danh sách sản phẩm (ít nhất có name và product_url)
+    """
+    capture.start()
+    try:
+        if not await open_listing_page(page, subcategory_url):
+            return []
+        await capture.drain()
+        
+        if not capture.captures:
+            # Cuộn trang có thể kích hoạt request API (infinite scroll); nếu vẫn không có thì dùng URL từ DOM
+            logger.info(f"Chưa bắt được API sản phẩm trên {subcategory_url}, chuyển sang cuộn trang")
+            products = await scroll_and_extract_listing_products(page, subcategory_url, products_limit)
+            await capture.drain()
+            if not capture.captures:
+                return products
+        
+        return await capture.replay(page, products_limit)
+    finally:
+        capture.stop()
+
+def build_product_record(product_details: Dict[str, Any], product_url: str, subcategory_url: str, index: int) -> Dict[str, Any]:
+    """Bổ sung URL, ID và subcategory vào thông tin chi tiết sản phẩm"""
+    # Thêm URL sản phẩm
+    product_details["product_url"] = product_url
+    
+    # Tạo ID cho sản phẩm
+    product_details["id"] = f"product_{index}_{int(time.time())}"
+    
+    # Thêm thông tin subcategory
+    parsed_url = urlparse(subcategory_url)
+    product_details["subcategory"] = parsed_url.path.strip("/")
+    
+    return product_details
+
+async def attach_product_images(product_details: Dict[str, Any], pipeline: Optional[ImagePipeline] = None):
+    """Tải hình ảnh sản phẩm vào thư mục riêng và ghi lại đường dẫn local"""
+    if "image_urls" in product_details and product_details["image_urls"]:
+        logger.info(f"Tải {len(product_details['image_urls'][:MAX_IMAGES_PER_PRODUCT])} hình ảnh cho sản phẩm: {product_details.get('name')}")
+        downloaded_images = await download_product_images(None, product_details, pipeline)
+        product_details["local_images"] = downloaded_images
+
 async def crawl_products_from_subcategory(page: Page, subcategory_url: str, products_limit: int = 20) -> List[Dict[str, Any]]:
     """Crawl các sản phẩm từ một subcategory"""
     products = []
+    image_pipeline = ImagePipeline(thumbnails=ThumbnailStage())
+    image_tasks = []
     
     try:
-        await page.goto(subcategory_url, wait_until="domcontentloaded")
-        await wait_for_page_load(page)
-        
-        # Kiểm tra captcha
-        captcha_resolved = await handle_captcha(page)
-        if not captcha_resolved:
-            logger.error(f"Không thể xử lý captcha trên trang {subcategory_url}, bỏ qua")
-            return products
-        
-        # Lưu ảnh chụp màn hình
-        subcategory_name = subcategory_url.split("/")[-1]
-        await save_screenshot(page, f"subcategory_{subcategory_name}.png")
-        
-        # Cuộn trang để load thêm sản phẩm
-        max_scroll_attempts = max(5, products_limit // 5)  # Số lần cuộn tối đa dựa trên số lượng sản phẩm cần lấy
-        found_products = await scroll_to_load_more_products(page, times=max_scroll_attempts, target_products=products_limit)
-        logger.info(f"Sau khi cuộn trang, đã tìm thấy {found_products} sản phẩm")
-        
-        # Tìm các phần tử sản phẩm
-        product_selectors = [".this-item", ".box_product", ".product-item", ".cate-pro-item", "article.product"]
-        product_urls = []
-        
-        for selector in product_selectors:
-            urls = await extract_product_urls(page, selector, products_limit)
-            if urls and len(urls) > len(product_urls):
-                product_urls = urls
-                logger.info(f"Tìm thấy {len(urls)} URL sản phẩm với selector: {selector}")
-        
+        product_urls = await collect_product_urls(page, subcategory_url, products_limit)
         if not product_urls:
-            logger.warning(f"Không tìm thấy URL sản phẩm nào trên trang {subcategory_url}")
-            await save_screenshot(page, f"no_products_{subcategory_name}.png")
             return products
         
-        # Giới hạn số lượng sản phẩm
-        product_urls = product_urls[:products_limit]
+        await image_pipeline.start()
+        
         logger.info(f"Bắt đầu crawl {len(product_urls)} trang sản phẩm")
         
         for idx, product_url in enumerate(product_urls):
@@ -836,23 +656,9 @@ async def crawl_products_from_subcategory(page: Page, subcategory_url: str, prod
                 product_details = await get_product_details(page, product_url)
                 
                 if product_details:
-                    # Thêm URL sản phẩm
-                    product_details["product_url"] = product_url
-                    
-                    # Tạo ID cho sản phẩm
-                    product_id = f"product_{len(products) + 1}_{int(time.time())}"
-                    product_details["id"] = product_id
-                    
-                    # Thêm thông tin subcategory
-                    parsed_url = urlparse(subcategory_url)
-                    subcategory = parsed_url.path.strip("/")
-                    product_details["subcategory"] = subcategory
-                    
-                    # Tải hình ảnh sản phẩm vào thư mục riêng
-                    if "image_urls" in product_details and product_details["image_urls"]:
-                        logger.info(f"Tải {len(product_details['image_urls'][:MAX_IMAGES_PER_PRODUCT])} hình ảnh cho sản phẩm: {product_details.get('name')}")
-                        downloaded_images = await download_product_images(page, product_details)
-                        product_details["local_images"] = downloaded_images
+                    build_product_record(product_details, product_url, subcategory_url, len(products) + 1)
+                    # Hình ảnh được tải ở pipeline riêng, không chặn việc crawl sản phẩm tiếp theo
+                    image_tasks.append(asyncio.ensure_future(attach_product_images(product_details, image_pipeline)))
                     
                     products.append(product_details)
                     logger.info(f"Đã thu thập thông tin sản phẩm: {product_details.get('name', 'Unknown')}")
@@ -863,6 +669,9 @@ async def crawl_products_from_subcategory(page: Page, subcategory_url: str, prod
     
     except Exception as e:
         logger.error(f"Lỗi khi crawl sản phẩm từ {subcategory_url}: {e}")
+    finally:
+        await asyncio.gather(*image_tasks, return_exceptions=True)
+        await image_pipeline.close()
     
     return products
 
@@ -982,6 +791,10 @@ def save_products_to_csv(products: List[Dict[str, Any]], subcategory_name: str)
         logger.warning(f"Không có sản phẩm nào để lưu cho subcategory {subcategory_name}")
         return ""
     
+    if not PANDAS_SUPPORT:
+        logger.warning("Không thể xuất CSV. Hãy cài đặt pandas: pip install pandas")
+        return ""
+    
     # Tiền xử lý dữ liệu sản phẩm
     normalized_products = normalize_product_data(products)
     
@@ -1031,129 +844,41 @@ def save_products_to_csv(products: List[Dict[str, Any]], subcategory_name: str)
         return ""
 
 def save_products_to_excel(products: List[Dict[str, Any]], subcategory_name: str) -> str:
-    """Lưu thông tin sản phẩm vào file Excel với định dạng đẹp"""
+    """Lưu thông tin sản phẩm vào file Excel với định dạng đẹp (ghi dạng stream, không tạo DataFrame)"""
     if not EXCEL_SUPPORT:
-        logger.warning("Không thể xuất Excel. Hãy cài đặt pandas và openpyxl: pip install pandas openpyxl")
+        logger.warning("Không thể xuất Excel. Hãy cài đặt openpyxl: pip install openpyxl")
         return ""
     
     if not products:
         logger.warning(f"Không có sản phẩm nào để lưu cho subcategory {subcategory_name}")
         return ""
     
-    # Tiền xử lý dữ liệu sản phẩm
-    normalized_products = normalize_product_data(products)
-    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{subcategory_name}_{timestamp}.xlsx"
     file_path = os.path.join(PRODUCT_OUTPUT_DIR, filename)
     
     try:
-        # Xác định các trường chính để làm header
-        all_fields = set()
-        for product in normalized_products:
-            all_fields.update(product.keys())
-        
-        # Loại bỏ các trường không muốn xuất ra Excel
-        fields_to_exclude = {'image_urls', 'specifications', 'local_images'}
-        excel_fields = [field for field in all_fields if field not in fields_to_exclude]
-        
-        # Thêm các trường quan trọng vào đầu danh sách
-        important_fields = ['id', 'name', 'price', 'subcategory', 'product_url', 'description']
-        for field in reversed(important_fields):
-            if field in excel_fields:
-                excel_fields.remove(field)
-                excel_fields.insert(0, field)
-        
-        # Chuyển dữ liệu sang DataFrame
-        df_data = []
-        for product in normalized_products:
-            row_data = {}
-            for field in excel_fields:
-                value = product.get(field, "")
-                # Đảm bảo mọi giá trị đều là chuỗi và được xử lý tiếng Việt
-                if isinstance(value, str):
-                    row_data[field] = fix_vietnamese_text(value)
-                else:
-                    row_data[field] = value
-            df_data.append(row_data)
-        
-        df = pd.DataFrame(df_data)
-        
-        # Tạo writer Excel
-        writer = pd.ExcelWriter(file_path, engine='openpyxl')
-        df.to_excel(writer, sheet_name='Products', index=False)
-        
-        # Lấy worksheet để định dạng
-        workbook = writer.book
-        worksheet = writer.sheets['Products']
-        
-        # Định dạng header
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        
-        # Định dạng border
-        thin_border = Border(
-            left=Side(style='thin'), 
-            right=Side(style='thin'), 
-            top=Side(style='thin'), 
-            bottom=Side(style='thin')
-        )
-        
-        # Áp dụng định dạng cho header
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Chỉnh sửa chiều rộng cột
-        for idx, col in enumerate(df.columns):
-            column_width = 20  # Chiều rộng mặc định
-            
-            # Điều chỉnh chiều rộng dựa trên loại dữ liệu
-            if col == 'name':
-                column_width = 40
-            elif col == 'description':
-                column_width = 60
-            elif col == 'product_url':
-                column_width = 50
-            elif col == 'price':
-                column_width = 15
-            
-            column_letter = openpyxl.utils.get_column_letter(idx + 1)
-            worksheet.column_dimensions[column_letter].width = column_width
-        
-        # Định dạng hàng dữ liệu
-        data_alignment = Alignment(vertical='top', wrap_text=True)
-        for row_num in range(2, len(df) + 2):
-            # Chiều cao hàng
-            worksheet.row_dimensions[row_num].height = 30
-            
-            for col_num in range(1, len(df.columns) + 1):
-                cell = worksheet.cell(row=row_num, column=col_num)
-                cell.alignment = data_alignment
-                cell.border = thin_border
-        
-        # Thêm lọc tự động
-        worksheet.auto_filter.ref = f"A1:{openpyxl.utils.get_column_letter(len(df.columns))}{len(df) + 1}"
-        
-        # Đóng băng hàng đầu tiên
-        worksheet.freeze_panes = "A2"
-        
-        # Lưu file Excel
-        writer.close()
-        
-        logger.info(f"Đã lưu {len(products)} sản phẩm vào file Excel: {file_path}")
-        return file_path
-        
+        # Định dạng header/cột chỉ áp dụng một lần, các dòng dữ liệu dùng chung một style
+        workbook = ExcelStreamWriter(file_path)
+        workbook.add_products("Products", normalize_product_data(products))
+        return workbook.close()
     except Exception as e:
         logger.error(f"Lỗi khi lưu sản phẩm vào file Excel: {e}")
         return ""
 
-def generate_summary_report(all_results: List[Dict[str, Any]], output_dir: str):
-    """Tạo báo cáo tổng quan sau khi crawl hoàn tất"""
+def open_excel_workbook() -> Optional[ExcelStreamWriter]:
+    """Tạo workbook Excel chung cho cả lượt crawl (mỗi subcategory một sheet)"""
+    if not EXCEL_SUPPORT:
+        logger.warning("Không thể xuất Excel. Hãy cài đặt openpyxl: pip install openpyxl")
+        return None
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = os.path.join(PRODUCT_OUTPUT_DIR, f"catalog_{timestamp}.xlsx")
+    logger.info(f"Ghi toàn bộ sản phẩm vào workbook Excel: {file_path}")
+    return ExcelStreamWriter(file_path)
+
+def generate_summary_report(all_results: List[Dict[str, Any]], output_dir: str, output_files: Optional[List[str]] = None):
+    """Tạo báo cáo tổng quan sau khi crawl hoàn tất (output_files: các file đã tạo trong lần chạy này)"""
     if not all_results:
         logger.warning("Không có dữ liệu để tạo báo cáo tổng quan")
         return
@@ -1196,35 +921,26 @@ def generate_summary_report(all_results: List[Dict[str, Any]], output_dir: str):
         report_content += "CÁC FILE ĐÃ TẠO:\n"
         report_content += "-"*50 + "\n"
         
-        # Liệt kê các file JSON
-        json_files = [f for f in os.listdir(PRODUCT_OUTPUT_DIR) if f.endswith(".json")]
-        if json_files:
-            report_content += "Files JSON:\n"
-            for json_file in sorted(json_files):
-                file_path = os.path.join(PRODUCT_OUTPUT_DIR, json_file)
-                file_size = os.path.getsize(file_path) / 1024  # KB
-                report_content += f"- {json_file} ({file_size:.2f} KB)\n"
-            report_content += "\n"
-        
-        # Liệt kê các file CSV
-        csv_files = [f for f in os.listdir(PRODUCT_OUTPUT_DIR) if f.endswith(".csv")]
-        if csv_files:
-            report_content += "Files CSV:\n"
-            for csv_file in sorted(csv_files):
-                file_path = os.path.join(PRODUCT_OUTPUT_DIR, csv_file)
-                file_size = os.path.getsize(file_path) / 1024  # KB
-                report_content += f"- {csv_file} ({file_size:.2f} KB)\n"
+        # Chỉ liệt kê các file của lần chạy này (không quét toàn bộ thư mục đầu ra của mọi lần chạy trước)
+        for label, suffix in [("JSON", ".json"), ("CSV", ".csv"), ("Excel", ".xlsx")]:
+            run_files = sorted(path for path in (output_files or []) if path.endswith(suffix))
+            if not run_files:
+                continue
+            report_content += f"Files {label}:\n"
+            for file_path in run_files:
+                if os.path.exists(file_path):
+                    file_size = os.path.getsize(file_path) / 1024  # KB
+                    report_content += f"- {os.path.basename(file_path)} ({file_size:.2f} KB)\n"
+                else:
+                    # File theo lần chạy đã được compact_outputs gộp vào dataset và chuyển đi
+                    report_content += f"- {os.path.basename(file_path)} (đã gộp vào dataset)\n"
             report_content += "\n"
         
-        # Liệt kê các file Excel
-        excel_files = [f for f in os.listdir(PRODUCT_OUTPUT_DIR) if f.endswith(".xlsx")]
-        if excel_files:
-            report_content += "Files Excel:\n"
-            for excel_file in sorted(excel_files):
-                file_path = os.path.join(PRODUCT_OUTPUT_DIR, excel_file)
-                file_size = os.path.getsize(file_path) / 1024  # KB
-                report_content += f"- {excel_file} ({file_size:.2f} KB)\n"
-            report_content += "\n"
+        # Dataset đã gộp (compact_outputs.py): chỉ đọc manifest, không mở từng file
+        manifest = load_manifest()
+        if manifest.get("partitions"):
+            report_content += f"Dataset đã gộp: {manifest['total_products']} sản phẩm trong {len(manifest['partitions'])} subcategory "
+            report_content += f"(cập nhật {manifest.get('updated_at', '')})\n\n"
         
         # Thống kê thư mục hình ảnh
         image_dirs = []
@@ -1278,7 +994,162 @@ def generate_summary_report(all_results: List[Dict[str, Any]], output_dir: str):
         logger.error(f"Lỗi khi tạo báo cáo tổng quan: {e}")
         return None
 
-async def crawl_subcategories(categories_file: str, product_limit: int = 20, subcategory_limit: int = None, export_csv: bool = False, export_excel: bool = False):
+def save_subcategory_outputs(products: List[Dict[str, Any]], subcategory_name: str, export_csv: bool = False, export_excel: bool = False, dataset_writer: Optional[DatasetWriter] = None, excel_workbook: Optional[ExcelStreamWriter] = None) -> List[str]:
+    """Lưu sản phẩm của một subcategory ra JSON (và CSV/Excel/dataset Parquet nếu được yêu cầu), trả về các file đã tạo"""
+    # Lưu json mặc định
+    output_files = [save_products_to_file(products, subcategory_name)]
+    
+    # Xuất ra CSV nếu được yêu cầu
+    if export_csv:
+        output_files.append(save_products_to_csv(products, subcategory_name))
+    
+    # Xuất ra Excel nếu được yêu cầu
+    if export_excel:
+        output_files.append(save_products_to_excel(products, subcategory_name))
+    
+    # Thêm một sheet vào workbook chung của lượt crawl nếu được yêu cầu
+    if excel_workbook:
+        try:
+            excel_workbook.add_products(subcategory_name, normalize_product_data(products))
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi {subcategory_name} vào workbook Excel: {e}")
+    
+    # Ghi vào dataset Parquet/Arrow nếu được yêu cầu
+    if dataset_writer:
+        dataset_writer.write_products(normalize_product_data(products), subcategory_name)
+    
+    return [path for path in output_files if path]
+
+def enqueue_job(queue: asyncio.PriorityQueue, pool_state: Dict[str, Any], job: Dict[str, Any]):
+    """Đưa job vào hàng đợi; job sản phẩm được ưu tiên để subcategory sớm hoàn tất"""
+    priority = 0 if job["type"] == "product" else 1
+    pool_state["sequence"] += 1
+    queue.put_nowait((priority, pool_state["sequence"], job))
+
+def finish_subcategory_if_done(pool_state: Dict[str, Any], subcategory_url: str):
+    """Khi toàn bộ job sản phẩm của subcategory đã xong, lên lịch lưu kết quả (sau khi hình ảnh tải xong)"""
+    entry = pool_state["subcategories"][subcategory_url]
+    if entry["pending"] > 0:
+        return
+    pool_state["finalizers"].append(asyncio.ensure_future(finalize_subcategory(pool_state, subcategory_url)))
+
+async def finalize_subcategory(pool_state: Dict[str, Any], subcategory_url: str):
+    """Đợi hình ảnh của subcategory tải xong rồi lưu kết quả"""
+    entry = pool_state["subcategories"][subcategory_url]
+    await asyncio.gather(*entry["image_tasks"], return_exceptions=True)
+    
+    subcategory_name = subcategory_url.split("/")[-1]
+    products = [product for product in entry["products"] if product]
+    if products:
+        pool_state["all_results"].extend(products)
+        pool_state["output_files"].extend(save_subcategory_outputs(
+            products, subcategory_name, pool_state["export_csv"], pool_state["export_excel"],
+            pool_state["dataset_writer"], pool_state["excel_workbook"]))
+    
+    elapsed = time.time() - entry["start_time"]
+    logger.info(f"Đã crawl {len(products)} sản phẩm từ {subcategory_name} trong {elapsed:.2f} giây")
+
+def record_block_stats(pool_state: Dict[str, Any], blocker: Optional[ResourceBlocker], url: str):
+    """Ghi log số request/bytes bị chặn của lần tải trang vừa rồi và cộng dồn vào tổng"""
+    if not blocker:
+        return
+    stats = blocker.take_stats()
+    totals = pool_state["block_totals"]
+    totals["pages"] += 1
+    totals["blocked_requests"] += stats["blocked_requests"]
+    totals["allowed_requests"] += stats["allowed_requests"]
+    totals["received_bytes"] += stats["received_bytes"]
+    logger.info(f"Route filter cho {url}: {ResourceBlocker.format_stats(stats)}")
+
+async def run_subcategory_job(page: Page, queue: asyncio.PriorityQueue, limiter: HostLimiter, pool_state: Dict[str, Any], subcategory_url: str, blocker: Optional[ResourceBlocker] = None, capture: Optional[ProductApiCapture] = None):
+    """Job subcategory: lấy danh sách URL sản phẩm và sinh job sản phẩm"""
+    subcategory_name = subcategory_url.split("/")[-1]
+    logger.info(f"Bắt đầu crawl subcategory: {subcategory_name} - {subcategory_url}")
+    entry = {"start_time": time.time(), "products": [], "pending": 0, "image_tasks": []}
+    pool_state["subcategories"][subcategory_url] = entry
+    
+    listings = []
+    try:
+        async with limiter.slot(subcategory_url):
+            if capture:
+                listings = await collect_products_from_api(page, capture, subcategory_url, pool_state["product_limit"])
+            else:
+                listings = await collect_listing_products(page, subcategory_url, pool_state["product_limit"])
+    except Exception as e:
+        logger.error(f"Lỗi khi crawl sản phẩm từ {subcategory_url}: {e}")
+    record_block_stats(pool_state, blocker, subcategory_url)
+    
+    if listings:
+        logger.info(f"Bắt đầu crawl {len(listings)} trang sản phẩm của {subcategory_name}")
+    
+    # Giữ chỗ theo thứ tự URL để kết quả không phụ thuộc worker nào xong trước
+    entry["products"] = [None] * len(listings)
+    entry["pending"] = len(listings)
+    for idx, listing in enumerate(listings):
+        enqueue_job(queue, pool_state, {
+            "type": "product",
+            "url": listing["product_url"],
+            "subcategory_url": subcategory_url,
+            "index": idx,
+            "listing": listing,
+        })
+    
+    finish_subcategory_if_done(pool_state, subcategory_url)
+
+async def run_product_job(page: Page, limiter: HostLimiter, pool_state: Dict[str, Any], job: Dict[str, Any], blocker: Optional[ResourceBlocker] = None):
+    """Job sản phẩm: lấy chi tiết một sản phẩm và tải hình ảnh"""
+    product_url = job["url"]
+    subcategory_url = job["subcategory_url"]
+    entry = pool_state["subcategories"][subcategory_url]
+    
+    try:
+        async with limiter.slot(product_url):
+            product_details = await get_product_details(page, product_url, pool_state["detail_timings"])
+        record_block_stats(pool_state, blocker, product_url)
+        
+        # Trang chi tiết không tải được (captcha, lỗi tải trang): không lưu bản ghi chỉ có thông tin danh sách
+        if product_details:
+            # Thông tin từ danh sách (API hoặc thẻ sản phẩm) làm giá trị mặc định, dữ liệu trang chi tiết được ưu tiên
+            listing = {key: value for key, value in job.get("listing", {}).items() if key != "product_url"}
+            if listing:
+                product_details = {**listing, **product_details}
+            
+            build_product_record(product_details, product_url, subcategory_url, job["index"] + 1)
+            # Hình ảnh được tải ở stage riêng, worker chuyển ngay sang job tiếp theo
+            entry["image_tasks"].append(asyncio.ensure_future(
+                attach_product_images(product_details, pool_state["image_pipeline"])))
+            entry["products"][job["index"]] = product_details
+            logger.info(f"Đã thu thập thông tin sản phẩm: {product_details.get('name', 'Unknown')}")
+        else:
+            logger.warning(f"Không thể lấy thông tin chi tiết cho sản phẩm: {product_url}")
+    except Exception as e:
+        logger.error(f"Lỗi khi xử lý sản phẩm {product_url}: {e}")
+    finally:
+        entry["pending"] -= 1
+        finish_subcategory_if_done(pool_state, subcategory_url)
+
+async def pool_worker(worker_id: int, page: Page, queue: asyncio.PriorityQueue, limiter: HostLimiter, pool_state: Dict[str, Any], blocker: Optional[ResourceBlocker] = None, capture: Optional[ProductApiCapture] = None):
+    """Worker sở hữu một page, lần lượt lấy job subcategory/sản phẩm từ hàng đợi"""
+    jobs_done = 0
+    while True:
+        _, _, job = await queue.get()
+        try:
+            # Thêm độ trễ ngẫu nhiên giữa các job của cùng worker
+            if jobs_done > 0:
+                await asyncio.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
+            
+            logger.info(f"[worker {worker_id}] Xử lý job {job['type']}: {job['url']}")
+            if job["type"] == "subcategory":
+                await run_subcategory_job(page, queue, limiter, pool_state, job["url"], blocker, capture)
+            else:
+                await run_product_job(page, limiter, pool_state, job, blocker)
+            jobs_done += 1
+        except Exception as e:
+            logger.error(f"[worker {worker_id}] Lỗi khi xử lý job {job['url']}: {e}")
+        finally:
+            queue.task_done()
+
+async def crawl_subcategories(categories_file: str, product_limit: int = 20, subcategory_limit: int = None, export_csv: bool = False, export_excel: bool = False, concurrency: int = CONCURRENCY, block_resources: bool = BLOCK_RESOURCES, listing_source: str = "dom", export_parquet: bool = False, excel_workbook: bool = False, compact: bool = False, build_index: bool = False):
     """Quản lý crawl các subcategories"""
     # Đọc danh sách subcategories từ file JSON
     try:
@@ -1315,6 +1186,8 @@ async def crawl_subcategories(categories_file: str, product_limit: int = 20, sub
     
     # Lưu tất cả kết quả
     all_results = []
+    output_files: List[str] = []  # Các file JSON/CSV/Excel tạo trong lần chạy này, dùng cho báo cáo tổng quan
+    concurrency = max(1, concurrency or 1)
     
     # Chạy Playwright
     async with async_playwright() as p:
@@ -1324,56 +1197,106 @@ async def crawl_subcategories(categories_file: str, product_limit: int = 20, sub
             viewport={"width": 1280, "height": 720},
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         )
-        page = await context.new_page()
         
-        total_products = 0
+        # Mỗi worker sở hữu một page riêng trong cùng context
+        pages = [await context.new_page() for _ in range(concurrency)]
+        logger.info(f"Khởi tạo page pool với {concurrency} worker")
+        
+        # Đăng ký một lần cho mỗi page hàm trích xuất thẻ sản phẩm trong trình duyệt
+        for page in pages:
+            await register_listing_script(page)
+        
+        # Mỗi page có route filter riêng để đếm request bị chặn theo từng page
+        blockers = [None] * concurrency
+        if block_resources:
+            blockers = [ResourceBlocker() for _ in pages]
+            for page, blocker in zip(pages, blockers):
+                await blocker.attach(page)
+            logger.info("Đã bật route filter chặn hình ảnh, media, font và domain tracking")
+        
+        # Mỗi page có bộ bắt API riêng khi lấy danh sách sản phẩm từ JSON thay vì DOM
+        captures = [None] * concurrency
+        if listing_source == "api":
+            captures = [ProductApiCapture() for _ in pages]
+            for page, capture in zip(pages, captures):
+                capture.attach(page)
+            logger.info("Lấy danh sách sản phẩm từ API JSON của trang (không cuộn trang)")
+        
+        limiter = HostLimiter(HOST_MAX_CONCURRENCY, HOST_MIN_INTERVAL, HOST_INTERVAL_JITTER)
+        image_pipeline = ImagePipeline(thumbnails=ThumbnailStage())
+        await image_pipeline.start()
+        queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        pool_state = {
+            "sequence": 0,
+            "subcategories": {},
+            "all_results": all_results,
+            "output_files": output_files,
+            "product_limit": product_limit,
+            "export_csv": export_csv,
+            "export_excel": export_excel,
+            "block_totals": {"pages": 0, "blocked_requests": 0, "allowed_requests": 0, "received_bytes": 0},
+            "detail_timings": DetailTimings(),
+            "image_pipeline": image_pipeline,
+            "finalizers": [],
+            "dataset_writer": DatasetWriter() if export_parquet else None,
+            "excel_workbook": open_excel_workbook() if excel_workbook else None,
+        }
         
-        # Duyệt qua từng subcategory
         for subcategory_url in subcategory_urls:
+            enqueue_job(queue, pool_state, {"type": "subcategory", "url": subcategory_url})
+        
+        start_time = time.time()
+        workers = [
+            asyncio.create_task(pool_worker(worker_id, page, queue, limiter, pool_state, blocker, capture))
+            for worker_id, (page, blocker, capture) in enumerate(zip(pages, blockers, captures), 1)
+        ]
+        
+        # Đợi đến khi mọi job (kể cả job sản phẩm sinh ra từ job subcategory) hoàn thành
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        
+        # Đợi các subcategory lưu kết quả (sau khi hình ảnh của chúng tải xong) rồi dừng pipeline hình ảnh
+        await asyncio.gather(*pool_state["finalizers"], return_exceptions=True)
+        await image_pipeline.close()
+        if pool_state["dataset_writer"]:
+            pool_state["dataset_writer"].close()
+        if pool_state["excel_workbook"]:
             try:
-                subcategory_name = subcategory_url.split("/")[-1]
-                logger.info(f"Bắt đầu crawl subcategory: {subcategory_name} - {subcategory_url}")
-                
-                start_time = time.time()
-                
-                # Crawl sản phẩm
-                products = await crawl_products_from_subcategory(page, subcategory_url, product_limit)
-                
-                # Lưu sản phẩm vào file và thêm vào danh sách kết quả
-                if products:
-                    # Thêm vào kết quả tổng hợp
-                    all_results.extend(products)
-                    
-                    # Lưu json mặc định
-                    save_products_to_file(products, subcategory_name)
-                    
-                    # Xuất ra CSV nếu được yêu cầu
-                    if export_csv:
-                        save_products_to_csv(products, subcategory_name)
-                    
-                    # Xuất ra Excel nếu được yêu cầu
-                    if export_excel:
-                        save_products_to_excel(products, subcategory_name)
-                    
-                    total_products += len(products)
-                
-                end_time = time.time()
-                logger.info(f"Đã crawl {len(products)} sản phẩm từ {subcategory_name} trong {end_time - start_time:.2f} giây")
-                
-                # Delay để tránh quá tải server
-                await asyncio.sleep(2)
-                
+                output_files.append(pool_state["excel_workbook"].close())
             except Exception as e:
-                logger.error(f"Lỗi khi xử lý subcategory {subcategory_url}: {e}")
+                logger.error(f"Lỗi khi lưu workbook Excel: {e}")
         
         # Đóng browser
         await browser.close()
         
-        logger.info(f"Hoàn thành quá trình crawl. Tổng cộng: {total_products} sản phẩm từ {len(subcategory_urls)} subcategories")
+        elapsed = time.time() - start_time
+        logger.info(f"Hoàn thành quá trình crawl. Tổng cộng: {len(all_results)} sản phẩm từ {len(subcategory_urls)} subcategories trong {elapsed:.2f} giây")
+        if pool_state["detail_timings"].pages:
+            logger.info(f"Thời gian trích xuất trang chi tiết: {pool_state['detail_timings'].format_stats()}")
+        totals = pool_state["block_totals"]
+        if block_resources and totals["pages"]:
+            logger.info(f"Route filter: chặn {totals['blocked_requests']} request trên {totals['pages']} trang, "
+                        f"nhận {totals['received_bytes'] / 1024 / 1024:.2f} MB")
+    
+    # Gộp các file theo lần chạy vào dataset đã loại trùng trước khi tạo báo cáo
+    if compact:
+        try:
+            compact_outputs(PRODUCT_OUTPUT_DIR)
+        except Exception as e:
+            logger.error(f"Lỗi khi gộp file đầu ra: {e}")
+    
+    # Đánh chỉ mục tìm kiếm các file đầu ra mới (search_index.py)
+    if build_index:
+        try:
+            update_search_index([PRODUCT_OUTPUT_DIR])
+        except Exception as e:
+            logger.error(f"Lỗi khi cập nhật chỉ mục tìm kiếm: {e}")
     
     # Tạo báo cáo tổng quan
     if all_results:
-        generate_summary_report(all_results, PRODUCT_OUTPUT_DIR)
+        generate_summary_report(all_results, PRODUCT_OUTPUT_DIR, output_files)
 
 async def main():
     parser = argparse.ArgumentParser(description="Crawl thông tin sản phẩm từ bachhoaxanh.com")
@@ -1382,10 +1305,24 @@ async def main():
     parser.add_argument("--subcategories", type=int, default=None, help="Số lượng subcategories tối đa sẽ crawl")
     parser.add_argument("--csv", action="store_true", help="Xuất dữ liệu dưới dạng CSV")
     parser.add_argument("--excel", action="store_true", help="Xuất dữ liệu dưới dạng Excel")
+    parser.add_argument("--excel-workbook", action="store_true", help="Ghi toàn bộ sản phẩm vào một file Excel (mỗi subcategory một sheet)")
+    parser.add_argument("--compact", action="store_true", help="Sau khi crawl, gộp các file JSON theo lần chạy thành dataset đã loại trùng (compact_outputs.py)")
+    parser.add_argument("--index", action="store_true", help="Sau khi crawl, cập nhật chỉ mục tìm kiếm từ các file đầu ra mới (search_index.py)")
+    parser.add_argument("--parquet", action="store_true", help="Ghi dataset Parquet phân vùng theo ngày/danh mục và file Arrow IPC")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Số page (worker) crawl song song")
+    parser.add_argument("--no-block-resources", action="store_true", help="Tắt route filter, tải đầy đủ hình ảnh/font/script bên thứ ba")
+    parser.add_argument("--listing-source", choices=["dom", "api"], default="dom",
+                        help="Nguồn danh sách sản phẩm: dom (cuộn trang và đọc DOM) hoặc api (bắt JSON/XHR và gọi lại endpoint)")
     
     args = parser.parse_args()
     
-    await crawl_subcategories(args.categories, args.products, args.subcategories, args.csv, args.excel)
+    await crawl_subcategories(args.categories, args.products, args.subcategories, args.csv, args.excel, args.concurrency,
+                              block_resources=BLOCK_RESOURCES and not args.no_block_resources,
+                              listing_source=args.listing_source,
+                              export_parquet=args.parquet,
+                              excel_workbook=args.excel_workbook,
+                              compact=args.compact,
+                              build_index=args.index)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
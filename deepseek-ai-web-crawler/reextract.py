@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Chạy lại parser hiện tại trên các trang đã lưu trong archive WARC (page_archive.py), không truy cập mạng.
+Các record được chia theo file WARC và xử lý song song trên process pool; kết quả ghi ra file JSONL
+(và JSON dạng mảng ở bước finalize). Mỗi trang được ghép theo URL với record đã có (danh sách sản phẩm hoặc
+kết quả lần chạy trước, xem JOIN_PATHS) để giữ các trường chỉ có ở trang danh sách như category,
+subcategory và giá trên thẻ sản phẩm.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+import config
+from html_backends import parse_html
+from page_archive import iter_index, read_record
+from jsonl_sink import JsonlSink, finalize_json
+from compact_outputs import canonical_url
+from search_index import iter_product_files, read_products
+
+logger = logging.getLogger(__name__)
+
+TASK_SIZE = 200  # Số record tối đa trong một task gửi sang process
+
+# Nguồn -> file/thư mục chứa record đã có của crawler đó, được ghép theo URL với kết quả trích xuất lại
+# (main: kết quả main.py; product_details: danh sách sản phẩm đầu vào của crawl_product_details.py;
+# playwright: các file sản phẩm theo lần chạy và dataset đã gộp)
+JOIN_PATHS: Dict[str, List[str]] = {
+    "main": [os.path.join(config.OUTPUT_DIR, config.OUTPUT_FILE_JSON)],
+    "product_details": [os.path.join(config.OUTPUT_DIR, "product_list.csv")],
+    "playwright": [os.path.join(config.OUTPUT_DIR, "products")],
+}
+
+
+def merge_details(prior: Dict[str, Any], details: Dict[str, Any]) -> Dict[str, Any]:
+    """Ghép record đã có với chi tiết vừa trích xuất (trường trích xuất được không rỗng sẽ ghi đè)"""
+    merged = dict(prior)
+    merged.update((key, value) for key, value in details.items() if value not in (None, "", [], {}))
+    return merged
+
+
+def extract_main_detail(url: str, body: bytes, prior: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Trang chi tiết tải bởi main.py: DataParser.parse_product_details"""
+    from parser import DataParser
+    parser = DataParser()
+    details = parser.parse_product_details(parser.parse_html(body), config.SELECTORS)
+    details["product_url"] = url
+    return [merge_details(prior, details)]
+
+
+def extract_product_details_page(url: str, body: bytes, prior: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Trang chi tiết tải bởi crawl_product_details.py: ProductDetailsCrawler.parse_detail_page"""
+    # Import khi cần để process chỉ xử lý nguồn khác không phải nạp Selenium
+    from crawl_product_details import ProductDetailsCrawler
+    soup = parse_html(body)
+    # Giống crawler: thông tin trên trang danh sách được giữ, trang chi tiết chỉ bổ sung trường còn thiếu
+    return [ProductDetailsCrawler.parse_detail_page(soup, {**prior, "product_url": url})]
+
+
+def extract_playwright_detail(url: str, body: bytes, prior: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Trang chi tiết tải bởi playwright_product_crawler.py: DETAIL_SCHEMA qua extract_details_from_html"""
+    from detail_extractor import extract_details_from_html
+    details = extract_details_from_html(body)
+    details["product_url"] = url
+    return [merge_details(prior, details)]
+
+
+def extract_playwright_xhr(url: str, body: bytes, prior: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Payload JSON bắt được bởi xhr_capture.py: extract_products (payload chứa nhiều sản phẩm, không ghép)"""
+    from xhr_capture import extract_products
+    return extract_products(json.loads(body))
+
+
+# (source, page_type) -> hàm trích xuất (URL, nội dung, record đã có của URL đó)
+EXTRACTORS: Dict[Tuple[str, str], Callable[[str, bytes, Dict[str, Any]], List[Dict[str, Any]]]] = {
+    ("main", "detail"): extract_main_detail,
+    ("product_details", "detail"): extract_product_details_page,
+    ("playwright", "detail"): extract_playwright_detail,
+    ("playwright", "xhr"): extract_playwright_xhr,
+}
+
+
+def load_join_records(paths: List[str], urls: set) -> Dict[str, Dict[str, Any]]:
+    """
+    Đọc record đã có của các URL cần trích xuất lại từ các file/thư mục đầu ra
+
+    Args:
+        paths: File hoặc thư mục (JSON, JSONL, CSV)
+        urls: URL đã chuẩn hóa (canonical_url) cần lấy record
+
+    Returns:
+        Dict[str, Dict[str, Any]]: URL chuẩn hóa -> record (file đọc sau bổ sung/ghi đè trường không rỗng)
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    for path in iter_product_files(path for path in paths if os.path.exists(path)):
+        try:
+            for record in read_products(path):
+                key = canonical_url(record.get("product_url") or record.get("url") or "")
+                if key in urls:
+                    records[key] = merge_details(records.get(key, {}), record)
+        except Exception as e:
+            logger.warning(f"Không thể đọc {path} để ghép record: {e}")
+    return records
+
+
+def reextract_task(root: str, entries: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Trích xuất lại một nhóm record cùng file WARC (chạy trong process con)
+
+    Args:
+        root: Thư mục archive
+        entries: Các dòng chỉ mục
+
+    Returns:
+        Tuple[List[Dict[str, Any]], int]: Sản phẩm trích xuất được và số record lỗi
+    """
+    products = []
+    errors = 0
+    for entry in entries:
+        extractor = EXTRACTORS[(entry["source"], entry["page_type"])]
+        try:
+            _, body = read_record(os.path.join(root, entry["warc_file"]), entry["offset"], entry["length"])
+            products.extend(extractor(entry["url"], body, entry.get("prior") or {}))
+        except Exception as e:
+            errors += 1
+            logger.warning(f"Lỗi khi trích xuất lại {entry['url']}: {e}")
+    return products, errors
+
+
+def reextract(root: str = config.PAGE_ARCHIVE_DIR,
+              output_file: str = os.path.join(config.OUTPUT_DIR, "reextracted.json"),
+              source: Optional[str] = None,
+              page_type: Optional[str] = None,
+              workers: Optional[int] = None,
+              latest_only: bool = True,
+              join_paths: Optional[List[str]] = None) -> int:
+    """
+    Chạy lại parser trên archive và ghi kết quả
+
+    Args:
+        root: Thư mục archive
+        output_file: File JSON đầu ra (kết quả được nối thêm vào file .jsonl cùng tên trước)
+        source: Chỉ xử lý trang của crawler này (None = tất cả nguồn có parser)
+        page_type: Chỉ xử lý loại trang này
+        workers: Số process (None = số nhân CPU)
+        latest_only: Chỉ dùng bản lưu mới nhất của mỗi URL
+        join_paths: File/thư mục chứa record để ghép theo URL cho mọi nguồn (None = JOIN_PATHS theo nguồn,
+                    [] = không ghép)
+
+    Returns:
+        int: Số sản phẩm trích xuất được
+    """
+    start_time = time.time()
+    entries: List[Dict[str, Any]] = []
+    skipped = 0
+    for entry in iter_index(root, page_type, source, latest_only):
+        if (entry["source"], entry["page_type"]) not in EXTRACTORS:
+            skipped += 1
+            continue
+        entries.append(entry)
+
+    # Ghép record đã có theo URL (trừ payload XHR); mỗi nhóm file chỉ được đọc một lần
+    urls_by_paths: Dict[Tuple[str, ...], set] = {}
+    for entry in entries:
+        if entry["page_type"] != "xhr":
+            paths = tuple(join_paths if join_paths is not None else JOIN_PATHS.get(entry["source"], []))
+            entry["join_key"] = (paths, canonical_url(entry["url"]))
+            urls_by_paths.setdefault(paths, set()).add(entry["join_key"][1])
+    records_by_paths = {paths: load_join_records(list(paths), urls) for paths, urls in urls_by_paths.items() if paths}
+    joined = 0
+    for entry in entries:
+        paths, key = entry.pop("join_key", ((), ""))
+        prior = records_by_paths.get(paths, {}).get(key)
+        if prior:
+            entry["prior"] = prior
+            joined += 1
+
+    tasks: List[List[Dict[str, Any]]] = []
+    for entry in entries:
+        # Các record liền nhau trong cùng file WARC được gom vào cùng task
+        if not tasks or len(tasks[-1]) >= TASK_SIZE or tasks[-1][-1]["warc_file"] != entry["warc_file"]:
+            tasks.append([])
+        tasks[-1].append(entry)
+
+    pages = sum(len(task) for task in tasks)
+    if skipped:
+        logger.info(f"Bỏ qua {skipped} trang chưa có parser offline")
+    if not pages:
+        logger.warning(f"Không có trang nào để trích xuất lại trong {root}")
+        return 0
+    logger.info(f"Trích xuất lại {pages} trang trong {len(tasks)} task ({joined} trang ghép được record đã có)")
+
+    jsonl_file = os.path.splitext(output_file)[0] + ".jsonl"
+    if os.path.exists(jsonl_file):
+        os.remove(jsonl_file)
+    extracted = errors = 0
+    with JsonlSink(jsonl_file, fsync="never") as sink, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(reextract_task, root, task) for task in tasks]
+        for future in as_completed(futures):
+            try:
+                products, task_errors = future.result()
+            except Exception as e:
+                logger.error(f"Lỗi trong process trích xuất: {e}")
+                continue
+            sink.write_many(products)
+            extracted += len(products)
+            errors += task_errors
+
+    finalize_json(jsonl_file, output_file)
+    elapsed = time.time() - start_time
+    logger.info(f"Đã trích xuất lại {extracted} sản phẩm từ {pages} trang trong {elapsed:.2f} giây "
+                f"({errors} trang lỗi), kết quả: {output_file}")
+    return extracted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy lại parser trên archive WARC (không tải lại trang)")
+    parser.add_argument("--archive", type=str, default=config.PAGE_ARCHIVE_DIR, help="Thư mục archive WARC")
+    parser.add_argument("--output", type=str, default=os.path.join(config.OUTPUT_DIR, "reextracted.json"),
+                        help="File JSON đầu ra")
+    parser.add_argument("--source", choices=sorted({source for source, _ in EXTRACTORS}), default=None,
+                        help="Chỉ xử lý trang của crawler này")
+    parser.add_argument("--page-type", type=str, default=None, help="Chỉ xử lý loại trang này (detail, xhr...)")
+    parser.add_argument("--workers", type=int, default=None, help="Số process (mặc định: số nhân CPU)")
+    parser.add_argument("--all-versions", action="store_true", help="Xử lý mọi bản lưu thay vì chỉ bản mới nhất của mỗi URL")
+    parser.add_argument("--join", nargs="*", default=None, metavar="PATH",
+                        help="File/thư mục chứa record để ghép theo URL (mặc định theo nguồn, để trống = không ghép)")
+    args = parser.parse_args()
+
+    reextract(args.archive, args.output, args.source, args.page_type, args.workers, not args.all_versions, args.join)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Chặn các tài nguyên không cần thiết (hình ảnh, font, tracking...) khi tải trang bằng Playwright
+"""
+import logging
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Page, Route, Response
+
+from config_playwright import (
+    BLOCKED_RESOURCE_TYPES,
+    BLOCKED_DOMAINS,
+    ALLOWED_DOMAINS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def domain_matches(host: str, domains: List[str]) -> bool:
+    """Kiểm tra host có thuộc một trong các domain (kể cả subdomain) hay không"""
+    for domain in domains:
+        domain = domain.lower().lstrip(".")
+        if host == domain or host.endswith("." + domain):
+            return True
+    return False
+
+
+class ResourceBlocker:
+    """Route filter cho một page: chặn request theo loại tài nguyên và domain, đếm số liệu theo page"""
+
+    def __init__(self,
+                 resource_types: Optional[List[str]] = None,
+                 blocked_domains: Optional[List[str]] = None,
+                 allowed_domains: Optional[List[str]] = None):
+        """
+        Khởi tạo ResourceBlocker
+
+        Args:
+            resource_types: Các loại tài nguyên Playwright cần chặn (image, media, font...)
+            blocked_domains: Các domain bên thứ ba luôn bị chặn
+            allowed_domains: Các domain không bao giờ bị chặn (ưu tiên cao nhất)
+        """
+        self.resource_types = set(BLOCKED_RESOURCE_TYPES if resource_types is None else resource_types)
+        self.blocked_domains = list(BLOCKED_DOMAINS if blocked_domains is None else blocked_domains)
+        self.allowed_domains = list(ALLOWED_DOMAINS if allowed_domains is None else allowed_domains)
+        self.stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, Any]:
+        return {
+            "blocked_requests": 0,
+            "blocked_by_reason": {},
+            "allowed_requests": 0,
+            "received_bytes": 0,
+        }
+
+    async def attach(self, page: Page):
+        """Gắn route filter và bộ đếm vào page"""
+        await page.route("**/*", self._handle_route)
+        page.on("response", self._on_response)
+
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        """Trả về lý do chặn request (None nếu được phép)"""
+        host = urlparse(url).netloc.lower()
+        if not host:
+            return None
+        if domain_matches(host, self.allowed_domains):
+            return None
+        if domain_matches(host, self.blocked_domains):
+            return "domain"
+        if resource_type in self.resource_types:
+            return resource_type
+        return None
+
+    async def _handle_route(self, route: Route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason:
+            self.stats["blocked_requests"] += 1
+            self.stats["blocked_by_reason"][reason] = self.stats["blocked_by_reason"].get(reason, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            self.stats["allowed_requests"] += 1
+            await route.continue_()
+
+    def _on_response(self, response: Response):
+        try:
+            length = response.headers.get("content-length")
+            if length and length.isdigit():
+                self.stats["received_bytes"] += int(length)
+        except Exception as e:
+            logger.debug(f"Không đọc được content-length của {response.url}: {e}")
+
+    def take_stats(self) -> Dict[str, Any]:
+        """Trả về số liệu của lần tải trang vừa rồi và đặt lại bộ đếm"""
+        stats = self.stats
+        self.stats = self._empty_stats()
+        return stats
+
+    @staticmethod
+    def format_stats(stats: Dict[str, Any]) -> str:
+        """Định dạng số liệu để ghi log"""
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(stats["blocked_by_reason"].items()))
+        return (f"chặn {stats['blocked_requests']} request ({reasons or 'không có'}), "
+                f"cho phép {stats['allowed_requests']} request, "
+                f"nhận {stats['received_bytes'] / 1024:.1f} KB")
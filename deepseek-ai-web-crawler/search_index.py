@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Chỉ mục tìm kiếm sản phẩm trên SQLite FTS5: tên, danh mục và mô tả được bỏ dấu tiếng Việt trước khi
+đánh chỉ mục (nên "thit heo" khớp "Thịt heo"), kèm chỉ mục phụ theo danh mục, giá và ngày crawl.
+Chỉ mục được cập nhật tăng dần: chỉ đọc lại các file đầu ra mới hoặc đã thay đổi, mỗi phiên bản nội dung
+của một sản phẩm được lưu một lần.
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+from config import OUTPUT_DIR, SEARCH_INDEX_FILE, SEARCH_INDEX_SKIP_DIRS, SEARCH_INDEX_SKIP_FILES
+from crawl_state import content_hash, normalize_price
+from jsonl_sink import read_jsonl
+from product_model import Product
+from stream_readers import iter_json_array, iter_csv
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FILE_SUFFIXES = (".json", ".jsonl", ".jsonl.zst", ".csv")
+CSV_JSON_FIELDS = ("image_urls", "local_images", "detailed_info", "specifications")
+RUN_TIMESTAMP_PATTERN = re.compile(r"(\d{8}_\d{6})")
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+BATCH_SIZE = 2000  # Số record ghi trong một transaction
+SCHEMA_VERSION = 1  # Tăng khi cách tính cột dẫn xuất thay đổi (PRAGMA user_version), chỉ mục cũ được cập nhật khi mở
+CATEGORY_SEPARATORS = re.compile(r"[\s_-]+")
+
+
+def fold_text(text: Any) -> str:
+    """Bỏ dấu tiếng Việt và chuyển chữ thường ('Thịt heo Đà Lạt' -> 'thit heo da lat')"""
+    if not text:
+        return ""
+    text = str(text).replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def category_key(text: Any) -> str:
+    """Khóa so khớp danh mục: bỏ dấu, '-', '_' và khoảng trắng liên tiếp thành một dấu cách ('thit-heo' -> 'thit heo')"""
+    return CATEGORY_SEPARATORS.sub(" ", fold_text(text)).strip()
+
+
+def match_expression(query: str) -> str:
+    """Chuyển chuỗi tìm kiếm thành biểu thức FTS5 (mọi từ đều phải có, từ cuối khớp theo tiền tố)"""
+    tokens = re.findall(r"\w+", fold_text(query))
+    if not tokens:
+        return ""
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def file_crawl_date(path: str) -> str:
+    """Ngày crawl của file đầu ra: timestamp trong tên file (<tên>_YYYYmmdd_HHMMSS), nếu không có thì mtime"""
+    match = RUN_TIMESTAMP_PATTERN.search(os.path.basename(path))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").strftime(DATE_FORMAT)
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path)).strftime(DATE_FORMAT)
+
+
+def iter_product_files(paths: Iterable[str]) -> Iterator[str]:
+    """Các file JSON/JSONL/CSV có thể chứa sản phẩm trong các đường dẫn (file hoặc thư mục)"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SEARCH_INDEX_SKIP_DIRS)
+            for filename in sorted(files):
+                lower = filename.lower()
+                if lower.endswith(PRODUCT_FILE_SUFFIXES) and not any(skip in lower for skip in SEARCH_INDEX_SKIP_FILES):
+                    yield os.path.join(root, filename)
+
+
+def read_products(path: str) -> Iterator[Dict[str, Any]]:
+    """Đọc lần lượt các record của một file đầu ra theo định dạng"""
+    if path.endswith(".csv"):
+        yield from iter_csv(path, json_fields=CSV_JSON_FIELDS)
+    elif path.endswith((".jsonl", ".jsonl.zst")):
+        yield from read_jsonl(path)
+    else:
+        # Chỉ đọc file JSON dạng mảng (file cấu hình/báo cáo dạng object được bỏ qua)
+        with open(path, "r", encoding="utf-8-sig") as f:
+            if f.read(64).lstrip()[:1] != "[":
+                return
+        yield from iter_json_array(path)
+
+
+class SearchIndex:
+    """Chỉ mục FTS5 các phiên bản sản phẩm đã crawl (an toàn khi dùng từ nhiều thread)"""
+
+    def __init__(self, db_path: str = SEARCH_INDEX_FILE):
+        """
+        Khởi tạo SearchIndex
+
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                records INTEGER,
+                indexed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                name TEXT,
+                category TEXT,
+                subcategory TEXT,
+                category_key TEXT,
+                subcategory_key TEXT,
+                price TEXT,
+                price_value INTEGER,
+                first_seen TEXT,
+                last_seen TEXT,
+                is_latest INTEGER DEFAULT 0,
+                data TEXT,
+                UNIQUE (url, content_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_key, price_value);
+            CREATE INDEX IF NOT EXISTS idx_products_subcategory ON products (subcategory_key, price_value);
+            CREATE INDEX IF NOT EXISTS idx_products_price ON products (price_value);
+            CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products (last_seen);
+            CREATE INDEX IF NOT EXISTS idx_products_latest ON products (is_latest, last_seen);
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(name, category, description, tokenize = 'unicode61');
+        """)
+        self.conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        # Chỉ mục tạo trước khi có category_key() lưu khóa danh mục còn '-'/'_' (subcategory là slug URL)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        self.conn.create_function("fold_category", 1, category_key, deterministic=True)
+        with self.conn:
+            updated = self.conn.execute("UPDATE products SET category_key = fold_category(category), "
+                                        "subcategory_key = fold_category(subcategory)").rowcount
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if updated:
+            logger.info(f"Đã cập nhật khóa danh mục của {updated} sản phẩm trong chỉ mục {self.db_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _add_version(self, product: Product, crawl_date: str) -> bool:
+        # Cùng URL và cùng nội dung chỉ được lưu một lần, lần gặp lại chỉ mở rộng khoảng first_seen/last_seen
+        data = product.to_dict()
+        digest = content_hash(data)
+        price = normalize_price(product.price)
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO products (url, content_hash, name, category, subcategory, category_key, "
+            "subcategory_key, price, price_value, first_seen, last_seen, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (product.product_url, digest, product.name, product.category, product.subcategory,
+             category_key(product.category), category_key(product.subcategory), product.price,
+             int(price) if price else None, crawl_date, crawl_date,
+             json.dumps(data, ensure_ascii=False, default=str))
+        )
+        if cursor.rowcount:
+            self.conn.execute(
+                "INSERT INTO products_fts (rowid, name, category, description) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, fold_text(product.name),
+                 fold_text(f"{product.category or ''} {product.subcategory or ''}"), fold_text(product.description))
+            )
+            return True
+        self.conn.execute(
+            "UPDATE products SET first_seen = min(first_seen, ?), last_seen = max(last_seen, ?) "
+            "WHERE url = ? AND content_hash = ?",
+            (crawl_date, crawl_date, product.product_url, digest)
+        )
+        return False
+
+    def _refresh_latest(self, urls: Iterable[str]):
+        # Phiên bản mới nhất của mỗi URL (last_seen lớn nhất) được đánh dấu is_latest = 1
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched_urls (url TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM touched_urls")
+        self.conn.executemany("INSERT OR IGNORE INTO touched_urls (url) VALUES (?)", ((url,) for url in urls))
+        self.conn.execute("UPDATE products SET is_latest = 0 WHERE is_latest = 1 AND url IN (SELECT url FROM touched_urls)")
+        self.conn.execute("""
+            UPDATE products SET is_latest = 1 WHERE id IN (
+                SELECT (SELECT p.id FROM products p WHERE p.url = t.url ORDER BY p.last_seen DESC, p.id DESC LIMIT 1)
+                FROM touched_urls t
+            )
+        """)
+
+    def index_file(self, path: str) -> Tuple[int, int]:
+        """
+        Đánh chỉ mục các sản phẩm của một file đầu ra
+
+        Args:
+            path: Đường dẫn file JSON/JSONL/CSV
+
+        Returns:
+            Tuple[int, int]: Số record đã đọc và số phiên bản sản phẩm mới
+        """
+        crawl_date = file_crawl_date(path)
+        records = added = 0
+        touched = set()
+        with self.lock:
+            try:
+                for record in read_products(path):
+                    if not isinstance(record, dict):
+                        continue
+                    product = Product.from_dict(record)
+                    if not product.product_url or not product.name:
+                        continue
+                    records += 1
+                    touched.add(product.product_url)
+                    if self._add_version(product, crawl_date):
+                        added += 1
+                    if records % BATCH_SIZE == 0:
+                        self.conn.commit()
+                self._refresh_latest(touched)
+                stat = os.stat(path)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sources (path, size, mtime, records, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (os.path.abspath(path), stat.st_size, stat.st_mtime, records, time.time())
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return records, added
+
+    def is_indexed(self, path: str) -> bool:
+        """Kiểm tra file đã được đánh chỉ mục và chưa thay đổi từ lần trước (so sánh kích thước và mtime)"""
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime FROM sources WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+    def update(self, paths: Iterable[str] = (OUTPUT_DIR,)) -> Dict[str, int]:
+        """
+        Cập nhật chỉ mục từ các file đầu ra mới hoặc đã thay đổi
+
+        Args:
+            paths: Các file hoặc thư mục cần quét
+
+        Returns:
+            Dict[str, int]: Số file đã đọc, số file bỏ qua, số record và số phiên bản mới
+        """
+        start_time = time.time()
+        stats = {"files": 0, "skipped": 0, "records": 0, "added": 0, "errors": 0}
+        for path in iter_product_files(paths):
+            if os.path.abspath(path) == os.path.abspath(self.db_path):
+                continue
+            try:
+                if self.is_indexed(path):
+                    stats["skipped"] += 1
+                    continue
+                records, added = self.index_file(path)
+            except Exception as e:
+                stats["errors"] += 1
+                logger.error(f"Lỗi khi đánh chỉ mục {path}: {e}")
+                continue
+            stats["files"] += 1
+            stats["records"] += records
+            stats["added"] += added
+            if records:
+                logger.debug(f"{path}: {records} record, {added} phiên bản mới")
+
+        elapsed = time.time() - start_time
+        logger.info(f"Cập nhật chỉ mục tìm kiếm trong {elapsed:.2f} giây: đọc {stats['files']} file "
+                    f"(bỏ qua {stats['skipped']} file không đổi, {stats['errors']} lỗi), "
+                    f"{stats['records']} record, {stats['added']} phiên bản mới; tổng {self.count()} sản phẩm")
+        return stats
+
+    def search(self, query: str = "", category: Optional[str] = None,
+               min_price: Optional[int] = None, max_price: Optional[int] = None,
+               since: Optional[str] = None, until: Optional[str] = None,
+               limit: int = 20, history: bool = False) -> List[Dict[str, Any]]:
+        """
+        Tìm sản phẩm
+
+        Args:
+            query: Từ khóa (không phân biệt dấu và hoa thường), rỗng = không lọc theo từ khóa
+            category: Tên danh mục hoặc subcategory (không phân biệt dấu; "-", "_" và khoảng trắng được coi như nhau)
+            min_price: Giá tối thiểu (đồng)
+            max_price: Giá tối đa (đồng)
+            since: Chỉ lấy bản crawl từ ngày này (YYYY-mm-dd)
+            until: Chỉ lấy bản crawl đến hết ngày này (YYYY-mm-dd)
+            limit: Số kết quả tối đa
+            history: Trả về mọi phiên bản thay vì chỉ phiên bản mới nhất của mỗi sản phẩm
+
+        Returns:
+            List[Dict[str, Any]]: Các sản phẩm kèm first_seen/last_seen, theo độ liên quan (hoặc mới nhất trước)
+        """
+        conditions, params = [], []
+        expression = match_expression(query)
+        if expression:
+            source = "products_fts JOIN products p ON p.id = products_fts.rowid"
+            conditions.append("products_fts MATCH ?")
+            params.append(expression)
+            order = "bm25(products_fts, 10.0, 2.0, 1.0), p.last_seen DESC"
+        else:
+            source = "products p"
+            order = "p.last_seen DESC"
+        if not history:
+            conditions.append("p.is_latest = 1")
+        if category:
+            conditions.append("(p.category_key = ? OR p.subcategory_key = ?)")
+            params += [category_key(category), category_key(category)]
+        if min_price is not None:
+            conditions.append("p.price_value >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("p.price_value <= ?")
+            params.append(max_price)
+        if since:
+            conditions.append("p.last_seen >= ?")
+            params.append(since)
+        if until:
+            conditions.append("p.first_seen <= ?")
+            params.append(f"{until} 23:59:59")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT p.data, p.first_seen, p.last_seen FROM {source} {where} ORDER BY {order} LIMIT ?", params
+            ).fetchall()
+        results = []
+        for data, first_seen, last_seen in rows:
+            product = json.loads(data)
+            product["first_seen"] = first_seen
+            product["last_seen"] = last_seen
+            results.append(product)
+        return results
+
+    def history(self, url: str) -> List[Dict[str, Any]]:
+        """Các phiên bản đã crawl của một sản phẩm (cũ nhất trước)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data, first_seen, last_seen FROM products WHERE url = ? ORDER BY first_seen, id", (url,)
+            ).fetchall()
+        return [{**json.loads(data), "first_seen": first_seen, "last_seen": last_seen}
+                for data, first_seen, last_seen in rows]
+
+    def count(self, history: bool = False) -> int:
+        """Số sản phẩm (hoặc số phiên bản nếu history=True) trong chỉ mục"""
+        with self.lock:
+            sql = "SELECT COUNT(*) FROM products" + ("" if history else " WHERE is_latest = 1")
+            return self.conn.execute(sql).fetchone()[0]
+
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self.lock:
+            self.conn.close()
+
+
+def update_search_index(paths: Iterable[str] = (OUTPUT_DIR,), db_path: str = SEARCH_INDEX_FILE) -> Dict[str, int]:
+    """Cập nhật chỉ mục tìm kiếm từ các file đầu ra (dùng ở cuối mỗi lần crawl)"""
+    with SearchIndex(db_path) as index:
+        return index.update(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chỉ mục tìm kiếm sản phẩm đã crawl (SQLite FTS5)")
+    parser.add_argument("--db", type=str, default=SEARCH_INDEX_FILE, help="File chỉ mục SQLite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Đánh chỉ mục các file đầu ra mới hoặc đã thay đổi")
+    update_parser.add_argument("paths", nargs="*", default=[OUTPUT_DIR], help="File hoặc thư mục cần quét")
+
+    search_parser = subparsers.add_parser("search", help="Tìm sản phẩm")
+    search_parser.add_argument("query", nargs="?", default="", help="Từ khóa, ví dụ: \"thit heo\"")
+    search_parser.add_argument("--category", type=str, default=None, help="Danh mục hoặc subcategory")
+    search_parser.add_argument("--min-price", type=int, default=None, help="Giá tối thiểu (đồng)")
+    search_parser.add_argument("--max-price", type=int, default=None, help="Giá tối đa (đồng)")
+    search_parser.add_argument("--since", type=str, default=None, help="Crawl từ ngày (YYYY-mm-dd)")
+    search_parser.add_argument("--until", type=str, default=None, help="Crawl đến ngày (YYYY-mm-dd)")
+    search_parser.add_argument("--limit", type=int, default=20, help="Số kết quả tối đa")
+    search_parser.add_argument("--history", action="store_true", help="Hiển thị mọi phiên bản thay vì chỉ bản mới nhất")
+    search_parser.add_argument("--json", action="store_true", help="In kết quả dạng JSON")
+    args = parser.parse_args()
+
+    with SearchIndex(args.db) as index:
+        if args.command == "update":
+            index.update(args.paths)
+            return
+
+        start_time = time.perf_counter()
+        results = index.search(args.query, args.category, args.min_price, args.max_price,
+                               args.since, args.until, args.limit, args.history)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+        for product in results:
+            print(f"{product.get('price') or '':>12}  {product.get('name', '')}  "
+                  f"[{product.get('subcategory') or product.get('category') or ''}, {product['last_seen']}]  "
+                  f"{product.get('product_url', '')}")
+        print(f"{len(results)} kết quả trong {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    main()
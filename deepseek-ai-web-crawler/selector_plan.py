@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Biên dịch cấu hình selector dự phòng (SELECTORS: trường -> danh sách selector theo thứ tự ưu tiên) thành
+kế hoạch trích xuất. Với tài liệu BeautifulSoup, DOM chỉ được duyệt một lần: mỗi phần tử chỉ được kiểm tra với
+các selector có phần cuối nhắm tới id/class/tag của nó, và selector cần id/class/tag không có trong trang bị bỏ qua,
+nên chi phí mỗi trang gần như không tăng theo số selector dự phòng. Với selectolax, mỗi selector chạy bằng C
+nên vẫn chạy lần lượt. Kết quả giống vòng lặp select() cũ: với mỗi trường lấy selector đầu tiên có phần tử khớp.
+"""
+import logging
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+import soupsieve
+from bs4 import Tag
+
+from html_backends import SelectolaxNode
+
+logger = logging.getLogger(__name__)
+
+# Các trường lấy văn bản của mọi phần tử khớp (nối bằng "\n"), các trường khác chỉ lấy phần tử đầu tiên
+MULTI_FIELDS = ("description",)
+HEX_DIGITS = "0123456789abcdefABCDEF"
+COMBINATORS = " \t\r\n>+~"
+
+_plans: Dict[Tuple, "SelectorPlan"] = {}
+
+
+def _read_ident(selector: str, index: int) -> Tuple[str, int]:
+    # Đọc một định danh CSS (có thể chứa ký tự escape như \[ \# hoặc \31 ) bắt đầu tại index
+    chars = []
+    while index < len(selector):
+        char = selector[index]
+        if char == "\\" and index + 1 < len(selector):
+            index += 1
+            hex_end = index
+            while hex_end < len(selector) and hex_end - index < 6 and selector[hex_end] in HEX_DIGITS:
+                hex_end += 1
+            if hex_end > index:
+                chars.append(chr(int(selector[index:hex_end], 16)))
+                index = hex_end
+                if index < len(selector) and selector[index] == " ":
+                    index += 1
+            else:
+                chars.append(selector[index])
+                index += 1
+        elif char.isalnum() or char in "-_" or ord(char) > 127:
+            chars.append(char)
+            index += 1
+        else:
+            break
+    return "".join(chars), index
+
+
+def _skip_group(selector: str, index: int, opening: str, closing: str) -> int:
+    # Bỏ qua một cặp [...] hoặc (...) (kể cả lồng nhau, chuỗi trong ngoặc kép và ký tự escape)
+    depth = 0
+    quote = None
+    while index < len(selector):
+        char = selector[index]
+        if char == "\\":
+            index += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == opening:
+            depth += 1
+        elif char == closing:
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    return index
+
+
+def split_selector_list(selector: str) -> List[str]:
+    """Tách selector list ("td, th") thành các selector thành phần"""
+    parts, start, index = [], 0, 0
+    while index < len(selector):
+        char = selector[index]
+        if char == "\\":
+            index += 2
+            continue
+        if char in "[(":
+            index = _skip_group(selector, index, char, "]" if char == "[" else ")")
+            continue
+        if char in "'\"":
+            end = selector.find(char, index + 1)
+            index = len(selector) if end < 0 else end + 1
+            continue
+        if char == ",":
+            parts.append(selector[start:index].strip())
+            start = index + 1
+        index += 1
+    parts.append(selector[start:].strip())
+    return [part for part in parts if part]
+
+
+def split_compounds(selector: str) -> List[str]:
+    """Tách một selector (không phải selector list) thành các compound selector ("div.a > p" -> ["div.a", "p"])"""
+    compounds, start, index = [], 0, 0
+    while index < len(selector):
+        char = selector[index]
+        if char == "\\":
+            index += 2
+            continue
+        if char in "[(":
+            index = _skip_group(selector, index, char, "]" if char == "[" else ")")
+            continue
+        if char in COMBINATORS:
+            compounds.append(selector[start:index])
+            start = index + 1
+        index += 1
+    compounds.append(selector[start:])
+    return [compound for compound in compounds if compound]
+
+
+def compound_key(compound: str) -> Tuple[str, str]:
+    """
+    Khóa chỉ mục của một compound selector: id, nếu không có thì class đầu tiên, nếu không có thì tag
+
+    Args:
+        compound: Compound selector, ví dụ "span.price" hoặc ".text-\\[\\#9da7bc\\].line-through"
+
+    Returns:
+        Tuple[str, str]: ("id", ...), ("class", ...), ("tag", ...) hoặc ("*", "") nếu khớp với mọi phần tử
+    """
+    tag, element_id, classes = "", "", []
+    index = 0
+    while index < len(compound):
+        char = compound[index]
+        if char == "#":
+            element_id, index = _read_ident(compound, index + 1)
+        elif char == ".":
+            name, index = _read_ident(compound, index + 1)
+            classes.append(name)
+        elif char == "[":
+            index = _skip_group(compound, index, "[", "]")
+        elif char == ":":
+            _, index = _read_ident(compound, index + 1 + (compound[index + 1:index + 2] == ":"))
+            if compound[index:index + 1] == "(":
+                index = _skip_group(compound, index, "(", ")")
+        elif char == "*" or char == "|":
+            index += 1
+        else:
+            name, next_index = _read_ident(compound, index)
+            if next_index == index:
+                index += 1
+                continue
+            tag, index = name.lower(), next_index
+
+    if element_id:
+        return ("id", element_id)
+    if classes:
+        return ("class", classes[0])
+    if tag:
+        return ("tag", tag)
+    return ("*", "")
+
+
+def selector_keys(selector: str) -> List[Tuple[str, str]]:
+    """Khóa của mọi compound trong selector; phần tử khớp phải có khóa cuối cùng, tài liệu phải có mọi khóa"""
+    return [compound_key(compound) for compound in split_compounds(selector)]
+
+
+class SelectorPlan:
+    """Kế hoạch trích xuất đã biên dịch cho một cấu hình selector"""
+
+    def __init__(self, selectors: Dict[str, List[str]], multi_fields: Iterable[str] = MULTI_FIELDS):
+        """
+        Biên dịch cấu hình selector
+
+        Args:
+            selectors: Trường -> danh sách selector theo thứ tự ưu tiên (config.SELECTORS)
+            multi_fields: Các trường lấy văn bản của mọi phần tử khớp
+        """
+        self.fields = list(selectors)
+        self.multi_fields = set(multi_fields)
+        # Mỗi entry: (trường, thứ tự ưu tiên, selector, selector đã biên dịch bằng soupsieve)
+        self.entries: List[Tuple[str, int, str, Any]] = []
+        self.index: Dict[Tuple[str, str], List[int]] = {}
+        # Với mỗi entry: các selector thành phần, mỗi cái là danh sách khóa (id/class/tag) phải có trong tài liệu
+        self.required: List[List[List[Tuple[str, str]]]] = []
+        for field, selector_list in selectors.items():
+            for priority, selector in enumerate(selector_list):
+                try:
+                    compiled = soupsieve.compile(selector)
+                except Exception as e:
+                    logger.warning(f"Bỏ qua selector không hợp lệ cho trường {field}: {selector} ({e})")
+                    continue
+                entry_index = len(self.entries)
+                self.entries.append((field, priority, selector, compiled))
+                alternatives = [selector_keys(part) for part in split_selector_list(selector)]
+                self.required.append([[key for key in keys if key[0] != "*"] for keys in alternatives])
+                for key in {keys[-1] for keys in alternatives}:
+                    self.index.setdefault(key, []).append(entry_index)
+        self.universal = self.index.pop(("*", ""), [])
+
+    def _candidates(self, tag: str, element_id: Optional[str], classes: Iterable[str]) -> List[int]:
+        # Các entry có thể khớp với phần tử (theo id, class, tag của phần cuối selector), giữ thứ tự khai báo
+        index = self.index
+        candidates = index.get(("tag", tag), [])
+        if element_id and ("id", element_id) in index:
+            candidates = candidates + index[("id", element_id)]
+        for name in classes:
+            if ("class", name) in index:
+                candidates = candidates + index[("class", name)]
+        if self.universal:
+            candidates = candidates + self.universal
+        return sorted(set(candidates)) if len(candidates) > 1 else candidates
+
+    def match(self, document: Any) -> Dict[str, List[Any]]:
+        """
+        Tìm phần tử cho mọi trường trong một lần duyệt DOM
+
+        Args:
+            document: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
+
+        Returns:
+            Dict[str, List[Any]]: Trường -> các phần tử của selector ưu tiên cao nhất có kết quả
+                                  (một phần tử với trường thường, mọi phần tử với MULTI_FIELDS)
+        """
+        if not self.entries:
+            return {}
+        if isinstance(document, SelectolaxNode):
+            # lexbor chạy mỗi selector bằng C nhanh hơn một lần duyệt DOM từ Python
+            return self._match_sequential(document)
+
+        # Duyệt DOM một lần: ghi nhận các tag/id/class có trong tài liệu và các phần tử có entry ứng viên
+        present = {"tag": set(), "id": set(), "class": set()}
+        tags, ids, class_names = present["tag"], present["id"], present["class"]
+        pending = []
+        for element in document.descendants:
+            if not isinstance(element, Tag):
+                continue
+            tag, element_id, classes = element.name, element.get("id"), element.get("class") or ()
+            tags.add(tag)
+            if element_id:
+                ids.add(element_id)
+            if classes:
+                class_names.update(classes)
+            candidates = self._candidates(tag, element_id, classes)
+            if candidates:
+                pending.append((element, candidates))
+
+        # Entry có compound nhắm tới id/class/tag không có trong tài liệu không thể khớp, bỏ qua không cần kiểm tra
+        viable = [any(all(value in present[kind] for kind, value in keys) for keys in alternatives)
+                  for alternatives in self.required]
+
+        best: Dict[str, int] = {}
+        found: Dict[str, List[Any]] = {}
+        multi_fields = self.multi_fields
+        for element, candidates in pending:
+            for entry_index in candidates:
+                if not viable[entry_index]:
+                    continue
+                field, priority, selector, compiled = self.entries[entry_index]
+                current = best.get(field)
+                # Trường đã có kết quả từ selector ưu tiên cao hơn (hoặc bằng, với trường chỉ lấy phần tử đầu tiên)
+                if current is not None and (current < priority or (current == priority and field not in multi_fields)):
+                    continue
+                if not compiled.match(element):
+                    continue
+                if current is None or priority < current:
+                    best[field] = priority
+                    found[field] = []
+                found[field].append(element)
+        return {field: found[field] for field in self.fields if field in found}
+
+    def _match_sequential(self, document: Any) -> Dict[str, List[Any]]:
+        # Cách cũ: mỗi selector một lần select(), dừng ở selector đầu tiên có kết quả của mỗi trường
+        found: Dict[str, List[Any]] = {}
+        for field, _, selector, _ in self.entries:
+            if field in found:
+                continue
+            try:
+                elements = document.select(selector)
+            except Exception as e:
+                logger.debug(f"Lỗi khi chạy selector {selector}: {e}")
+                continue
+            if elements:
+                found[field] = elements if field in self.multi_fields else elements[:1]
+        return {field: found[field] for field in self.fields if field in found}
+
+    def extract(self, document: Any) -> Dict[str, str]:
+        """
+        Trích xuất văn bản của mọi trường (giống vòng lặp select() qua từng selector dự phòng)
+
+        Args:
+            document: Tài liệu HTML (BeautifulSoup hoặc SelectolaxNode)
+
+        Returns:
+            Dict[str, str]: Trường -> văn bản (trường không có phần tử khớp bị bỏ qua)
+        """
+        results = {}
+        for field, elements in self.match(document).items():
+            if field in self.multi_fields:
+                results[field] = "\n".join(element.get_text(strip=True) for element in elements)
+            else:
+                results[field] = elements[0].get_text(strip=True)
+        return results
+
+
+def compile_plan(selectors: Dict[str, List[str]], multi_fields: Iterable[str] = MULTI_FIELDS) -> SelectorPlan:
+    """Lấy kế hoạch đã biên dịch cho cấu hình selector (mỗi cấu hình chỉ biên dịch một lần)"""
+    key = (tuple((field, tuple(selector_list)) for field, selector_list in selectors.items()), tuple(multi_fields))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = SelectorPlan(selectors, multi_fields)
+    return plan
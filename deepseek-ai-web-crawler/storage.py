@@ -1,10 +1,92 @@
+import io
 import csv
 import json
 import os
+import shutil
 import logging
 import pandas as pd
-from typing import List, Dict, Any, Optional, Union
-from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Union
+from stream_readers import iter_csv
+
+class CsvStreamWriter:
+    """
+    Ghi CSV theo từng batch: mỗi lần chỉ nối thêm các dòng mới với schema cố định.
+    Khi xuất hiện trường mới, trường đó được thêm vào cuối header (các dòng cũ giữ nguyên,
+    thiếu cột cuối được đọc là rỗng), nên tổng chi phí ghi tuyến tính theo số sản phẩm.
+    """
+    
+    def __init__(self, filepath: str, append: bool = False, logger: Optional[logging.Logger] = None):
+        """
+        Khởi tạo CsvStreamWriter
+        
+        Args:
+            filepath: Đường dẫn file CSV
+            append: Nếu True, nối thêm vào file hiện có (đọc header của file; file rỗng hoặc không có header
+                    được ghi lại từ đầu); False sẽ ghi file mới
+            logger: Logger dùng để ghi log
+        """
+        self.filepath = filepath
+        self.logger = logger or logging.getLogger(__name__)
+        self.fieldnames: List[str] = []
+        self.rows_written = 0
+        self.started = False
+        
+        if append and os.path.exists(filepath):
+            with open(filepath, "r", newline="", encoding="utf-8") as file:
+                self.fieldnames = next(csv.reader(file), [])
+            # File rỗng (ví dụ lần chạy trước dừng trước batch đầu tiên) chưa có header: coi như chưa bắt đầu
+            self.started = bool(self.fieldnames)
+    
+    @staticmethod
+    def serialize_row(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Chuyển các trường phức tạp (dict/list) thành chuỗi JSON"""
+        return {key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                for key, value in item.items()}
+    
+    def _rewrite_header(self):
+        # Chỉ thay dòng header, phần dữ liệu được sao chép nguyên khối
+        temp_path = self.filepath + ".tmp"
+        with open(self.filepath, "rb") as source, open(temp_path, "wb") as target:
+            source.readline()
+            header = io.StringIO()
+            csv.writer(header).writerow(self.fieldnames)
+            target.write(header.getvalue().encode("utf-8"))
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, self.filepath)
+    
+    def write_rows(self, data: List[Dict[str, Any]]) -> int:
+        """
+        Nối thêm các dòng mới vào file
+        
+        Args:
+            data: Danh sách các dictionary chứa dữ liệu
+            
+        Returns:
+            int: Số dòng đã ghi
+        """
+        if not data:
+            return 0
+        
+        rows = [self.serialize_row(item) for item in data]
+        known = set(self.fieldnames)
+        new_fields = sorted({key for row in rows for key in row} - known)
+        
+        header_changed = bool(new_fields and self.started and self.fieldnames)
+        self.fieldnames.extend(new_fields)
+        if header_changed:
+            self._rewrite_header()
+            self.logger.info(f"Đã thêm {len(new_fields)} cột mới vào '{self.filepath}': {', '.join(new_fields)}")
+        
+        mode = "a" if self.started else "w"
+        with open(self.filepath, mode=mode, newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
+            if not self.started:
+                writer.writeheader()
+            writer.writerows(rows)
+        self.started = True
+        self.rows_written += len(rows)
+        return len(rows)
+
 
 class DataStorage:
     """Lớp xử lý việc lưu trữ dữ liệu thu thập được"""
@@ -39,35 +121,45 @@ class DataStorage:
             return False
             
         filepath = os.path.join(self.output_dir, filename)
-        mode = "a" if append and os.path.exists(filepath) else "w"
-        write_header = mode == "w" or (mode == "a" and not os.path.exists(filepath))
         
         try:
-            # Xác định các trường dữ liệu từ dữ liệu đầu vào
-            all_fields = set()
-            for item in data:
-                all_fields.update(item.keys())
-            fieldnames = sorted(list(all_fields))
+            CsvStreamWriter(filepath, append=append, logger=self.logger).write_rows(data)
+            self.logger.info(f"Đã lưu {len(data)} mục vào file '{filepath}'.")
+            return True
+        except Exception as e:
+            self.logger.error(f"Lỗi khi lưu dữ liệu vào CSV: {str(e)}")
+            return False
+    
+    def open_csv_writer(self, filename: str, append: bool = False) -> CsvStreamWriter:
+        """
+        Tạo writer CSV ghi theo từng batch (chỉ nối thêm dòng mới thay vì ghi lại toàn bộ danh sách)
+        
+        Args:
+            filename: Tên file CSV (sẽ được lưu trong thư mục output_dir)
+            append: Nếu True, nối thêm vào file hiện có; False sẽ ghi file mới ở batch đầu tiên
             
-            # Xử lý các trường phức tạp thành chuỗi JSON
-            processed_data = []
-            for item in data:
-                processed_item = {}
-                for key, value in item.items():
-                    if isinstance(value, (dict, list)):
-                        processed_item[key] = json.dumps(value, ensure_ascii=False)
-                    else:
-                        processed_item[key] = value
-                processed_data.append(processed_item)
+        Returns:
+            CsvStreamWriter: Writer dùng chung cho cả lượt crawl
+        """
+        return CsvStreamWriter(os.path.join(self.output_dir, filename), append=append, logger=self.logger)
+    
+    def append_to_csv(self, writer: CsvStreamWriter, data: List[Dict[str, Any]]) -> bool:
+        """
+        Nối thêm một batch vào writer CSV
+        
+        Args:
+            writer: Writer tạo bởi open_csv_writer
+            data: Các dòng mới (chỉ các sản phẩm chưa ghi)
             
-            # Ghi dữ liệu vào file CSV
-            with open(filepath, mode=mode, newline="", encoding="utf-8") as file:
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                if write_header:
-                    writer.writeheader()
-                writer.writerows(processed_data)
-                
-            self.logger.info(f"Đã lưu {len(data)} mục vào file '{filepath}'.")
+        Returns:
+            bool: True nếu lưu thành công, False nếu lỗi
+        """
+        if not data:
+            return True
+        try:
+            writer.write_rows(data)
+            self.logger.debug(f"Đã thêm {len(data)} mục vào file '{writer.filepath}' "
+                             f"(tổng {writer.rows_written} mục trong lượt này).")
             return True
         except Exception as e:
             self.logger.error(f"Lỗi khi lưu dữ liệu vào CSV: {str(e)}")
@@ -102,40 +194,55 @@ class DataStorage:
             self.logger.error(f"Lỗi khi lưu dữ liệu vào JSON: {str(e)}")
             return False
     
-    def load_from_csv(self, filename: str) -> List[Dict[str, Any]]:
+    def iter_csv(self, filename: str, columns: Optional[List[str]] = None,
+                 json_columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
         """
-        Đọc dữ liệu từ file CSV
+        Đọc lần lượt các dòng của file CSV (không nạp cả file vào bộ nhớ)
         
         Args:
             filename: Tên file CSV (trong thư mục output_dir)
+            columns: Các cột cần đọc (None = tất cả)
+            json_columns: Các cột chứa chuỗi JSON cần chuyển thành đối tượng Python
+                (None = mọi cột được đọc, giống hành vi cũ)
             
         Returns:
-            List[Dict[str, Any]]: Danh sách các dictionary chứa dữ liệu
+            Iterator[Dict[str, Any]]: Các dòng dữ liệu
         """
         filepath = os.path.join(self.output_dir, filename)
         
         if not os.path.exists(filepath):
             self.logger.warning(f"File CSV '{filepath}' không tồn tại.")
-            return []
+            return iter(())
+        
+        if json_columns is None:
+            json_columns = columns if columns is not None else self._csv_header(filepath)
+        return iter_csv(filepath, columns, json_columns)
+    
+    @staticmethod
+    def _csv_header(filepath: str) -> List[str]:
+        with open(filepath, "r", newline="", encoding="utf-8-sig") as file:
+            return next(csv.reader(file), [])
+    
+    def load_from_csv(self, filename: str, columns: Optional[List[str]] = None,
+                      json_columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Đọc dữ liệu từ file CSV
+        
+        Args:
+            filename: Tên file CSV (trong thư mục output_dir)
+            columns: Các cột cần đọc (None = tất cả)
+            json_columns: Các cột chứa chuỗi JSON cần chuyển thành đối tượng Python
+                (None = mọi cột được đọc)
             
+        Returns:
+            List[Dict[str, Any]]: Danh sách các dictionary chứa dữ liệu
+        """
+        filepath = os.path.join(self.output_dir, filename)
+        
         try:
-            data = []
-            with open(filepath, mode="r", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    # Chuyển đổi chuỗi JSON thành đối tượng Python
-                    processed_row = {}
-                    for key, value in row.items():
-                        try:
-                            if value and (value.startswith('[') or value.startswith('{')):
-                                processed_row[key] = json.loads(value)
-                            else:
-                                processed_row[key] = value
-                        except:
-                            processed_row[key] = value
-                    data.append(processed_row)
-                    
-            self.logger.info(f"Đã đọc {len(data)} mục từ file '{filepath}'.")
+            data = list(self.iter_csv(filename, columns, json_columns))
+            if os.path.exists(filepath):
+                self.logger.info(f"Đã đọc {len(data)} mục từ file '{filepath}'.")
             return data
         except Exception as e:
             self.logger.error(f"Lỗi khi đọc dữ liệu từ CSV: {str(e)}")
@@ -167,28 +274,6 @@ class DataStorage:
             self.logger.error(f"Lỗi khi đọc dữ liệu từ JSON: {str(e)}")
             return None
     
-    def save_checkpoint(self, crawled_urls: List[str], filename: Optional[str] = None) -> bool:
-        """
-        Lưu danh sách các URL đã crawl để có thể tiếp tục sau này
-        
-        Args:
-            crawled_urls: Danh sách các URL đã crawl
-            filename: Tên file checkpoint (mặc định: checkpoint_<timestamp>.json)
-            
-        Returns:
-            bool: True nếu lưu thành công, False nếu lỗi
-        """
-        if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"checkpoint_{timestamp}.json"
-            
-        checkpoint_data = {
-            "timestamp": datetime.now().isoformat(),
-            "crawled_urls": crawled_urls
-        }
-        
-        return self.save_to_json(checkpoint_data, filename)
-    
     def load_checkpoint(self, filename: str) -> List[str]:
         """
         Đọc danh sách các URL đã crawl từ checkpoint
@@ -220,6 +305,12 @@ class DataStorage:
         """
         import requests
         from slugify import slugify
+        from image_store import get_image_store
+        from validator_cache import get_validator_cache
+        from config import IMAGE_REVALIDATE_AFTER
+        
+        image_store = get_image_store()
+        validators = get_validator_cache()
         
         if not image_urls:
             return []
@@ -245,14 +336,31 @@ class DataStorage:
                 img_filename = f"{safe_product_name}_{i+1}.{extension}"
                 img_path = os.path.join(image_dir, img_filename)
                 
-                # Tải và lưu hình ảnh
-                response = requests.get(img_url, stream=True, timeout=10)
-                if response.status_code == 200:
-                    with open(img_path, 'wb') as f:
+                # URL đã có trong kho hình ảnh: tạo hard link, không gọi mạng
+                # (validator đã cũ thì kiểm tra lại bằng conditional GET)
+                cached_blob = image_store.lookup(img_url)
+                if cached_blob and not validators.needs_revalidation(img_url, IMAGE_REVALIDATE_AFTER):
+                    if image_store.materialize(cached_blob, img_path):
+                        downloaded_images.append(img_path)
+                        continue
+                
+                # Tải vào file tạm rồi đưa vào kho hình ảnh
+                conditional = validators.conditional_headers(img_url) if cached_blob else {}
+                response = requests.get(img_url, headers=conditional, stream=True, timeout=10)
+                if response.status_code == 304 and cached_blob:
+                    # Hình ảnh không đổi, dùng lại blob trong kho
+                    validators.mark_not_modified(img_url, response.headers)
+                    if image_store.materialize(cached_blob, img_path):
+                        downloaded_images.append(img_path)
+                elif response.status_code == 200:
+                    temp_path = img_path + ".part"
+                    with open(temp_path, 'wb') as f:
                         for chunk in response.iter_content(1024):
                             f.write(chunk)
-                    downloaded_images.append(img_path)
-                    self.logger.info(f"Đã tải xuống hình ảnh: {img_path}")
+                    if image_store.store_download(img_url, temp_path, img_path, f".{extension}"):
+                        validators.update(img_url, response.headers)
+                        downloaded_images.append(img_path)
+                        self.logger.info(f"Đã tải xuống hình ảnh: {img_path}")
                 else:
                     self.logger.warning(f"Không thể tải hình ảnh từ {img_url} (status: {response.status_code})")
             except Exception as e:
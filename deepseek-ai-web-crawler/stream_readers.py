@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Đọc dạng stream các file đầu ra (JSON dạng mảng, CSV): trả về từng record qua iterator và chỉ giữ
+các cột được yêu cầu, nên việc tiếp tục crawl từ file lớn dùng bộ nhớ cố định.
+"""
+import os
+import csv
+import json
+import logging
+from typing import Dict, Any, Iterable, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024  # Số ký tự đọc mỗi lần khi phân tích JSON dạng mảng
+WHITESPACE = " \t\r\n"
+
+
+def project(record: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Chỉ giữ các trường được yêu cầu của record (fields=None giữ tất cả)"""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def iter_json_array(path: str, fields: Optional[Iterable[str]] = None,
+                    chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Đọc lần lượt các phần tử của file JSON dạng mảng mà không nạp cả file vào bộ nhớ
+
+    Args:
+        path: Đường dẫn file JSON (mảng các object)
+        fields: Các trường cần giữ (None = tất cả)
+        chunk_size: Số ký tự đọc mỗi lần
+
+    Returns:
+        Iterator[Dict[str, Any]]: Các phần tử theo thứ tự trong file
+    """
+    if not os.path.exists(path):
+        return
+    fields = list(fields) if fields is not None else None
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buffer = f.read(chunk_size)
+        position = len(buffer) - len(buffer.lstrip(WHITESPACE))
+        if buffer[position:position + 1] != "[":
+            logger.error(f"File {path} không phải JSON dạng mảng")
+            return
+        position += 1
+        eof = False
+
+        while True:
+            # Bỏ qua khoảng trắng và dấu phẩy giữa các phần tử
+            while position < len(buffer) and buffer[position] in WHITESPACE + ",":
+                position += 1
+            if position >= len(buffer):
+                if eof:
+                    logger.warning(f"File {path} kết thúc khi mảng JSON chưa đóng")
+                    return
+                buffer = buffer[position:] + f.read(chunk_size)
+                position = 0
+                eof = len(buffer) == 0
+                continue
+            if buffer[position] == "]":
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # Phần tử chưa đọc đủ: đọc thêm rồi thử lại, nếu đã hết file thì dữ liệu bị hỏng
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    logger.warning(f"Bỏ qua phần cuối không hợp lệ của {path}")
+                    return
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            position = end
+            if isinstance(record, dict):
+                yield project(record, fields)
+
+
+def iter_csv(path: str, fields: Optional[Iterable[str]] = None,
+             json_fields: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Đọc lần lượt các dòng của file CSV, chỉ tạo dict cho các cột được yêu cầu
+
+    Args:
+        path: Đường dẫn file CSV
+        fields: Các cột cần đọc (None = tất cả)
+        json_fields: Các cột chứa chuỗi JSON (list/dict) cần chuyển thành đối tượng Python
+
+    Returns:
+        Iterator[Dict[str, Any]]: Các dòng theo thứ tự trong file (cột thiếu ở dòng cũ được bỏ qua)
+    """
+    if not os.path.exists(path):
+        return
+    json_fields = set(json_fields or ())
+
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        wanted = header if fields is None else [field for field in fields if field in header]
+        columns = [(field, header.index(field), field in json_fields) for field in wanted]
+
+        for row in reader:
+            record = {}
+            for field, index, is_json in columns:
+                if index >= len(row):
+                    continue
+                value = row[index]
+                if is_json and value[:1] in ("[", "{"):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        pass
+                record[field] = value
+            yield record
+
+
+def collect_field(path: str, field: str) -> Set[str]:
+    """
+    Lấy tập giá trị (khác rỗng) của một trường từ file JSON dạng mảng hoặc CSV
+
+    Args:
+        path: Đường dẫn file (.json hoặc .csv)
+        field: Tên trường, ví dụ product_url
+
+    Returns:
+        Set[str]: Các giá trị của trường
+    """
+    reader = iter_csv if path.endswith(".csv") else iter_json_array
+    return {record[field] for record in reader(path, [field]) if record.get(field)}
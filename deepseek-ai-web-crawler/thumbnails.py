@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tạo thumbnail trên process pool: gom hình ảnh đã tải thành batch, giải mã JPEG ở độ phân giải thấp
+(Image.draft), thu nhỏ nhanh bằng Image.reduce và tạo nhiều kích thước từ một lần giải mã
+"""
+import time
+import asyncio
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from config_playwright import (
+    THUMBNAIL_SIZES,
+    THUMBNAIL_WORKERS,
+    THUMBNAIL_BATCH_SIZE,
+    THUMBNAIL_BATCH_WAIT
+)
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_path(original_path: str, size: int, sizes: List[int]) -> Path:
+    """Đường dẫn thumbnail: kích thước đầu tiên dùng tiền tố 'thumb_', các kích thước khác 'thumb<size>_'"""
+    path_obj = Path(original_path)
+    prefix = "thumb_" if size == sizes[0] else f"thumb{size}_"
+    return path_obj.parent / f"{prefix}{path_obj.name}"
+
+
+def make_thumbnails(original_path: str, sizes: Optional[List[int]] = None) -> List[str]:
+    """
+    Tạo thumbnail với nhiều kích thước từ một lần giải mã hình ảnh
+
+    Args:
+        original_path: Đường dẫn hình ảnh gốc
+        sizes: Các kích thước cạnh dài (px)
+
+    Returns:
+        List[str]: Đường dẫn các thumbnail (theo thứ tự sizes)
+    """
+    sizes = list(sizes or THUMBNAIL_SIZES)
+    targets = [(size, thumbnail_path(original_path, size, sizes)) for size in sizes]
+    missing = [(size, path) for size, path in targets if not path.exists()]
+    if not missing:
+        return [str(path) for _, path in targets]
+
+    try:
+        with Image.open(original_path) as img:
+            # Với JPEG, giải mã trực tiếp ở tỷ lệ 1/2, 1/4, 1/8 nhưng vẫn đủ lớn cho kích thước lớn nhất
+            largest = max(size for size, _ in missing)
+            img.draft("RGB", (largest, largest))
+            img.load()
+
+            # Tạo từ lớn đến nhỏ, mỗi kích thước dùng kết quả của kích thước trước làm nguồn
+            source = img
+            for size, path in sorted(missing, key=lambda item: item[0], reverse=True):
+                width, height = source.size
+                scale = size / max(width, height)
+                new_width = max(1, int(width * scale))
+                new_height = max(1, int(height * scale))
+
+                # Thu nhỏ nhanh bằng reduce (lấy trung bình khối) trước khi resize LANCZOS
+                factor = min(width // new_width, height // new_height) // 2
+                reduced = source.reduce(factor) if factor > 1 else source
+                resized = reduced.resize((new_width, new_height), Image.LANCZOS)
+
+                if path.suffix.lower() in (".jpg", ".jpeg") and resized.mode not in ("RGB", "L"):
+                    resized = resized.convert("RGB")
+                resized.save(path)
+                source = resized
+    except Exception as e:
+        logger.error(f"Lỗi khi tạo thumbnail cho {original_path}: {e}")
+        return [str(path) for _, path in targets if path.exists()]
+
+    return [str(path) for _, path in targets]
+
+
+def make_thumbnail_batch(paths: List[str], sizes: List[int]) -> Dict[str, List[str]]:
+    """Tạo thumbnail cho một batch hình ảnh (chạy trong process con)"""
+    return {path: make_thumbnails(path, sizes) for path in paths}
+
+
+class ThumbnailStage:
+    """Stage tạo thumbnail: gom các file đã tải thành batch và xử lý trên ProcessPoolExecutor"""
+
+    def __init__(self,
+                 sizes: Optional[List[int]] = None,
+                 workers: Optional[int] = THUMBNAIL_WORKERS,
+                 batch_size: int = THUMBNAIL_BATCH_SIZE,
+                 batch_wait: float = THUMBNAIL_BATCH_WAIT):
+        """
+        Khởi tạo ThumbnailStage
+
+        Args:
+            sizes: Các kích thước thumbnail (px)
+            workers: Số process (None = số nhân CPU)
+            batch_size: Số hình ảnh tối đa mỗi batch
+            batch_wait: Thời gian chờ gom batch (giây)
+        """
+        self.sizes = list(sizes or THUMBNAIL_SIZES)
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._batcher = None
+        self._running = set()
+        self.stats = {"images": 0, "batches": 0, "elapsed": 0.0}
+
+    async def start(self):
+        """Khởi động process pool và task gom batch"""
+        if self.executor:
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+
+    def submit(self, file_path: str) -> asyncio.Future:
+        """Đưa một file vào hàng đợi tạo thumbnail, trả về future nhận danh sách đường dẫn thumbnail"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((file_path, future))
+        return future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        paths = [path for path, _ in batch]
+        start_time = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self.executor, make_thumbnail_batch, paths, self.sizes)
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo thumbnail cho batch {len(paths)} hình ảnh: {e}")
+            results = {}
+        self.stats["images"] += len(paths)
+        self.stats["batches"] += 1
+        self.stats["elapsed"] += time.perf_counter() - start_time
+
+        for path, future in batch:
+            if not future.done():
+                future.set_result(results.get(path, []))
+            self.queue.task_done()
+
+    async def close(self):
+        """Đợi các batch còn lại xong rồi dừng process pool"""
+        if not self.executor:
+            return
+        await self.queue.join()
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        logger.info(f"Thumbnail: {self.stats['images']} hình ảnh, {self.stats['batches']} batch, "
+                    f"kích thước {self.sizes}, tổng thời gian batch {self.stats['elapsed']:.2f} giây")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Cache bền vững các validator HTTP (ETag / Last-Modified) theo URL để gửi conditional GET
+(If-None-Match / If-Modified-Since); response 304 nghĩa là nội dung không đổi và không phải tải lại
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+from config import VALIDATOR_CACHE_FILE
+
+logger = logging.getLogger(__name__)
+
+_caches: Dict[str, "ValidatorCache"] = {}
+_caches_lock = threading.Lock()
+
+
+class ValidatorCache:
+    """Lưu ETag/Last-Modified của từng URL trong SQLite (an toàn khi dùng từ nhiều thread)"""
+
+    def __init__(self, db_path: str = VALIDATOR_CACHE_FILE):
+        """
+        Khởi tạo ValidatorCache
+
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                status INTEGER,
+                checked_at REAL
+            )
+        """)
+        self.conn.commit()
+        self.stats = {"conditional": 0, "not_modified": 0, "updated": 0}
+
+    def _get(self, url: str):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT etag, last_modified, checked_at FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Header conditional GET cho URL (rỗng nếu chưa có validator)
+
+        Args:
+            url: URL cần tải
+
+        Returns:
+            Dict[str, str]: If-None-Match và/hoặc If-Modified-Since
+        """
+        row = self._get(url)
+        if not row:
+            return {}
+        etag, last_modified, _ = row
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        if headers:
+            self.stats["conditional"] += 1
+        return headers
+
+    def needs_revalidation(self, url: str, max_age: Optional[float]) -> bool:
+        """Kiểm tra URL có validator và lần kiểm tra gần nhất đã cũ hơn max_age (giây) hay chưa"""
+        if max_age is None:
+            return False
+        row = self._get(url)
+        if not row or not (row[0] or row[1]):
+            return False
+        return time.time() - (row[2] or 0) >= max_age
+
+    def update(self, url: str, headers, status: int = 200):
+        """
+        Lưu validator từ header của response 200
+
+        Args:
+            url: URL đã tải
+            headers: Header của response (requests/aiohttp/httpx, không phân biệt hoa thường)
+            status: Mã trạng thái HTTP
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, status, checked_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, status, time.time())
+            )
+            self.conn.commit()
+        self.stats["updated"] += 1
+
+    def mark_not_modified(self, url: str, headers=None):
+        """Ghi nhận response 304: cập nhật thời điểm kiểm tra (và validator mới nếu server gửi kèm)"""
+        self.stats["not_modified"] += 1
+        etag = headers.get("ETag") if headers is not None else None
+        last_modified = headers.get("Last-Modified") if headers is not None else None
+        with self.lock:
+            self.conn.execute(
+                "UPDATE validators SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), "
+                "status = 304, checked_at = ? WHERE url = ?",
+                (etag, last_modified, time.time(), url)
+            )
+            self.conn.commit()
+
+    def format_stats(self) -> str:
+        """Định dạng số liệu để ghi log"""
+        return (f"{self.stats['conditional']} conditional request, "
+                f"{self.stats['not_modified']} phản hồi 304 (không đổi), "
+                f"cập nhật {self.stats['updated']} validator")
+
+    def close(self):
+        """Đóng kết nối SQLite"""
+        with self.lock:
+            self.conn.close()
+
+
+def get_validator_cache(db_path: str = VALIDATOR_CACHE_FILE) -> ValidatorCache:
+    """Lấy ValidatorCache dùng chung cho file db_path trong tiến trình hiện tại"""
+    with _caches_lock:
+        key = os.path.abspath(db_path)
+        if key not in _caches:
+            _caches[key] = ValidatorCache(db_path)
+        return _caches[key]
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Bắt các response JSON (XHR/fetch) của API danh sách sản phẩm bằng page.on("response")
+và chuyển thẳng thành product dict, sau đó gọi lại endpoint để phân trang mà không cần cuộn trang
+"""
+import re
+import json
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse, urljoin
+
+from playwright.async_api import Page, Response
+
+from config_playwright import (
+    BASE_URL,
+    API_CAPTURE_URL_PATTERNS,
+    API_PAGE_PARAMS,
+    API_REPLAY_MAX_PAGES,
+    API_FIELD_ALIASES
+)
+from page_archive import archive_page
+
+logger = logging.getLogger(__name__)
+
+# Header không được gửi lại khi replay (trình duyệt/Playwright tự đặt)
+SKIPPED_REPLAY_HEADERS = {"content-length", "host", "cookie", "accept-encoding", "connection"}
+
+
+def first_value(item: Dict[str, Any], keys: List[str]) -> Any:
+    """Lấy giá trị của khóa đầu tiên có dữ liệu"""
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def map_product(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Chuyển một phần tử JSON thành product dict
+
+    Args:
+        item: Phần tử JSON của API
+
+    Returns:
+        Optional[Dict[str, Any]]: Product dict hoặc None nếu thiếu tên hoặc URL
+    """
+    product = {}
+    for field, aliases in API_FIELD_ALIASES.items():
+        value = first_value(item, aliases)
+        if isinstance(value, dict):
+            value = first_value(value, ["url", "src", "value"]) or None
+        elif isinstance(value, list):
+            value = value[0] if value and not isinstance(value[0], (dict, list)) else None
+        if value is not None:
+            product[field] = value
+
+    if not product.get("name") or not product.get("product_url"):
+        return None
+
+    product["name"] = str(product["name"]).strip()
+    product["product_url"] = urljoin(BASE_URL + "/", str(product["product_url"]))
+    if "image_url" in product:
+        product["image_url"] = urljoin(BASE_URL + "/", str(product["image_url"]))
+    return product
+
+
+def extract_products(payload: Any) -> List[Dict[str, Any]]:
+    """
+    Tìm danh sách sản phẩm lớn nhất trong payload JSON (duyệt đệ quy)
+
+    Args:
+        payload: JSON đã giải mã
+
+    Returns:
+        List[Dict[str, Any]]: Danh sách product dict
+    """
+    best: List[Dict[str, Any]] = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            dict_items = [item for item in node if isinstance(item, dict)]
+            if dict_items:
+                products = [product for product in map(map_product, dict_items) if product]
+                if len(products) > len(best):
+                    best = products
+            stack.extend(node)
+    return best
+
+
+class ProductApiCapture:
+    """Ghi lại các response JSON chứa sản phẩm của một page và gọi lại endpoint để phân trang"""
+
+    def __init__(self,
+                 url_patterns: Optional[List[str]] = None,
+                 page_params: Optional[List[str]] = None):
+        """
+        Khởi tạo ProductApiCapture
+
+        Args:
+            url_patterns: Các regex URL của response cần ghi lại
+            page_params: Các tên tham số phân trang có thể gặp
+        """
+        patterns = API_CAPTURE_URL_PATTERNS if url_patterns is None else url_patterns
+        self.url_patterns = [re.compile(pattern) for pattern in patterns]
+        self.page_params = list(API_PAGE_PARAMS if page_params is None else page_params)
+        self.active = False
+        self.captures: List[Dict[str, Any]] = []
+        self._pending = set()
+
+    def attach(self, page: Page):
+        """Gắn bộ lắng nghe response vào page"""
+        page.on("response", self._on_response)
+
+    def start(self):
+        """Bắt đầu ghi lại response cho một trang danh sách mới"""
+        self.captures = []
+        self.active = True
+
+    def stop(self):
+        """Ngừng ghi lại response (ví dụ khi page chuyển sang trang chi tiết)"""
+        self.active = False
+
+    def _matches(self, response: Response) -> bool:
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return False
+        if "json" not in response.headers.get("content-type", ""):
+            return False
+        return any(pattern.search(response.url) for pattern in self.url_patterns)
+
+    def _on_response(self, response: Response):
+        if not self.active or not self._matches(response):
+            return
+        task = asyncio.ensure_future(self._record(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _record(self, response: Response):
+        try:
+            payload = await response.json()
+        except Exception as e:
+            logger.debug(f"Không đọc được JSON từ {response.url}: {e}")
+            return
+        products = extract_products(payload)
+        if not products:
+            return
+        # Nén gzip và commit SQLite chạy trong thread pool để không chặn event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, archive_page, response.url, json.dumps(payload, ensure_ascii=False), "xhr", "playwright", "application/json")
+        request = response.request
+        self.captures.append({
+            "url": response.url,
+            "method": request.method,
+            "headers": request.headers,
+            "post_data": request.post_data,
+            "products": products,
+        })
+        logger.info(f"Bắt được {len(products)} sản phẩm từ API: {request.method} {response.url}")
+
+    async def drain(self):
+        """Đợi các response đang được đọc xong"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    @property
+    def endpoint(self) -> Optional[Dict[str, Any]]:
+        """Request có thể phân trang được (capture đầu tiên có tham số phân trang)"""
+        for capture in self.captures:
+            if self._page_location(capture):
+                return capture
+        return None
+
+    def products(self) -> List[Dict[str, Any]]:
+        """Toàn bộ sản phẩm đã bắt được, loại trùng theo product_url và giữ thứ tự"""
+        seen = set()
+        products = []
+        for capture in self.captures:
+            for product in capture["products"]:
+                if product["product_url"] not in seen:
+                    seen.add(product["product_url"])
+                    products.append(product)
+        return products
+
+    def _page_location(self, capture: Dict[str, Any]) -> Optional[Tuple[str, str, int]]:
+        """Xác định tham số phân trang: (nơi chứa: query/json/form, tên tham số, giá trị hiện tại)"""
+        query = dict(parse_qsl(urlparse(capture["url"]).query))
+        for param in self.page_params:
+            if param in query and query[param].isdigit():
+                return "query", param, int(query[param])
+
+        post_data = capture.get("post_data")
+        if not post_data:
+            return None
+        try:
+            body = json.loads(post_data)
+            if isinstance(body, dict):
+                for param in self.page_params:
+                    if isinstance(body.get(param), int):
+                        return "json", param, body[param]
+            return None
+        except ValueError:
+            pass
+        form = dict(parse_qsl(post_data))
+        for param in self.page_params:
+            if param in form and form[param].isdigit():
+                return "form", param, int(form[param])
+        return None
+
+    def _build_request(self, capture: Dict[str, Any], location: Tuple[str, str, int], page_number: int) -> Dict[str, Any]:
+        """Tạo request cho trang page_number dựa trên request đã bắt được"""
+        kind, param, _ = location
+        url = capture["url"]
+        data = capture.get("post_data")
+        if kind == "query":
+            parsed = urlparse(url)
+            query = dict(parse_qsl(parsed.query))
+            query[param] = str(page_number)
+            url = urlunparse(parsed._replace(query=urlencode(query)))
+        elif kind == "json":
+            body = json.loads(data)
+            body[param] = page_number
+            data = json.dumps(body)
+        else:
+            form = dict(parse_qsl(data))
+            form[param] = str(page_number)
+            data = urlencode(form)
+
+        headers = {key: value for key, value in capture["headers"].items()
+                   if key.lower() not in SKIPPED_REPLAY_HEADERS and not key.startswith(":")}
+        return {"url": url, "method": capture["method"], "headers": headers, "data": data}
+
+    async def replay(self, page: Page, limit: int, max_pages: int = API_REPLAY_MAX_PAGES) -> List[Dict[str, Any]]:
+        """
+        Gọi lại endpoint đã bắt được với số trang tăng dần (dùng cookie của page) đến khi đủ sản phẩm
+
+        Args:
+            page: Page của Playwright (dùng page.request để chia sẻ cookie/phiên)
+            limit: Số sản phẩm cần lấy
+            max_pages: Số trang tối đa sẽ gọi
+
+        Returns:
+            List[Dict[str, Any]]: Toàn bộ sản phẩm (kể cả sản phẩm đã bắt được trước đó)
+        """
+        products = self.products()
+        capture = self.endpoint
+        if not capture or len(products) >= limit:
+            return products[:limit]
+
+        location = self._page_location(capture)
+        seen = {product["product_url"] for product in products}
+        # Trang tiếp theo sau trang lớn nhất đã bắt được với cùng endpoint
+        page_number = max(self._page_location(item)[2] for item in self.captures
+                          if item["url"].split("?")[0] == capture["url"].split("?")[0]
+                          and self._page_location(item)) + 1
+        requests_sent = 0
+
+        for _ in range(max_pages):
+            request = self._build_request(capture, location, page_number)
+            try:
+                response = await page.request.fetch(request["url"], method=request["method"],
+                                                    headers=request["headers"], data=request["data"])
+                requests_sent += 1
+                if not response.ok:
+                    logger.warning(f"API trả về HTTP {response.status} ở trang {page_number}, dừng phân trang")
+                    break
+                new_products = [product for product in extract_products(await response.json())
+                                if product["product_url"] not in seen]
+            except Exception as e:
+                logger.warning(f"Lỗi khi gọi lại API ở trang {page_number}: {e}")
+                break
+
+            if not new_products:
+                logger.info(f"API không còn sản phẩm mới ở trang {page_number}")
+                break
+            for product in new_products:
+                seen.add(product["product_url"])
+                products.append(product)
+            if len(products) >= limit:
+                break
+            page_number += 1
+
+        logger.info(f"Đã lấy {len(products)} sản phẩm qua API với {requests_sent} request phân trang")
+        return products[:limit]